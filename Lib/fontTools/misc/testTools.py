@@ -61,12 +61,18 @@ class FakeFont:
     def getGlyphID(self, name):
         return self.reverseGlyphOrderDict_[name]
 
+    def getGlyphIDMany(self, lst):
+        return [self.getGlyphID(gid) for gid in lst]
+
     def getGlyphName(self, glyphID):
         if glyphID < len(self.glyphOrder_):
             return self.glyphOrder_[glyphID]
         else:
             return "glyph%.5d" % glyphID
 
+    def getGlyphNameMany(self, lst):
+        return [self.getGlyphName(gid) for gid in lst]
+
     def getGlyphOrder(self):
         return self.glyphOrder_
 
@@ -141,12 +147,18 @@ class MockFont(object):
         gid = self._reverseGlyphOrder[glyph]
         return gid
 
+    def getGlyphIDMany(self, lst):
+        return [self.getGlyphID(gid) for gid in lst]
+
     def getReverseGlyphMap(self):
         return self._reverseGlyphOrder
 
     def getGlyphName(self, gid):
         return self._glyphOrder[gid]
 
+    def getGlyphNameMany(self, lst):
+        return [self.getGlyphName(gid) for gid in lst]
+
     def getGlyphOrder(self):
         return self._glyphOrder
 
@@ -6,7 +6,9 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.misc.fixedTools import otRound
 from fontTools import ttLib
+from fontTools.ttLib.ttFont import _FontSnapshot
 from fontTools.ttLib.tables import otTables
+from fontTools.ttLib.tables.otBase import BaseTTXConverter
 from fontTools.misc import psCharStrings
 from fontTools.pens.basePen import NullPen
 from fontTools.misc.loggingTools import Timer
@@ -14,8 +16,13 @@ from fontTools.varLib import varStore
 import sys
 import struct
 import array
+import bisect
 import logging
 from collections import Counter
+try:
+	from collections import UserList
+except ImportError:
+	from UserList import UserList
 from types import MethodType
 
 __usage__ = "pyftsubset font-file [glyph...] [--option=value]..."
@@ -387,32 +394,121 @@ def _set_update(s, *others):
 def _dict_subset(d, glyphs):
 	return {g:d[g] for g in glyphs}
 
+def _ensure_decompiled(value, seen):
+	# Decompile all the subtables of a lazily loaded OpenType table: they
+	# read glyph names by glyph ID, so they must be read before the glyph
+	# order changes.
+	if isinstance(value, otTables.BaseTable):
+		if id(value) in seen:
+			return
+		seen.add(id(value))
+		value.ensureDecompiled()
+		for v in value.__dict__.values():
+			_ensure_decompiled(v, seen)
+	elif isinstance(value, (list, UserList)):
+		for v in value:
+			_ensure_decompiled(v, seen)
+
+
+def _glyph_ids(glyphs, glyphOrder):
+	"""Returns the set of glyph IDs of glyphs in glyphOrder, a
+	otTables._GlyphOrder, leaving out the glyphs not in it."""
+	getGlyphID = glyphOrder.getGlyphID
+	gids = set(getGlyphID(g) for g in glyphs)
+	gids.discard(None)
+	return gids
+
+def _sorted_index(a, x):
+	"""Returns the index of x in the ascending array a, or None."""
+	i = bisect.bisect_left(a, x)
+	if i < len(a) and a[i] == x:
+		return i
+	return None
+
+def _range_class(starts, ends, classes, gid):
+	"""Returns the class of the glyph ID gid in the ClassDef ranges, or
+	None if it is not in any."""
+	if gid is None:
+		return None
+	i = bisect.bisect_right(starts, gid) - 1
+	if i >= 0 and gid <= ends[i]:
+		return classes[i]
+	return None
+
+def _range_class_items(starts, ends, classes, glyphOrder, glyphs):
+	"""Returns the ascending (glyph ID, class) pairs of the glyphs that are
+	in the ClassDef ranges."""
+	if len(glyphs) * 4 < sum(ends) - sum(starts) + len(starts):
+		# binary search the fewer glyphs
+		items = ((gid, _range_class(starts, ends, classes, gid))
+			 for gid in sorted(_glyph_ids(glyphs, glyphOrder)))
+		return [(gid, v) for gid,v in items if v is not None]
+	names = glyphOrder.glyphOrder
+	items = []
+	for start,end,v in zip(starts, ends, classes):
+		items.extend((gid, v) for gid,g in enumerate(names[start:end + 1], start)
+			     if g in glyphs)
+	return items
+
+def _has_unclassified(items, glyphs, glyphOrder):
+	"""Returns whether any of glyphs is not among the classified items."""
+	if isinstance(glyphs, (set, frozenset)):
+		return len(items) < len(glyphs)
+	return len(items) < len(_glyph_ids(glyphs, glyphOrder)) or \
+		any(glyphOrder.getGlyphID(g) is None for g in glyphs)
 
 @_add_method(otTables.Coverage)
 def intersect(self, glyphs):
 	"""Returns ascending list of matching coverage values."""
-	return [i for i,g in enumerate(self.glyphs) if g in glyphs]
+	glyphIDs, glyphOrder = self._getGlyphIDs()
+	if glyphIDs is None:
+		return [i for i,g in enumerate(self.glyphs) if g in glyphs]
+	if len(glyphs) * 8 < len(glyphIDs):
+		# binary search the few glyphs
+		indices = (_sorted_index(glyphIDs, gid)
+			   for gid in _glyph_ids(glyphs, glyphOrder))
+		return sorted(i for i in indices if i is not None)
+	names = glyphOrder.glyphOrder
+	return [i for i,gid in enumerate(glyphIDs) if names[gid] in glyphs]
 
 @_add_method(otTables.Coverage)
 def intersect_glyphs(self, glyphs):
 	"""Returns set of intersecting glyphs."""
-	return set(g for g in self.glyphs if g in glyphs)
+	glyphIDs, glyphOrder = self._getGlyphIDs()
+	if glyphIDs is None:
+		return set(g for g in self.glyphs if g in glyphs)
+	names = glyphOrder.glyphOrder
+	return set(names[glyphIDs[i]] for i in self.intersect(glyphs))
 
 @_add_method(otTables.Coverage)
 def subset(self, glyphs):
 	"""Returns ascending list of remaining coverage values."""
 	indices = self.intersect(glyphs)
-	self.glyphs = [g for g in self.glyphs if g in glyphs]
+	self.remap(indices)
 	return indices
 
 @_add_method(otTables.Coverage)
 def remap(self, coverage_map):
 	"""Remaps coverage."""
-	self.glyphs = [self.glyphs[i] for i in coverage_map]
+	glyphIDs, glyphOrder = self._getGlyphIDs()
+	if glyphIDs is None:
+		self.glyphs = [self.glyphs[i] for i in coverage_map]
+	else:
+		self._setGlyphIDs(array.array('H', [glyphIDs[i] for i in coverage_map]), glyphOrder)
 
 @_add_method(otTables.ClassDef)
 def intersect(self, glyphs):
 	"""Returns ascending list of matching class values."""
+	starts, ends, classes, glyphOrder = self._getGlyphIDRanges()
+	if starts is not None:
+		items = _range_class_items(starts, ends, classes, glyphOrder, glyphs)
+		return _uniq_sort(
+			 ([0] if _has_unclassified(items, glyphs, glyphOrder) else []) +
+				[v for gid,v in items])
+	if len(glyphs) < len(self.classDefs):
+		# look up the fewer glyphs
+		get = self.classDefs.get
+		return _uniq_sort(get(g, 0) for g in glyphs)
 	return _uniq_sort(
 		 ([0] if any(g not in self.classDefs for g in glyphs) else []) +
 			[v for g,v in self.classDefs.items() if g in glyphs])
@@ -420,20 +516,44 @@ def intersect(self, glyphs):
 @_add_method(otTables.ClassDef)
 def intersect_class(self, glyphs, klass):
 	"""Returns set of glyphs matching class."""
+	starts, ends, classes, glyphOrder = self._getGlyphIDRanges()
+	if starts is not None:
+		items = _range_class_items(starts, ends, classes, glyphOrder, glyphs)
+		names = glyphOrder.glyphOrder
+		if klass == 0:
+			return set(glyphs).difference(names[gid] for gid,v in items)
+		return set(names[gid] for gid,v in items if v == klass)
 	if klass == 0:
 		return set(g for g in glyphs if g not in self.classDefs)
+	if len(glyphs) * 8 < len(self.classDefs):
+		# comparing classes is much cheaper than looking up glyphs, so
+		# only do the latter for a handful of glyphs
+		get = self.classDefs.get
+		return set(g for g in glyphs if get(g) == klass)
 	return set(g for g,v in self.classDefs.items()
 		     if v == klass and g in glyphs)
 
 @_add_method(otTables.ClassDef)
 def subset(self, glyphs, remap=False):
 	"""Returns ascending list of remaining classes."""
-	self.classDefs = {g:v for g,v in self.classDefs.items() if g in glyphs}
-	# Note: while class 0 has the special meaning of "not matched",
-	# if no glyph will ever /not match/, we can optimize class 0 out too.
-	indices = _uniq_sort(
-		 ([0] if any(g not in self.classDefs for g in glyphs) else []) +
-			list(self.classDefs.values()))
+	starts, ends, classes, glyphOrder = self._getGlyphIDRanges()
+	if starts is not None:
+		items = _range_class_items(starts, ends, classes, glyphOrder, glyphs)
+		self._setGlyphIDClasses(items, glyphOrder)
+		indices = _uniq_sort(
+			 ([0] if _has_unclassified(items, glyphs, glyphOrder) else []) +
+				[v for gid,v in items])
+	else:
+		classDefs = self.classDefs
+		if len(glyphs) < len(classDefs):
+			self.classDefs = {g:classDefs[g] for g in glyphs if g in classDefs}
+		else:
+			self.classDefs = {g:v for g,v in classDefs.items() if g in glyphs}
+		# Note: while class 0 has the special meaning of "not matched",
+		# if no glyph will ever /not match/, we can optimize class 0 out too.
+		indices = _uniq_sort(
+			 ([0] if any(g not in self.classDefs for g in glyphs) else []) +
+				list(self.classDefs.values()))
 	if remap:
 		self.remap(indices)
 	return indices
@@ -441,7 +561,13 @@ def subset(self, glyphs, remap=False):
 @_add_method(otTables.ClassDef)
 def remap(self, class_map):
 	"""Remaps classes."""
-	self.classDefs = {g:class_map.index(v) for g,v in self.classDefs.items()}
+	class_map = {v:i for i,v in enumerate(class_map)}
+	starts, ends, classes, glyphOrder = self._getGlyphIDRanges()
+	if starts is not None:
+		self._setGlyphIDRanges(starts, ends,
+				       array.array('H', [class_map[v] for v in classes]), glyphOrder)
+	else:
+		self.classDefs = {g:class_map[v] for g,v in self.classDefs.items()}
 
 @_add_method(otTables.SingleSubst)
 def closure_glyphs(self, s, cur_glyphs):
@@ -1156,6 +1282,123 @@ def collect_lookups(self):
 	else:
 		assert 0, "unknown format: %s" % self.Format
 
+@_add_method(otTables.SingleSubst)
+def collect_closure_rules(self, graph, glyphs, simple, rules):
+	for g in graph.restrict(self.mapping, glyphs):
+		simple.setdefault(g, []).append(self.mapping[g])
+
+@_add_method(otTables.MultipleSubst)
+def collect_closure_rules(self, graph, glyphs, simple, rules):
+	for g in graph.restrict(self.mapping, glyphs):
+		simple.setdefault(g, []).extend(self.mapping[g])
+
+@_add_method(otTables.AlternateSubst)
+def collect_closure_rules(self, graph, glyphs, simple, rules):
+	for g in graph.restrict(self.alternates, glyphs):
+		simple.setdefault(g, []).extend(self.alternates[g])
+
+@_add_method(otTables.LigatureSubst)
+def collect_closure_rules(self, graph, glyphs, simple, rules):
+	for g in graph.restrict(self.ligatures, glyphs):
+		for seq in self.ligatures[g]:
+			rules.append(((g,) + tuple(seq.Component), (), (seq.LigGlyph,), ()))
+
+@_add_method(otTables.ReverseChainSingleSubst)
+def collect_closure_rules(self, graph, glyphs, simple, rules):
+	if self.Format == 1:
+		classes = tuple(graph.coverageClass(c)
+				for c in self.LookAheadCoverage + self.BacktrackCoverage)
+		for i,g in graph.restrictCoverage(self.Coverage, glyphs):
+			rules.append(((g,), classes, (self.Substitute[i],), ()))
+	else:
+		assert 0, "unknown format: %s" % self.Format
+
+@_add_method(otTables.ContextSubst,
+			 otTables.ChainContextSubst)
+def collect_closure_rules(self, graph, glyphs, simple, rules):
+	c = self.__subset_classify_context()
+
+	def nested(r, inputLen, posGlyphs):
+		# Mirrors the 'chaos' logic of closure_glyphs()
+		nodes = []
+		chaos = set()
+		for ll in getattr(r, c.LookupRecord):
+			if not ll: continue
+			seqi = ll.SequenceIndex
+			lookup = graph.lookup(ll.LookupListIndex)
+			if lookup is None: continue
+			node = graph.node(ll.LookupListIndex,
+					  None if seqi in chaos else posGlyphs(seqi))
+			chaos.add(seqi)
+			if lookup.may_have_non_1to1():
+				chaos.update(range(seqi, inputLen))
+			nodes.append(node)
+		return tuple(nodes)
+
+	if self.Format == 1:
+		ContextData = c.ContextData(self)
+		rss = getattr(self, c.RuleSet)
+		rssCount = getattr(self, c.RuleSetCount)
+		for i,first in graph.restrictCoverage(c.Coverage(self), glyphs):
+			if i >= rssCount or not rss[i]: continue
+			for r in getattr(rss[i], c.Rule):
+				if not r: continue
+				ruleGlyphs = (first,) + tuple(k for klist in c.RuleData(r) for k in klist)
+				posGlyphs = lambda seqi: frozenset([first] if seqi == 0 else
+								   [r.Input[seqi - 1]])
+				rules.append((ruleGlyphs, (), (),
+					      nested(r, len(r.Input)+2, posGlyphs)))
+	elif self.Format == 2:
+		ClassDef = getattr(self, c.ClassDef)
+		ContextData = c.ContextData(self)
+		rss = getattr(self, c.RuleSet)
+		rssCount = getattr(self, c.RuleSetCount)
+		firsts = {}
+		for _,g in graph.restrictCoverage(c.Coverage(self), glyphs):
+			firsts.setdefault(ClassDef.classDefs.get(g, 0), set()).add(g)
+		for i,firstGlyphs in sorted(firsts.items()):
+			if i >= rssCount or not rss[i]: continue
+			firstGlyphs = frozenset(firstGlyphs)
+			firstClass = graph.glyphClass(firstGlyphs)
+			for r in getattr(rss[i], c.Rule):
+				if not r: continue
+				ruleClasses = [firstClass]
+				for cd,klist in zip(ContextData, c.RuleData(r)):
+					for k in klist:
+						if cd:
+							ruleClasses.append(graph.classDefClass(cd, k))
+						elif k != 0:
+							break
+					else:
+						continue
+					break
+				else:
+					Input = getattr(r, c.Input)
+					posGlyphs = lambda seqi: (firstGlyphs if seqi == 0 else
+								  graph.classDefGlyphs(ClassDef, Input[seqi - 1]))
+					rules.append(((), tuple(ruleClasses), (),
+						      nested(r, len(Input)+2, posGlyphs)))
+	elif self.Format == 3:
+		firstGlyphs = frozenset(g for _,g in graph.restrictCoverage(c.Coverage(self), glyphs))
+		if not firstGlyphs:
+			return
+		ruleClasses = (graph.glyphClass(firstGlyphs),) + tuple(
+			graph.coverageClass(x) for x in c.RuleData(self))
+		InputCoverage = self.InputCoverage if c.Chain else self.Coverage
+		posGlyphs = lambda seqi: (firstGlyphs if seqi == 0 else
+					  frozenset(InputCoverage[seqi].glyphs))
+		rules.append(((), ruleClasses, (),
+			      nested(self, len(InputCoverage)+1, posGlyphs)))
+	else:
+		assert 0, "unknown format: %s" % self.Format
+
+@_add_method(otTables.ExtensionSubst)
+def collect_closure_rules(self, graph, glyphs, simple, rules):
+	if self.Format == 1:
+		self.ExtSubTable.collect_closure_rules(graph, glyphs, simple, rules)
+	else:
+		assert 0, "unknown format: %s" % self.Format
+
 @_add_method(otTables.Lookup)
 def closure_glyphs(self, s, cur_glyphs=None):
 	if cur_glyphs is None:
@@ -1388,9 +1631,210 @@ def subset_glyphs(self, s):
 					 for strike in self.strikeData]
   return True
 
+class _ClosureGraph(object):
+	"""Index of the substitutions of a GSUB table, for closing glyph sets
+	over it without iterating all its lookups to a fixpoint.
+
+	Each node is a lookup applied to the glyphs of a set: all glyphs for
+	the lookups of the features, the glyphs at some input position for
+	the lookups invoked by contextual rules.  A node maps glyphs to the
+	glyphs they get substituted with, and has rules that add glyphs, or
+	make more nodes applicable, once all of the rule's glyphs and some
+	glyph of each of the rule's glyph classes are in the glyph set.
+	closure() only looks at the rules that the glyphs added so far can
+	make applicable.
+	"""
+
+	def __init__(self, table, lookup_indices):
+		self.lookups = table.LookupList.Lookup if table.LookupList else []
+		self.nodes = []
+		self.nodeIndices = {}
+		self.compiledNodes = {}
+		# Glyph classes are frozensets of glyphs, or ClassDefs standing
+		# for the glyphs they don't define (class 0)
+		self.classes = []
+		self.classIndices = {}
+		self.glyphClasses = {}
+		self.classDefGlyphSets = {}
+		self.coverageIndices = {}
+
+		self.roots = [self.node(i, None) for i in lookup_indices
+			      if self.lookup(i) is not None]
+
+	def lookup(self, lookupIndex):
+		if lookupIndex >= len(self.lookups):
+			return None
+		return self.lookups[lookupIndex] or None
+
+	def node(self, lookupIndex, glyphs):
+		"""Returns the index of the node applying lookup to glyphs (None
+		meaning all glyphs).  Nodes are compiled when first reached."""
+		if isinstance(glyphs, otTables.ClassDef):
+			key = (lookupIndex, id(glyphs))
+		else:
+			key = (lookupIndex, glyphs)
+		index = self.nodeIndices.get(key)
+		if index is None:
+			index = self.nodeIndices[key] = len(self.nodes)
+			self.nodes.append((lookupIndex, glyphs))
+		return index
+
+	def _compile(self, index):
+		lookupIndex, glyphs = self.nodes[index]
+		simple = {}
+		rules = []
+		for st in self.lookups[lookupIndex].SubTable:
+			if not st: continue
+			st.collect_closure_rules(self, glyphs, simple, rules)
+		node = self.compiledNodes[index] = (simple, rules)
+		return node
+
+	def _class(self, key, glyphs):
+		index = self.classIndices.get(key)
+		if index is None:
+			index = self.classIndices[key] = len(self.classes)
+			self.classes.append(glyphs)
+			if not isinstance(glyphs, otTables.ClassDef):
+				for g in glyphs:
+					self.glyphClasses.setdefault(g, []).append(index)
+		return index
+
+	def glyphClass(self, glyphs):
+		return self._class(glyphs, glyphs)
+
+	def coverageClass(self, coverage):
+		return self._class(id(coverage), frozenset(coverage.glyphs))
+
+	def classDefGlyphs(self, classDef, klass):
+		"""Returns the glyphs of class klass of classDef."""
+		if klass == 0:
+			return classDef
+		glyphSets = self.classDefGlyphSets.get(id(classDef))
+		if glyphSets is None:
+			glyphSets = {}
+			for g,v in classDef.classDefs.items():
+				glyphSets.setdefault(v, []).append(g)
+			glyphSets = self.classDefGlyphSets[id(classDef)] = {
+				v:frozenset(glyphs) for v,glyphs in glyphSets.items()}
+		return glyphSets.get(klass, frozenset())
+
+	def classDefClass(self, classDef, klass):
+		return self._class((id(classDef), klass),
+				   self.classDefGlyphs(classDef, klass))
+
+	@staticmethod
+	def _contains(glyphs, g):
+		if glyphs is None:
+			return True
+		if isinstance(glyphs, otTables.ClassDef):
+			return g not in glyphs.classDefs
+		return g in glyphs
+
+	def restrict(self, mapping, glyphs):
+		"""Returns the keys of mapping that are in glyphs."""
+		if isinstance(glyphs, frozenset) and len(glyphs) < len(mapping):
+			return [g for g in glyphs if g in mapping]
+		return [g for g in mapping if self._contains(glyphs, g)]
+
+	def restrictCoverage(self, coverage, glyphs):
+		"""Returns the (index, glyph) pairs of coverage that are in glyphs."""
+		if isinstance(glyphs, frozenset) and len(glyphs) < len(coverage.glyphs):
+			indices = self.coverageIndices.get(id(coverage))
+			if indices is None:
+				indices = self.coverageIndices[id(coverage)] = {
+					g:i for i,g in enumerate(coverage.glyphs)}
+			return sorted((indices[g], g) for g in glyphs if g in indices)
+		return [(i, g) for i,g in enumerate(coverage.glyphs)
+			if self._contains(glyphs, g)]
+
+	def closure(self, glyphs):
+		"""Adds to the set glyphs all glyphs they can be substituted with."""
+		compiledNodes = self.compiledNodes
+		classes = self.classes
+		glyphClasses = self.glyphClasses
+		active = set(self.roots)
+		pendingNodes = list(self.roots)
+		queue = []
+		waitingSimple = {}
+		waitingRules = {}
+		classStates = {}
+		openClassDefs = []
+
+		def add(g):
+			if g not in glyphs:
+				glyphs.add(g)
+				queue.append(g)
+
+		def fire(rule):
+			for g in rule[2]:
+				add(g)
+			for n in rule[3]:
+				if n not in active:
+					active.add(n)
+					pendingNodes.append(n)
+
+		def satisfy(waiting):
+			for state in waiting:
+				state[0] -= 1
+				if not state[0]:
+					fire(state[1])
+
+		while pendingNodes or queue:
+			if pendingNodes:
+				n = pendingNodes.pop()
+				simple, rules = compiledNodes.get(n) or self._compile(n)
+				for g,substitutes in simple.items():
+					if g in glyphs:
+						for v in substitutes:
+							add(v)
+					else:
+						waitingSimple.setdefault(g, []).append(substitutes)
+				for rule in rules:
+					state = [0, rule]
+					for g in rule[0]:
+						if g not in glyphs:
+							state[0] += 1
+							waitingRules.setdefault(g, []).append(state)
+					for c in rule[1]:
+						waiting = classStates.get(c)
+						if waiting is None:
+							cls = classes[c]
+							if isinstance(cls, otTables.ClassDef):
+								satisfied = any(g not in cls.classDefs for g in glyphs)
+								if not satisfied:
+									openClassDefs.append(c)
+							else:
+								satisfied = not cls.isdisjoint(glyphs)
+							waiting = classStates[c] = True if satisfied else []
+						if waiting is not True:
+							state[0] += 1
+							waiting.append(state)
+					if not state[0]:
+						fire(rule)
+				continue
+
+			g = queue.pop()
+			for substitutes in waitingSimple.pop(g, ()):
+				for v in substitutes:
+					add(v)
+			satisfy(waitingRules.pop(g, ()))
+			for c in glyphClasses.get(g, ()):
+				waiting = classStates.get(c)
+				if waiting is not None and waiting is not True:
+					classStates[c] = True
+					satisfy(waiting)
+			if openClassDefs:
+				for c in [c for c in openClassDefs
+					  if g not in classes[c].classDefs]:
+					openClassDefs.remove(c)
+					waiting = classStates[c]
+					classStates[c] = True
+					satisfy(waiting)
+
+
 @_add_method(ttLib.getTableClass('GSUB'))
-def closure_glyphs(self, s):
-	s.table = self.table
+def closure_lookups(self):
+	"""Returns the indices of the lookups of the features."""
 	if self.table.ScriptList:
 		feature_indices = self.table.ScriptList.collect_features()
 	else:
@@ -1401,7 +1845,29 @@ def closure_glyphs(self, s):
 		lookup_indices = []
 	if getattr(self.table, 'FeatureVariations', None):
 		lookup_indices += self.table.FeatureVariations.collect_lookups(feature_indices)
-	lookup_indices = _uniq_sort(lookup_indices)
+	return _uniq_sort(lookup_indices)
+
+@_add_method(ttLib.getTableClass('GSUB'))
+def closure_glyphs(self, s):
+	# The graphs are kept by the subsetter, by table, so that closing more
+	# glyph sets over the same table (see SubsetSession) does not rebuild
+	# them.
+	graphs = getattr(s, '_closure_graphs', None)
+	entry = graphs.get(id(self)) if graphs is not None else None
+	if entry is not None and entry[0] is self:
+		graph = entry[1]
+	else:
+		graph = _ClosureGraph(self.table, self.closure_lookups())
+		if graphs is not None:
+			graphs[id(self)] = (self, graph)
+	graph.closure(s.glyphs)
+
+@_add_method(ttLib.getTableClass('GSUB'))
+def closure_glyphs_iterative(self, s):
+	"""Closes s.glyphs over the lookups by applying them all until no
+	glyph gets added.  Much slower than closure_glyphs()."""
+	s.table = self.table
+	lookup_indices = self.closure_lookups()
 	if self.table.LookupList:
 		s._doneLookups = {}
 		while True:
@@ -2906,6 +3372,9 @@ class Subsetter(object):
 		self.unicodes_requested = set()
 		self.glyph_names_requested = set()
 		self.glyph_ids_requested = set()
+		# GSUB closure graphs, by id of the table, along with the table;
+		# see _closure_glyphs()
+		self._closure_graphs = None
 
 	def populate(self, glyphs=[], gids=[], unicodes=[], text=""):
 		self.unicodes_requested.update(unicodes)
@@ -2931,6 +3400,7 @@ class Subsetter(object):
 
 			if hasattr(clazz, 'prune_pre_subset'):
 				with timer("load '%s'" % tag):
+					font.markDirty(tag)
 					table = font[tag]
 				with timer("prune '%s'" % tag):
 					retain = table.prune_pre_subset(font, self.options)
@@ -2941,7 +3411,10 @@ class Subsetter(object):
 				else:
 					log.info("%s pruned", tag)
 
-	def _closure_glyphs(self, font):
+	def _closure_glyphs(self, font, closure_graphs=None):
+		# 'closure_graphs' keeps the GSUB closure graphs across subsetters,
+		# for fonts whose tables are not modified in between
+		self._closure_graphs = closure_graphs if closure_graphs is not None else {}
 
 		realGlyphs = set(font.getGlyphOrder())
 		glyph_order = font.getGlyphOrder()
@@ -3066,6 +3539,7 @@ class Subsetter(object):
 				log.info("%s subsetting not needed", tag)
 			elif hasattr(clazz, 'subset_glyphs'):
 				with timer("subset '%s'" % tag):
+					font.markDirty(tag)
 					table = font[tag]
 					self.glyphs = self.glyphs_all
 					retain = table.subset_glyphs(self)
@@ -3081,6 +3555,13 @@ class Subsetter(object):
 				log.warning("%s NOT subset; don't know how to subset; dropped", tag)
 				del font[tag]
 
+		if font.lazy:
+			with timer("decompile lazily loaded tables"):
+				seen = set()
+				for table in font.tables.values():
+					if isinstance(table, BaseTTXConverter):
+						_ensure_decompiled(table.table, seen)
+
 		with timer("subset GlyphOrder"):
 			glyphOrder = font.getGlyphOrder()
 			glyphOrder = [g for g in glyphOrder if g in self.glyphs_all]
@@ -3091,6 +3572,7 @@ class Subsetter(object):
 		for tag in font.keys():
 			if tag == 'GlyphOrder': continue
 			if tag == 'OS/2' and self.options.prune_unicode_ranges:
+				font.markDirty(tag)
 				old_uniranges = font[tag].getUnicodeRanges()
 				new_uniranges = font[tag].recalcUnicodeRanges(font, pruneOnly=True)
 				if old_uniranges != new_uniranges:
@@ -3104,6 +3586,7 @@ class Subsetter(object):
 			clazz = ttLib.getTableClass(tag)
 			if hasattr(clazz, 'prune_post_subset'):
 				with timer("prune '%s'" % tag):
+					font.markDirty(tag)
 					table = font[tag]
 					retain = table.prune_post_subset(font, self.options)
 				if not retain:
@@ -3169,6 +3652,70 @@ def save_font(font, outfile, options):
 	font.flavor = options.flavor
 	font.save(outfile, reorderTables=options.canonical_order)
 
+
+class SubsetSession(object):
+	"""Subset the same font many times with the same options.
+
+	The source font is loaded and pruned once (dropping the tables,
+	features, name records, etc. that the options leave out), and kept
+	decompiled to compute the glyph closure of each request (over 'cmap',
+	'GSUB', 'MATH', 'COLR', 'glyf', 'CFF ', ...), so that none of these
+	tables is parsed again.
+
+	Each call to subset() returns a new, independent TTFont made from the
+	in-memory data of the pruned font: the tables that need subsetting
+	are decompiled from it, as lazily as the source font was loaded, and
+	the others are written back out as they are.  The source font is
+	never modified.
+
+	  session = SubsetSession("font.ttf", options)
+	  for text, outfile in requests:
+	    font = session.subset(text=text)
+	    save_font(font, outfile, options)
+	"""
+
+	def __init__(self, font, options=None):
+		if not options:
+			options = Options()
+		self.options = options
+
+		if not isinstance(font, ttLib.TTFont):
+			font = load_font(font, options)
+
+		with timer("snapshot font tables"):
+			snapshot = _FontSnapshot(font)
+
+		# The pruned font the glyph closures are computed on.  Closing
+		# the glyph set over a table does not modify it.
+		self.font = snapshot.newFont()
+		Subsetter(self.options)._prune_pre_subset(self.font)
+		snapshot.close()
+		self._closure_graphs = {}
+
+		# Pruning does not depend on the glyphs requested: the fonts to
+		# subset are all copies of the pruned font.
+		with timer("snapshot pruned font tables"):
+			self._snapshot = _FontSnapshot(self.font)
+
+	def subset(self, glyphs=[], gids=[], unicodes=[], text=""):
+		"""Return a new TTFont subsetted to the given glyph names, glyph
+		ids, Unicode codepoints and text, as Subsetter.populate() takes
+		them.
+		"""
+		subsetter = Subsetter(self.options)
+		subsetter.populate(glyphs=glyphs, gids=gids, unicodes=unicodes, text=text)
+		with timer("close glyph list"):
+			subsetter._closure_glyphs(self.font, self._closure_graphs)
+		font = self._snapshot.newFont()
+		subsetter._subset_glyphs(font)
+		subsetter._prune_post_subset(font)
+		return font
+
+	def close(self):
+		self.font.close()
+		self._snapshot.close()
+
+
 def parse_unicodes(s):
 	import re
 	s = re.sub (r"0[xX]", " ", s)
@@ -3332,6 +3879,7 @@ def main(args=None):
 __all__ = [
 	'Options',
 	'Subsetter',
+	'SubsetSession',
 	'load_font',
 	'save_font',
 	'parse_gids',
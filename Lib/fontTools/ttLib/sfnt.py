@@ -1,8 +1,9 @@
 """ttLib/sfnt.py -- low-level module to deal with the sfnt file format.
 
-Defines two public classes:
+Defines three public classes:
 	SFNTReader
 	SFNTWriter
+	CompressionOptions
 
 (Normally you don't have to use these classes explicitly; they are
 used automatically by ttLib.TTFont.)
@@ -17,6 +18,7 @@ from fontTools.misc.py23 import *
 from fontTools.misc import sstruct
 from fontTools.ttLib import TTLibError
 import struct
+import mmap
 from collections import OrderedDict
 import logging
 
@@ -45,6 +47,7 @@ class SFNTReader(object):
 	def __init__(self, file, checkChecksums=1, fontNumber=-1):
 		self.file = file
 		self.checkChecksums = checkChecksums
+		self.buffer = getMappedBuffer(file)
 
 		self.flavor = None
 		self.flavorData = None
@@ -100,13 +103,19 @@ class SFNTReader(object):
 		return self.tables.keys()
 
 	def __getitem__(self, tag):
-		"""Fetch the raw table data."""
+		"""Fetch the raw table data. If the file is memory-mapped, this is
+		a read-only memoryview slice of the mapping rather than a bytes string.
+		"""
 		entry = self.tables[Tag(tag)]
-		data = entry.loadData (self.file)
+		if self.buffer is not None:
+			data = entry.loadDataFromBuffer(self.buffer)
+		else:
+			data = entry.loadData(self.file)
 		if self.checkChecksums:
 			if tag == 'head':
 				# Beh: we have to special-case the 'head' table.
-				checksum = calcChecksum(data[:8] + b'\0\0\0\0' + data[12:])
+				checksum = calcChecksum(
+					bytes(data[:8]) + b'\0\0\0\0' + bytes(data[12:]))
 			else:
 				checksum = calcChecksum(data)
 			if self.checkChecksums > 1:
@@ -121,7 +130,27 @@ class SFNTReader(object):
 		del self.tables[Tag(tag)]
 
 	def close(self):
-		self.file.close()
+		if self.buffer is not None:
+			self.buffer.release()
+		try:
+			self.file.close()
+		except BufferError:
+			# memoryview slices of the mapping are still alive, e.g. in
+			# decompiled tables; the mapping is released along with them.
+			pass
+
+
+def getMappedBuffer(file):
+	"""Return a read-only memoryview over 'file' if it is a memory map
+	(see mmap.mmap), or None otherwise. On Python 2, mmap objects do not
+	support the new buffer protocol, and None is always returned.
+	"""
+	if not isinstance(file, mmap.mmap):
+		return None
+	try:
+		return memoryview(file)
+	except TypeError:
+		return None
 
 
 # default compression level for WOFF 1.0 tables and metadata
@@ -147,21 +176,121 @@ ZOPFLI_LEVELS = {
 }
 
 
-def compress(data, level=ZLIB_COMPRESSION_LEVEL):
-	""" Compress 'data' to Zlib format. If 'USE_ZOPFLI' variable is True,
-	zopfli is used instead of the zlib module.
+def compress(data, level=ZLIB_COMPRESSION_LEVEL, useZopfli=None,
+		zopfliIterations=None):
+	""" Compress 'data' to Zlib format. If 'useZopfli' is True (or, when it's
+	None, if the 'USE_ZOPFLI' variable is True), zopfli is used instead of the
+	zlib module.
 	The compression 'level' must be between 0 and 9. 1 gives best speed,
 	9 gives best compression (0 gives no compression at all).
 	The default value is a compromise between speed and compression (6).
+	With zopfli, 'zopfliIterations' overrides the number of iterations that
+	is otherwise derived from 'level' via ZOPFLI_LEVELS.
 	"""
 	if not (0 <= level <= 9):
 		raise ValueError('Bad compression level: %s' % level)
-	if not USE_ZOPFLI or level == 0:
+	if useZopfli is None:
+		useZopfli = USE_ZOPFLI
+	if not useZopfli or level == 0:
 		from zlib import compress
 		return compress(data, level)
 	else:
 		from zopfli.zlib import compress
-		return compress(data, numiterations=ZOPFLI_LEVELS[level])
+		if zopfliIterations is None:
+			zopfliIterations = ZOPFLI_LEVELS[level]
+		return compress(data, numiterations=zopfliIterations)
+
+
+class CompressionOptions(object):
+	""" Settings for compressing WOFF and WOFF2 font data.
+
+	An instance, or the name of one of the 'presets' below, can be passed
+	as the 'compression' argument of TTFont.save(), or assigned to the
+	'compression' attribute of a font's flavorData.
+
+	'zlibLevel' (0-9) is used for WOFF 1.0 tables and metadata; when None,
+	the 'ZLIB_COMPRESSION_LEVEL' module default applies. 'useZopfli' and
+	'zopfliIterations' are passed on to compress().
+	'brotliQuality' (0-11) and 'brotliWindow' (the base-2 logarithm of the
+	window size, 10-24) are used for WOFF2; when None, brotli's own defaults
+	(11 and 22) apply. Keyword arguments override the values of 'preset'.
+
+		>>> options = CompressionOptions("fast", zlibLevel=3)
+		>>> options.zlibLevel, options.brotliQuality
+		(3, 5)
+	"""
+
+	presets = {
+		"default": {},
+		# e.g. for compressing fonts on the fly when serving them
+		"fast": dict(zlibLevel=1, brotliQuality=5),
+		# smallest files, e.g. for static builds
+		"max": dict(zlibLevel=9, brotliQuality=11, brotliWindow=24),
+	}
+
+	def __init__(self, preset=None, zlibLevel=None, useZopfli=None,
+			zopfliIterations=None, brotliQuality=None, brotliWindow=None):
+		self.zlibLevel = zlibLevel
+		self.useZopfli = useZopfli
+		self.zopfliIterations = zopfliIterations
+		self.brotliQuality = brotliQuality
+		self.brotliWindow = brotliWindow
+		if preset is not None:
+			if preset not in self.presets:
+				raise ValueError("Unknown compression preset: %r" % preset)
+			for attr, value in self.presets[preset].items():
+				if getattr(self, attr) is None:
+					setattr(self, attr, value)
+
+	@classmethod
+	def fromValue(cls, value):
+		""" Return CompressionOptions for 'value', which can be None (for
+		the defaults), a preset name, or a CompressionOptions instance.
+		"""
+		if value is None:
+			return cls()
+		if isinstance(value, cls):
+			return value
+		return cls(value)
+
+	def __repr__(self):
+		attrs = ("zlibLevel", "useZopfli", "zopfliIterations",
+			"brotliQuality", "brotliWindow")
+		return "%s(%s)" % (self.__class__.__name__, ", ".join(
+			"%s=%r" % (attr, getattr(self, attr))
+			for attr in attrs if getattr(self, attr) is not None))
+
+	def compressZlib(self, data, level=None):
+		""" Compress 'data' to Zlib format. 'level' is used when the options
+		don't specify one; it defaults to 'ZLIB_COMPRESSION_LEVEL'.
+		"""
+		if self.zlibLevel is not None:
+			level = self.zlibLevel
+		elif level is None:
+			level = ZLIB_COMPRESSION_LEVEL
+		return compress(data, level, self.useZopfli, self.zopfliIterations)
+
+	def _brotliParams(self, mode):
+		params = {"mode": mode}
+		if self.brotliQuality is not None:
+			params["quality"] = self.brotliQuality
+		if self.brotliWindow is not None:
+			params["lgwin"] = self.brotliWindow
+		return params
+
+	def compressBrotli(self, data, mode):
+		""" Compress 'data' with brotli, using the given brotli 'mode'. """
+		import brotli
+		return brotli.compress(data, **self._brotliParams(mode))
+
+	def brotliCompressor(self, mode):
+		""" Return a streaming brotli.Compressor object, or None if the
+		brotli module doesn't support streaming compression.
+		"""
+		import brotli
+		if not hasattr(brotli, "Compressor"):
+			return None
+		return brotli.Compressor(**self._brotliParams(mode))
 
 
 class SFNTWriter(object):
@@ -184,12 +313,13 @@ class SFNTWriter(object):
 		return object.__new__(cls)
 
 	def __init__(self, file, numTables, sfntVersion="\000\001\000\000",
-			flavor=None, flavorData=None):
+			flavor=None, flavorData=None, compression=None):
 		self.file = file
 		self.numTables = numTables
 		self.sfntVersion = Tag(sfntVersion)
 		self.flavor = flavor
 		self.flavorData = flavorData
+		self.compression = _getCompressionOptions(compression, flavorData)
 
 		if self.flavor == "woff":
 			self.directoryFormat = woffDirectoryFormat
@@ -237,6 +367,7 @@ class SFNTWriter(object):
 			entry.uncompressed = True
 		else:
 			entry.checkSum = calcChecksum(data)
+		entry.compression = self.compression
 		entry.saveData(self.file, data)
 
 		if self.flavor == "woff":
@@ -286,7 +417,7 @@ class SFNTWriter(object):
 				self.metaOrigLength = len(data.metaData)
 				self.file.seek(0,2)
 				self.metaOffset = self.file.tell()
-				compressedMetaData = compress(data.metaData)
+				compressedMetaData = self.compression.compressZlib(data.metaData)
 				self.metaLength = len(compressedMetaData)
 				self.file.write(compressedMetaData)
 			else:
@@ -457,6 +588,16 @@ class DirectoryEntry(object):
 			data = self.decodeData(data)
 		return data
 
+	def loadDataFromBuffer(self, buffer):
+		"""Like loadData, but slice the data out of a buffer object (e.g.
+		a memoryview) without copying, unless it needs decoding.
+		"""
+		data = buffer[self.offset:self.offset + self.length]
+		assert len(data) == self.length
+		if hasattr(self.__class__, 'decodeData'):
+			data = self.decodeData(data)
+		return data
+
 	def saveData(self, file, data):
 		if hasattr(self.__class__, 'encodeData'):
 			data = self.encodeData(data)
@@ -490,6 +631,8 @@ class WOFFDirectoryEntry(DirectoryEntry):
 		# use the class attribute if it was already set.
 		if not hasattr(WOFFDirectoryEntry, 'zlibCompressionLevel'):
 			self.zlibCompressionLevel = ZLIB_COMPRESSION_LEVEL
+		# CompressionOptions set by the SFNTWriter, if any
+		self.compression = None
 
 	def decodeData(self, rawData):
 		import zlib
@@ -504,7 +647,11 @@ class WOFFDirectoryEntry(DirectoryEntry):
 	def encodeData(self, data):
 		self.origLength = len(data)
 		if not self.uncompressed:
-			compressedData = compress(data, self.zlibCompressionLevel)
+			if self.compression is not None:
+				compressedData = self.compression.compressZlib(
+					data, self.zlibCompressionLevel)
+			else:
+				compressedData = compress(data, self.zlibCompressionLevel)
 		if self.uncompressed or len(compressedData) >= self.origLength:
 			# Encode uncompressed
 			rawData = data
@@ -523,6 +670,8 @@ class WOFFFlavorData():
 		self.minorVersion = None
 		self.metaData = None
 		self.privData = None
+		# CompressionOptions, or a preset name, to use when writing the font
+		self.compression = None
 		if reader:
 			self.majorVersion = reader.majorVersion
 			self.minorVersion = reader.minorVersion
@@ -541,6 +690,15 @@ class WOFFFlavorData():
 				self.privData = data
 
 
+def _getCompressionOptions(compression, flavorData):
+	"""Return the CompressionOptions for a writer: 'compression' takes
+	precedence over the flavorData's own 'compression' attribute.
+	"""
+	if compression is None and flavorData is not None:
+		compression = getattr(flavorData, 'compression', None)
+	return CompressionOptions.fromValue(compression)
+
+
 def calcChecksum(data):
 	"""Calculate the checksum for an arbitrary block of data.
 	Optionally takes a 'start' argument, which allows you to
@@ -557,7 +715,7 @@ def calcChecksum(data):
 	"""
 	remainder = len(data) % 4
 	if remainder:
-		data += b"\0" * (4 - remainder)
+		data = bytes(data) + b"\0" * (4 - remainder)
 	value = 0
 	blockSize = 4096
 	assert blockSize % 4 == 0
@@ -0,0 +1,122 @@
+"""ttLib/tableCache.py -- a cache of decompiled tables, shared between fonts.
+
+Defines one public class:
+	TableCache
+
+A TableCache can be passed to TTFont (or TTCollection) with the 'tableCache'
+argument. Fonts that share a cache get the very same table object for
+tables whose binary data are identical, which saves both the time needed
+to decompile the table and the memory needed to hold it.
+
+Tables are only shared between fonts that decompile them alike: the key
+of most tables includes a digest of the font's glyph order, and the key
+of tables like 'loca' or 'hmtx' the digests of the tables they are read
+with (e.g. 'head' or 'hhea'). A font must call TTFont.markDirty() before
+modifying a table, so that it gets its own copy of it.
+"""
+
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from collections import OrderedDict
+import hashlib
+import threading
+
+
+# tables that are never shared: 'post' hands the glyph names it decoded
+# over to the font, only once
+_unsharedTags = frozenset(["post"])
+
+# tables whose decompiled form does not depend on the glyph order
+_glyphOrderIndependentTags = frozenset([
+	"head", "hhea", "vhea", "maxp", "CFF ", "name", "OS/2", "loca",
+	"cvt ", "fpgm", "prep", "gasp", "fvar", "avar", "STAT", "meta", "DSIG",
+	"ltag",
+])
+
+# other tables that the decompiled form of a table depends upon
+_decompileDependencies = {
+	"loca": ("head",),
+	"glyf": ("head", "loca", "maxp"),
+	"hmtx": ("hhea", "maxp"),
+	"vmtx": ("vhea", "maxp"),
+	"hdmx": ("hmtx", "hhea", "maxp"),
+	"gvar": ("fvar", "head", "loca", "maxp", "glyf"),
+	"cvar": ("fvar", "cvt "),
+	"avar": ("fvar",),
+}
+
+
+class TableCache(object):
+
+	"""A size-bounded cache of decompiled tables, with least-recently-used
+	eviction. Entries are keyed by the table tag and a SHA-256 digest of
+	the table data, so that the (possibly large) data itself is not kept
+	alive nor compared by the cache.
+
+	'maxsize' is the maximum number of tables held; if None, the cache
+	grows without bound.
+
+	The 'hits' and 'misses' attributes count the lookups performed by
+	get(). The cache can be shared between threads.
+	"""
+
+	def __init__(self, maxsize=128):
+		if maxsize is not None and maxsize < 0:
+			raise ValueError("maxsize must be None or >= 0: %r" % maxsize)
+		self.maxsize = maxsize
+		self.hits = 0
+		self.misses = 0
+		self._entries = OrderedDict()
+		self._lock = threading.Lock()
+
+	@staticmethod
+	def digest(data):
+		"""Return the digest of the binary 'data' used in cache keys."""
+		return hashlib.sha256(data).digest()
+
+	@classmethod
+	def makeKey(cls, tag, data, context=()):
+		"""Return the cache key for the table 'tag' with binary 'data'.
+		'context' is a sequence of digests of whatever else the decompiled
+		table depends upon, e.g. the glyph order of the font.
+		"""
+		return (Tag(tag), cls.digest(data), tuple(context))
+
+	def get(self, key, default=None):
+		"""Return the table cached for 'key', or 'default' if there is none.
+		A found table becomes the most recently used one.
+		"""
+		with self._lock:
+			try:
+				table = self._entries.pop(key)
+			except KeyError:
+				self.misses += 1
+				return default
+			self._entries[key] = table
+			self.hits += 1
+			return table
+
+	def __setitem__(self, key, table):
+		with self._lock:
+			self._entries.pop(key, None)
+			self._entries[key] = table
+			if self.maxsize is not None:
+				while len(self._entries) > self.maxsize:
+					self._entries.popitem(last=False)
+
+	def __contains__(self, key):
+		return key in self._entries
+
+	def __len__(self):
+		return len(self._entries)
+
+	def clear(self):
+		"""Remove all tables from the cache, and reset the statistics."""
+		with self._lock:
+			self._entries.clear()
+			self.hits = self.misses = 0
+
+	def __repr__(self):
+		return "<%s maxsize=%r size=%d hits=%d misses=%d>" % (
+			self.__class__.__name__, self.maxsize, len(self._entries),
+			self.hits, self.misses)
@@ -6,13 +6,15 @@ from . import DefaultTable
 
 class table_C_F_F_(DefaultTable.DefaultTable):
 
+	acceptsBuffer = True
+
 	def __init__(self, tag=None):
 		DefaultTable.DefaultTable.__init__(self, tag)
 		self.cff = cffLib.CFFFontSet()
 		self._gaveGlyphOrder = False
 
 	def decompile(self, data, otFont):
-		self.cff.decompile(BytesIO(data), otFont, isCFF2=False)
+		self.cff.decompile(openBuffer(data), otFont, isCFF2=False)
 		assert len(self.cff) == 1, "can't deal with multi-font CFF tables."
 
 	def compile(self, otFont):
@@ -45,3 +47,43 @@ class table_C_F_F_(DefaultTable.DefaultTable):
 		if not hasattr(self, "cff"):
 			self.cff = cffLib.CFFFontSet()
 		self.cff.fromXML(name, attrs, content, otFont)
+
+
+def openBuffer(data):
+	"""Return a readable stream over 'data'. Buffer objects other than bytes
+	(e.g. a memoryview over a memory-mapped font file) are wrapped without
+	copying them first, as BytesIO would.
+	"""
+	if isinstance(data, bytes):
+		return BytesIO(data)
+	return _BufferReader(data)
+
+
+class _BufferReader(object):
+
+	"""Minimal read-only file object over a buffer. Each read() returns a
+	bytes copy of the requested slice only.
+	"""
+
+	def __init__(self, data):
+		self.data = data
+		self.pos = 0
+
+	def read(self, count=-1):
+		pos = self.pos
+		if count < 0:
+			newpos = len(self.data)
+		else:
+			newpos = min(pos + count, len(self.data))
+		self.pos = newpos
+		return bytes(self.data[pos:newpos])
+
+	def seek(self, pos, whence=0):
+		if whence == 1:
+			pos += self.pos
+		elif whence == 2:
+			pos += len(self.data)
+		self.pos = pos
+
+	def tell(self):
+		return self.pos
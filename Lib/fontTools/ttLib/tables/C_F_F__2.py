@@ -1,13 +1,13 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools import cffLib
-from fontTools.ttLib.tables.C_F_F_ import table_C_F_F_
+from fontTools.ttLib.tables.C_F_F_ import table_C_F_F_, openBuffer
 
 
 class table_C_F_F__2(table_C_F_F_):
 
     def decompile(self, data, otFont):
-        self.cff.decompile(BytesIO(data), otFont, isCFF2=True)
+        self.cff.decompile(openBuffer(data), otFont, isCFF2=True)
         assert len(self.cff) == 1, "can't deal with multi-font CFF tables."
 
     def compile(self, otFont):
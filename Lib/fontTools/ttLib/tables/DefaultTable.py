@@ -6,6 +6,10 @@ class DefaultTable(object):
 
 	dependencies = []
 
+	# True if decompile() can work on any read-only buffer object, such as a
+	# memoryview over a memory-mapped font file, rather than only on bytes.
+	acceptsBuffer = False
+
 	def __init__(self, tag=None):
 		if tag is None:
 			tag = getClassTag(self.__class__)
@@ -28,12 +28,79 @@ TUPLE_INDEX_MASK = 0x0fff
 
 log = logging.getLogger(__name__)
 
+# a run of zero deltas is at most DELTA_RUN_COUNT_MASK + 1 long
+_ZERO_DELTAS = array.array("h", [0] * (DELTA_RUN_COUNT_MASK + 1))
+
 
 class TupleVariation(object):
 	def __init__(self, axes, coordinates):
 		self.axes = axes.copy()
 		self.coordinates = coordinates[:]
 
+	@classmethod
+	def fromDeltaArrays(cls, axes, mask, deltasX, deltasY=None):
+		"""Create a TupleVariation from packed arrays of deltas.
+
+		'mask' is a bytearray holding a non-zero byte for each point that
+		has an explicit delta. 'deltasX' and 'deltasY' are sequences of
+		numbers (typically array.array objects) holding the deltas of
+		all points, including the masked out ones; for 'cvar' variations,
+		'deltasY' is None.
+
+		The arrays are kept as they are until the 'coordinates' attribute is
+		accessed, at which point they get expanded into the usual list of
+		(x, y) tuples, ints and None. Until then, compiling the variation
+		works on the arrays directly.
+		"""
+		self = cls.__new__(cls)
+		self.axes = axes.copy()
+		self._coordinates = None
+		self._deltaArrays = (mask, deltasX, deltasY)
+		return self
+
+	@property
+	def coordinates(self):
+		if self._coordinates is None:
+			mask, deltasX, deltasY = self._deltaArrays
+			if deltasY is None:
+				self._coordinates = [x if m else None
+				                     for m, x in zip(mask, deltasX)]
+			else:
+				self._coordinates = [(x, y) if m else None
+				                     for m, x, y in zip(mask, deltasX, deltasY)]
+			# the list may be modified by the caller, the arrays are stale now
+			self._deltaArrays = None
+		return self._coordinates
+
+	@coordinates.setter
+	def coordinates(self, value):
+		self._coordinates = value
+		self._deltaArrays = None
+
+	def getDeltaArrays(self):
+		"""Return a (mask, deltasX, deltasY) tuple of packed arrays, in the
+		format accepted by fromDeltaArrays(). deltasY is None if this is
+		a 'cvar' variation, or if all the deltas are None.
+
+		The result must not be modified.
+		"""
+		if self._deltaArrays is not None:
+			return self._deltaArrays
+		coordinates = self._coordinates
+		mask = bytearray(c is not None for c in coordinates)
+		deltasX = array.array("d", [0]) * len(coordinates)
+		deltasY = None
+		for i, c in enumerate(coordinates):
+			if c is None:
+				continue
+			if type(c) is tuple:
+				if deltasY is None:
+					deltasY = array.array("d", [0]) * len(coordinates)
+				deltasX[i], deltasY[i] = c
+			else:
+				deltasX[i] = c
+		return mask, deltasX, deltasY
+
 	def __repr__(self):
 		axes = ",".join(sorted(["%s=%s" % (name, value) for (name, value) in self.axes.items()]))
 		return "<TupleVariation %s %s>" % (axes, self.coordinates)
@@ -42,6 +109,8 @@ class TupleVariation(object):
 		return self.coordinates == other.coordinates and self.axes == other.axes
 
 	def getUsedPoints(self):
+		if self._deltaArrays is not None:
+			return {i for i, m in enumerate(self._deltaArrays[0]) if m}
 		result = set()
 		for i, point in enumerate(self.coordinates):
 			if point is not None:
@@ -54,6 +123,8 @@ class TupleVariation(object):
 		If the result is False, the TupleVariation can be omitted from the font
 		without making any visible difference.
 		"""
+		if self._deltaArrays is not None:
+			return any(self._deltaArrays[0])
 		for c in self.coordinates:
 			if c is not None:
 				return True
@@ -141,7 +212,7 @@ class TupleVariation(object):
 			usesSharedPoints = True
 		else:
 			flags |= PRIVATE_POINT_NUMBERS
-			numPointsInGlyph = len(self.coordinates)
+			numPointsInGlyph = self.getNumPoints_()
 			auxData = self.compilePoints(points, numPointsInGlyph) + self.compileDeltas(points)
 			usesSharedPoints = False
 
@@ -208,36 +279,27 @@ class TupleVariation(object):
 			result = [bytechr((numPoints >> 8) | 0x80) + bytechr(numPoints & 0xff)]
 
 		MAX_RUN_LENGTH = 127
+		# the deltas between consecutive point numbers; they are never
+		# negative, as the points are sorted
+		deltas = points[:1] + [cur - prev for prev, cur in zip(points, points[1:])]
 		pos = 0
-		lastValue = 0
 		while pos < numPoints:
-			run = io.BytesIO()
-			runLength = 0
-			useByteEncoding = None
-			while pos < numPoints and runLength <= MAX_RUN_LENGTH:
-				curValue = points[pos]
-				delta = curValue - lastValue
-				if useByteEncoding is None:
-					useByteEncoding = 0 <= delta <= 0xff
-				if useByteEncoding and (delta > 0xff or delta < 0):
-					# we need to start a new run (which will not use byte encoding)
-					break
+			end = min(pos + MAX_RUN_LENGTH + 1, numPoints)
+			if deltas[pos] <= 0xff:
+				runEnd = pos + 1
+				while runEnd < end and deltas[runEnd] <= 0xff:
+					runEnd += 1
 				# TODO This never switches back to a byte-encoding from a short-encoding.
 				# That's suboptimal.
-				if useByteEncoding:
-					run.write(bytechr(delta))
-				else:
-					run.write(bytechr(delta >> 8))
-					run.write(bytechr(delta & 0xff))
-				lastValue = curValue
-				pos += 1
-				runLength += 1
-			if useByteEncoding:
-				runHeader = bytechr(runLength - 1)
+				run = array.array("B", deltas[pos:runEnd])
+				result.append(bytechr(runEnd - pos - 1))
 			else:
-				runHeader = bytechr((runLength - 1) | POINTS_ARE_WORDS)
-			result.append(runHeader)
-			result.append(run.getvalue())
+				runEnd = end
+				run = array.array("H", deltas[pos:runEnd])
+				if sys.byteorder != "big": run.byteswap()
+				result.append(bytechr((runEnd - pos - 1) | POINTS_ARE_WORDS))
+			result.append(run.tostring())
+			pos = runEnd
 
 		return bytesjoin(result)
 
@@ -289,7 +351,14 @@ class TupleVariation(object):
 			            (",".join(sorted(badPoints)), tableTag))
 		return (result, pos)
 
+	def getNumPoints_(self):
+		if self._deltaArrays is not None:
+			return len(self._deltaArrays[0])
+		return len(self._coordinates)
+
 	def compileDeltas(self, points):
+		if self._deltaArrays is not None:
+			return self.compileDeltaArrays_(points)
 		deltaX = []
 		deltaY = []
 		for p in sorted(list(points)):
@@ -303,6 +372,20 @@ class TupleVariation(object):
 				raise ValueError("invalid type of delta: %s" % type(c))
 		return self.compileDeltaValues_(deltaX) + self.compileDeltaValues_(deltaY)
 
+	def compileDeltaArrays_(self, points):
+		mask, deltasX, deltasY = self._deltaArrays
+		if len(points) == len(mask):
+			# all points are used, no need to pick the deltas one by one
+			deltaX, deltaY = deltasX, deltasY
+		else:
+			points = [p for p in sorted(points) if mask[p]]
+			deltaX = _pickDeltas(deltasX, points)
+			deltaY = _pickDeltas(deltasY, points) if deltasY is not None else None
+		result = self.compileDeltaValues_(deltaX)
+		if deltaY is not None:
+			result += self.compileDeltaValues_(deltaY)
+		return result
+
 	@staticmethod
 	def compileDeltaValues_(deltas):
 		"""[value1, value2, value3, ...] --> bytestring
@@ -367,8 +450,8 @@ class TupleVariation(object):
 			runLength += 1
 		assert runLength >= 1 and runLength <= 64
 		stream.write(bytechr(runLength - 1))
-		for i in range(offset, pos):
-			stream.write(struct.pack('b', otRound(deltas[i])))
+		run = array.array("b", _roundDeltas(deltas[offset:pos]))
+		stream.write(run.tostring())
 		return pos
 
 	@staticmethod
@@ -401,33 +484,42 @@ class TupleVariation(object):
 			runLength += 1
 		assert runLength >= 1 and runLength <= 64
 		stream.write(bytechr(DELTAS_ARE_WORDS | (runLength - 1)))
-		for i in range(offset, pos):
-			stream.write(struct.pack('>h', otRound(deltas[i])))
+		run = array.array("h", _roundDeltas(deltas[offset:pos]))
+		if sys.byteorder != "big": run.byteswap()
+		stream.write(run.tostring())
 		return pos
 
 	@staticmethod
 	def decompileDeltas_(numDeltas, data, offset):
 		"""(numDeltas, data, offset) --> ([delta, delta, ...], newOffset)"""
-		result = []
+		result, pos = TupleVariation.decompileDeltaArray_(numDeltas, data, offset)
+		return (result.tolist(), pos)
+
+	@staticmethod
+	def decompileDeltaArray_(numDeltas, data, offset):
+		"""(numDeltas, data, offset) --> (array('h', [delta, ...]), newOffset)"""
+		result = array.array("h")
 		pos = offset
 		while len(result) < numDeltas:
 			runHeader = byteord(data[pos])
 			pos += 1
 			numDeltasInRun = (runHeader & DELTA_RUN_COUNT_MASK) + 1
 			if (runHeader & DELTAS_ARE_ZERO) != 0:
-				result.extend([0] * numDeltasInRun)
-			else:
-				if (runHeader & DELTAS_ARE_WORDS) != 0:
-					deltas = array.array("h")
-					deltasSize = numDeltasInRun * 2
-				else:
-					deltas = array.array("b")
-					deltasSize = numDeltasInRun
+				result.extend(_ZERO_DELTAS[:numDeltasInRun])
+			elif (runHeader & DELTAS_ARE_WORDS) != 0:
+				deltasSize = numDeltasInRun * 2
+				deltas = array.array("h")
 				deltas.fromstring(data[pos:pos+deltasSize])
 				if sys.byteorder != "big": deltas.byteswap()
 				assert len(deltas) == numDeltasInRun
 				pos += deltasSize
 				result.extend(deltas)
+			else:
+				deltas = array.array("b")
+				deltas.fromstring(data[pos:pos+numDeltasInRun])
+				assert len(deltas) == numDeltasInRun
+				pos += numDeltasInRun
+				result.extend(array.array("h", deltas))
 		assert len(result) == numDeltas
 		return (result, pos)
 
@@ -441,6 +533,19 @@ class TupleVariation(object):
 		return size
 
 
+def _pickDeltas(deltas, points):
+	picked = [deltas[p] for p in points]
+	if isinstance(deltas, array.array):
+		return array.array(deltas.typecode, picked)
+	return picked
+
+
+def _roundDeltas(deltas):
+	if isinstance(deltas, array.array) and deltas.typecode in "bhil":
+		return deltas  # integers already
+	return [v if type(v) is int else otRound(v) for v in deltas]
+
+
 def decompileSharedTuples(axisTags, sharedTupleCount, data, offset):
 	result = []
 	for _ in range(sharedTupleCount):
@@ -524,7 +629,7 @@ def compileTupleVariationStore(variations, pointCount,
 			data.append(privateData)
 	if someTuplesSharePoints:
 		# Use the last of the variations that share points for compiling the packed point data
-		data = sharedPointVariation.compilePoints(usedPoints, len(sharedPointVariation.coordinates)) + bytesjoin(data)
+		data = sharedPointVariation.compilePoints(usedPoints, sharedPointVariation.getNumPoints_()) + bytesjoin(data)
 		tupleVariationCount = TUPLES_SHARE_POINT_NUMBERS | len(tuples)
 	else:
 		data = bytesjoin(data)
@@ -582,25 +687,31 @@ def decompileTupleVariation_(pointCount, sharedTuples, sharedPoints,
 	else:
 		points = sharedPoints
 
-	deltas = [None] * pointCount
+	numPoints = len(points)
+	deltasX, pos = TupleVariation.decompileDeltaArray_(numPoints, tupleData, pos)
+	if tableTag == "gvar":
+		deltasY, pos = TupleVariation.decompileDeltaArray_(numPoints, tupleData, pos)
+	else:
+		deltasY = None
 
-	if tableTag == "cvar":
-		deltas_cvt, pos = TupleVariation.decompileDeltas_(
-			len(points), tupleData, pos)
-		for p, delta in zip(points, deltas_cvt):
-			if 0 <= p < pointCount:
-				deltas[p] = delta
-
-	elif tableTag == "gvar":
-		deltas_x, pos = TupleVariation.decompileDeltas_(
-			len(points), tupleData, pos)
-		deltas_y, pos = TupleVariation.decompileDeltas_(
-			len(points), tupleData, pos)
-		for p, x, y in zip(points, deltas_x, deltas_y):
+	if isinstance(points, range) and numPoints == pointCount:
+		# all points have deltas, in order: use the decoded arrays as they are
+		mask = bytearray(b"\1") * pointCount
+	else:
+		mask = bytearray(pointCount)
+		allDeltasX, allDeltasY = _ZERO_DELTAS[:1] * pointCount, None
+		for p, x in zip(points, deltasX):
 			if 0 <= p < pointCount:
-				deltas[p] = (x, y)
-
-	return TupleVariation(axes, deltas)
+				mask[p] = 1
+				allDeltasX[p] = x
+		if deltasY is not None:
+			allDeltasY = _ZERO_DELTAS[:1] * pointCount
+			for p, y in zip(points, deltasY):
+				if 0 <= p < pointCount:
+					allDeltasY[p] = y
+		deltasX, deltasY = allDeltasX, allDeltasY
+
+	return TupleVariation.fromDeltaArrays(axes, mask, deltasX, deltasY)
 
 
 def inferRegion_(peak):
@@ -23,6 +23,10 @@ import array
 import logging
 import os
 from fontTools.misc import xmlWriter
+try:
+	from collections.abc import MutableMapping
+except ImportError:
+	from UserDict import DictMixin as MutableMapping
 from fontTools.misc.filenames import userNameToFileName
 
 log = logging.getLogger(__name__)
@@ -53,12 +57,17 @@ class table__g_l_y_f(DefaultTable.DefaultTable):
 	# no padding, except for when padding would allow to use short loca offsets.
 	padding = 1
 
+	acceptsBuffer = True
+
 	def decompile(self, data, ttFont):
 		loca = ttFont['loca']
+		self.glyphOrder = glyphOrder = ttFont.getGlyphOrder()
+		if ttFont.lazy is True:
+			self._decompileLazy(data, loca, glyphOrder)
+			return
 		last = int(loca[0])
 		noname = 0
 		self.glyphs = {}
-		self.glyphOrder = glyphOrder = ttFont.getGlyphOrder()
 		for i in range(0, len(loca)-1):
 			try:
 				glyphName = glyphOrder[i]
@@ -82,23 +91,68 @@ class table__g_l_y_f(DefaultTable.DefaultTable):
 			for glyph in self.glyphs.values():
 				glyph.expand(self)
 
+	def _decompileLazy(self, data, loca, glyphOrder):
+		# Only keep the raw table data and the glyph offsets around; the
+		# Glyph objects are created upon access by LazyGlyphs.
+		numGlyphs = len(loca) - 1
+		end = int(loca[numGlyphs]) if numGlyphs >= 0 else 0
+		if end > len(data):
+			raise ttLib.TTLibError("not enough 'glyf' table data")
+		if len(data) - end >= 4:
+			log.warning(
+				"too much 'glyf' table data: expected %d, received %d bytes",
+				end, len(data))
+		glyphNames = list(glyphOrder[:numGlyphs])
+		noname = numGlyphs - len(glyphNames)
+		if noname > 0:
+			glyphNames.extend(
+				'ttxautoglyph%s' % i for i in range(len(glyphNames), numGlyphs))
+			log.warning('%s glyphs have no name', noname)
+		self.glyphs = LazyGlyphs(data, loca.locations, glyphNames)
+
 	def compile(self, ttFont):
 		if not hasattr(self, "glyphOrder"):
 			self.glyphOrder = ttFont.getGlyphOrder()
+		dataList = self.compileGlyphs_(ttFont, self.glyphOrder)
+		return self.compileGlyphData_(ttFont, dataList)
+
+	def compileGlyphs_(self, ttFont, glyphNames):
+		"""Return the list of the compiled, padded data of the glyphs in
+		'glyphNames'. TTFont.save() calls this on ranges of self.glyphOrder
+		in worker processes.
+		"""
 		padding = self.padding
 		assert padding in (0, 1, 2, 4)
-		locations = []
-		currentLocation = 0
 		dataList = []
 		recalcBBoxes = ttFont.recalcBBoxes
-		for glyphName in self.glyphOrder:
-			glyph = self.glyphs[glyphName]
-			glyphData = glyph.compile(self, recalcBBoxes)
+		# glyphs that were never accessed are copied from the original
+		# data, unless their bounding boxes need recalculating
+		if isinstance(self.glyphs, LazyGlyphs) and not recalcBBoxes:
+			getRawGlyphData = self.glyphs.getRawGlyphData
+		else:
+			getRawGlyphData = None
+		for glyphName in glyphNames:
+			glyphData = None
+			if getRawGlyphData is not None:
+				glyphData = getRawGlyphData(glyphName)
+			if glyphData is None:
+				glyph = self.glyphs[glyphName]
+				glyphData = glyph.compile(self, recalcBBoxes)
 			if padding > 1:
 				glyphData = pad(glyphData, size=padding)
+			dataList.append(glyphData)
+		return dataList
+
+	def compileGlyphData_(self, ttFont, dataList):
+		"""Return the table data made of the compiled data of all the glyphs
+		in self.glyphOrder, and update the 'loca' and 'maxp' tables.
+		"""
+		padding = self.padding
+		locations = []
+		currentLocation = 0
+		for glyphData in dataList:
 			locations.append(currentLocation)
 			currentLocation = currentLocation + len(glyphData)
-			dataList.append(glyphData)
 		locations.append(currentLocation)
 
 		if padding == 1 and currentLocation < 0x20000:
@@ -244,6 +298,73 @@ class table__g_l_y_f(DefaultTable.DefaultTable):
 		return len(self.glyphs)
 
 
+class LazyGlyphs(MutableMapping):
+
+	"""Dict-like object mapping glyph names to Glyph objects, used for the
+	'glyphs' attribute of the 'glyf' table when the font is loaded with
+	lazy=True. It only holds on to the raw 'glyf' table data and the 'loca'
+	offsets; a glyph's data is sliced out and wrapped in a Glyph object the
+	first time it is accessed.
+	"""
+
+	def __init__(self, data, locations, glyphNames):
+		self._data = data
+		self._locations = locations
+		# glyph name -> glyph index in the original data (None for glyphs
+		# added afterwards)
+		self._indices = dict(zip(glyphNames, range(len(glyphNames))))
+		self._glyphs = {}
+
+	def __getitem__(self, glyphName):
+		try:
+			return self._glyphs[glyphName]
+		except KeyError:
+			pass
+		glyph = Glyph(self._getData(self._indices[glyphName]))
+		self._glyphs[glyphName] = glyph
+		return glyph
+
+	def __setitem__(self, glyphName, glyph):
+		if glyphName not in self._indices:
+			self._indices[glyphName] = None
+		self._glyphs[glyphName] = glyph
+
+	def __delitem__(self, glyphName):
+		del self._indices[glyphName]
+		self._glyphs.pop(glyphName, None)
+
+	def __contains__(self, glyphName):
+		return glyphName in self._indices
+
+	def __iter__(self):
+		return iter(self._indices)
+
+	def __len__(self):
+		return len(self._indices)
+
+	def keys(self):
+		return self._indices.keys()
+
+	def isLoaded(self, glyphName):
+		"""Return True if a Glyph object has been created for 'glyphName'."""
+		return glyphName in self._glyphs
+
+	def getRawGlyphData(self, glyphName):
+		"""Return the original, unparsed data of a glyph that was never
+		accessed, or None if the glyph has been loaded (and may thus have
+		been modified).
+		"""
+		if glyphName in self._glyphs:
+			return None
+		data = self._getData(self._indices[glyphName])
+		if isinstance(data, memoryview):
+			data = data.tobytes()
+		return data
+
+	def _getData(self, glyphID):
+		return self._data[self._locations[glyphID]:self._locations[glyphID+1]]
+
+
 glyphHeaderFormat = """
 		>	# big endian
 		numberOfContours:	h
@@ -388,6 +509,9 @@ class Glyph(object):
 				# must unpack glyph in order to recalculate bounding box
 				self.expand(glyfTable)
 			else:
+				if isinstance(self.data, memoryview):
+					# raw data is a slice of a memory-mapped font file
+					return self.data.tobytes()
 				return self.data
 		if self.numberOfContours == 0:
 			return ""
@@ -1275,6 +1399,25 @@ class GlyphCoordinates(object):
 				self._ensureFloat()
 		return p
 
+	def _toArray(self, values):
+		"""Return an array holding the flat list of x and y 'values', of the
+		same type as ours if they all fit in it, or else of floats.
+		"""
+		typecode = self._a.typecode
+		if typecode == 'd':
+			return array.array('d', values)
+		try:
+			return array.array(typecode, values)
+		except (TypeError, OverflowError):
+			pass
+		# floats with integral values are stored as ints
+		values = [int(v) if isinstance(v, float) and int(v) == v else v
+		          for v in values]
+		try:
+			return array.array(typecode, values)
+		except (TypeError, OverflowError):
+			return array.array('d', values)
+
 	@staticmethod
 	def zeros(count):
 		return GlyphCoordinates([(0,0)] * count)
@@ -1303,6 +1446,10 @@ class GlyphCoordinates(object):
 		v = self._checkFloat(v)
 		self._a[2*k],self._a[2*k+1] = v
 
+	def __iter__(self):
+		a = self._a
+		return zip(a[0::2], a[1::2])
+
 	def __delitem__(self, i):
 		i = (2*i) % len(self._a)
 		del self._a[i]
@@ -1316,9 +1463,10 @@ class GlyphCoordinates(object):
 		self._a.extend(tuple(p))
 
 	def extend(self, iterable):
-		for p in iterable:
-			p = self._checkFloat(p)
-			self._a.extend(p)
+		values = self._toArray([v for p in iterable for v in p])
+		if values.typecode != self._a.typecode:
+			self._ensureFloat()
+		self._a.extend(values)
 
 	def toInt(self):
 		if not self.isFloat():
@@ -1330,21 +1478,23 @@ class GlyphCoordinates(object):
 
 	def relativeToAbsolute(self):
 		a = self._a
-		x,y = 0,0
-		for i in range(len(a) // 2):
-			x = a[2*i  ] + x
-			y = a[2*i+1] + y
-			self[i] = (x, y)
+		values = [0] * len(a)
+		for j in 0, 1:
+			total = 0
+			column = []
+			for v in a[j::2]:
+				total += v
+				column.append(total)
+			values[j::2] = column
+		self._a = self._toArray(values)
 
 	def absoluteToRelative(self):
 		a = self._a
-		x,y = 0,0
-		for i in range(len(a) // 2):
-			dx = a[2*i  ] - x
-			dy = a[2*i+1] - y
-			x = a[2*i  ]
-			y = a[2*i+1]
-			self[i] = (dx, dy)
+		values = [0] * len(a)
+		for j in 0, 1:
+			column = a[j::2].tolist()
+			values[j::2] = [cur - prev for prev, cur in zip([0] + column, column)]
+		self._a = self._toArray(values)
 
 	def translate(self, p):
 		"""
@@ -1352,8 +1502,10 @@ class GlyphCoordinates(object):
 		"""
 		(x,y) = self._checkFloat(p)
 		a = self._a
-		for i in range(len(a) // 2):
-			self[i] = (a[2*i] + x, a[2*i+1] + y)
+		values = [0] * len(a)
+		values[0::2] = [v + x for v in a[0::2]]
+		values[1::2] = [v + y for v in a[1::2]]
+		self._a = self._toArray(values)
 
 	def scale(self, p):
 		"""
@@ -1361,8 +1513,10 @@ class GlyphCoordinates(object):
 		"""
 		(x,y) = self._checkFloat(p)
 		a = self._a
-		for i in range(len(a) // 2):
-			self[i] = (a[2*i] * x, a[2*i+1] * y)
+		values = [0] * len(a)
+		values[0::2] = [v * x for v in a[0::2]]
+		values[1::2] = [v * y for v in a[1::2]]
+		self._a = self._toArray(values)
 
 	def transform(self, t):
 		"""
@@ -1478,8 +1632,7 @@ class GlyphCoordinates(object):
 			other = other._a
 			a = self._a
 			assert len(a) == len(other)
-			for i in range(len(a) // 2):
-				self[i] = (a[2*i] + other[2*i], a[2*i+1] + other[2*i+1])
+			self._a = self._toArray([p + q for p, q in zip(a, other)])
 			return self
 		return NotImplemented
 
@@ -1503,8 +1656,7 @@ class GlyphCoordinates(object):
 			other = other._a
 			a = self._a
 			assert len(a) == len(other)
-			for i in range(len(a) // 2):
-				self[i] = (a[2*i] - other[2*i], a[2*i+1] - other[2*i+1])
+			self._a = self._toArray([p - q for p, q in zip(a, other)])
 			return self
 		return NotImplemented
 
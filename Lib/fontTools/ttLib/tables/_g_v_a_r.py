@@ -11,6 +11,10 @@ import logging
 import struct
 import sys
 import fontTools.ttLib.tables.TupleVariation as tv
+try:
+	from collections.abc import MutableMapping
+except ImportError:
+	from UserDict import DictMixin as MutableMapping
 
 
 log = logging.getLogger(__name__)
@@ -51,8 +55,14 @@ class table__g_v_a_r(DefaultTable.DefaultTable):
 
 	def compile(self, ttFont):
 		axisTags = [axis.axisTag for axis in ttFont["fvar"].axes]
-		sharedTuples =  tv.compileSharedTuples(
-			axisTags, itertools.chain(*self.variations.values()))
+		if (isinstance(self.variations, LazyVariations) and
+				self.variations.axisCount == len(axisTags)):
+			# keep the original shared tuples, so that the variation data
+			# of glyphs that were never accessed can be copied as is
+			sharedTuples = self.variations.getRawSharedTuples()
+		else:
+			sharedTuples = tv.compileSharedTuples(
+				axisTags, itertools.chain(*self.variations.values()))
 		sharedTupleIndices = {coord:i for i, coord in enumerate(sharedTuples)}
 		sharedTupleSize = sum([len(c) for c in sharedTuples])
 		compiledGlyphs = self.compileGlyphs_(
@@ -83,7 +93,17 @@ class table__g_v_a_r(DefaultTable.DefaultTable):
 
 	def compileGlyphs_(self, ttFont, axisTags, sharedCoordIndices):
 		result = []
+		if (isinstance(self.variations, LazyVariations) and
+				self.variations.axisCount == len(axisTags)):
+			getRawGlyphData = self.variations.getRawGlyphData
+		else:
+			getRawGlyphData = None
 		for glyphName in ttFont.getGlyphOrder():
+			if getRawGlyphData is not None and glyphName in self.variations:
+				glyphData = getRawGlyphData(glyphName)
+				if glyphData is not None:
+					result.append(glyphData)
+					continue
 			glyph = ttFont["glyf"][glyphName]
 			pointCount = self.getNumPoints_(glyph)
 			variations = self.variations.get(glyphName, [])
@@ -100,6 +120,14 @@ class table__g_v_a_r(DefaultTable.DefaultTable):
 		offsets = self.decompileOffsets_(data[GVAR_HEADER_SIZE:], tableFormat=(self.flags & 1), glyphCount=self.glyphCount)
 		sharedCoords = tv.decompileSharedTuples(
 			axisTags, self.sharedTupleCount, data, self.offsetToSharedTuples)
+		if ttFont.lazy is True:
+			# Only keep the raw data around; the variations of a glyph are
+			# decompiled upon access by LazyVariations.
+			self.variations = LazyVariations(
+				ttFont["glyf"], axisTags, sharedCoords, glyphs,
+				data, offsets, self.offsetToSharedTuples,
+				self.offsetToGlyphVariationData)
+			return
 		self.variations = {}
 		offsetToData = self.offsetToGlyphVariationData
 		for i in range(self.glyphCount):
@@ -205,6 +233,94 @@ class table__g_v_a_r(DefaultTable.DefaultTable):
 			return len(getattr(glyph, "coordinates", [])) + NUM_PHANTOM_POINTS
 
 
+class LazyVariations(MutableMapping):
+
+	"""Dict-like object mapping glyph names to lists of TupleVariation
+	objects, used for the 'variations' attribute of the 'gvar' table when
+	the font is loaded with lazy=True. The variation data of a glyph is
+	only decompiled the first time the glyph is accessed; only then is its
+	number of points looked up in the 'glyf' table.
+	"""
+
+	def __init__(self, glyfTable, axisTags, sharedTuples, glyphNames,
+	             data, offsets, offsetToSharedTuples, offsetToData):
+		self.axisCount = len(axisTags)
+		self._glyfTable = glyfTable
+		self._axisTags = axisTags
+		self._sharedTuples = sharedTuples
+		self._data = data
+		self._offsets = offsets
+		self._offsetToSharedTuples = offsetToSharedTuples
+		self._offsetToData = offsetToData
+		# glyph name -> glyph index in the original data (None for glyphs
+		# added afterwards)
+		self._indices = dict(zip(glyphNames, range(len(glyphNames))))
+		self._variations = {}
+
+	def __getitem__(self, glyphName):
+		try:
+			return self._variations[glyphName]
+		except KeyError:
+			pass
+		glyph = self._glyfTable[glyphName]
+		numPointsInGlyph = table__g_v_a_r.getNumPoints_(glyph)
+		variations = decompileGlyph_(
+			numPointsInGlyph, self._sharedTuples, self._axisTags,
+			self._getData(self._indices[glyphName]))
+		self._variations[glyphName] = variations
+		return variations
+
+	def __setitem__(self, glyphName, variations):
+		if glyphName not in self._indices:
+			self._indices[glyphName] = None
+		self._variations[glyphName] = variations
+
+	def __delitem__(self, glyphName):
+		del self._indices[glyphName]
+		self._variations.pop(glyphName, None)
+
+	def __contains__(self, glyphName):
+		return glyphName in self._indices
+
+	def __iter__(self):
+		return iter(self._indices)
+
+	def __len__(self):
+		return len(self._indices)
+
+	def keys(self):
+		return self._indices.keys()
+
+	def isLoaded(self, glyphName):
+		"""Return True if the variations of 'glyphName' have been decompiled."""
+		return glyphName in self._variations
+
+	def getRawGlyphData(self, glyphName):
+		"""Return the original, unparsed variation data of a glyph that was
+		never accessed, padded to an even length, or None if the glyph has
+		been loaded (and its variations may thus have been modified). The
+		data refers to the shared tuples returned by getRawSharedTuples().
+		"""
+		if glyphName in self._variations:
+			return None
+		data = self._getData(self._indices[glyphName])
+		if len(data) % 2 != 0:
+			data = data + b"\0"  # padding
+		return data
+
+	def getRawSharedTuples(self):
+		"""Return the original shared tuples as a list of compiled coords."""
+		size = self.axisCount * 2
+		start = self._offsetToSharedTuples
+		return [self._data[pos:pos+size]
+		        for pos in range(start, start + len(self._sharedTuples) * size, size)]
+
+	def _getData(self, glyphID):
+		start = self._offsetToData + self._offsets[glyphID]
+		end = self._offsetToData + self._offsets[glyphID + 1]
+		return self._data[start:end]
+
+
 def compileGlyph_(variations, pointCount, axisTags, sharedCoordIndices):
 	tupleVariationCount, tuples, data = tv.compileTupleVariationStore(
 		variations, pointCount, axisTags, sharedCoordIndices)
@@ -21,6 +21,8 @@ class table__h_m_t_x(DefaultTable.DefaultTable):
 	numberOfMetricsName = 'numberOfHMetrics'
 	longMetricFormat = 'Hh'
 
+	acceptsBuffer = True
+
 	def decompile(self, data, ttFont):
 		numGlyphs = ttFont['maxp'].numGlyphs
 		numberOfMetrics = int(getattr(ttFont[self.headerTag], self.numberOfMetricsName))
@@ -37,7 +39,8 @@ class table__h_m_t_x(DefaultTable.DefaultTable):
 		metrics = struct.unpack(metricsFmt, data[:4 * numberOfMetrics])
 		data = data[4 * numberOfMetrics:]
 		numberOfSideBearings = numGlyphs - numberOfMetrics
-		sideBearings = array.array("h", data[:2 * numberOfSideBearings])
+		sideBearings = array.array("h")
+		sideBearings.fromstring(data[:2 * numberOfSideBearings])
 		data = data[2 * numberOfSideBearings:]
 
 		if sys.byteorder != "big": sideBearings.byteswap()
@@ -13,6 +13,8 @@ class table__l_o_c_a(DefaultTable.DefaultTable):
 
 	dependencies = ['glyf']
 
+	acceptsBuffer = True
+
 	def decompile(self, data, ttFont):
 		longFormat = ttFont['head'].indexToLocFormat
 		if longFormat:
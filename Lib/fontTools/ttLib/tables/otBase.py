@@ -6,8 +6,35 @@ import array
 import struct
 import logging
 
+try:
+	from collections import UserList
+except ImportError:
+	from UserList import UserList
+
 log = logging.getLogger(__name__)
 
+
+_uint8 = struct.Struct(">B")
+_int8 = struct.Struct(">b")
+_uint16 = struct.Struct(">H")
+_int16 = struct.Struct(">h")
+_uint32 = struct.Struct(">L")
+_int32 = struct.Struct(">l")
+
+def _buildArrayTypecodes():
+	# map struct format characters to array typecodes of the same size
+	typecodes = {}
+	for fmt in "bBhHlL":
+		size = struct.calcsize(">" + fmt)
+		for typecode in (fmt, fmt.replace("l", "i").replace("L", "I")):
+			if array.array(typecode).itemsize == size:
+				typecodes[fmt] = typecode
+				break
+	return typecodes
+
+_arrayTypecodes = _buildArrayTypecodes()
+
+
 class OverflowErrorRecord(object):
 	def __init__(self, overflowTuple):
 		self.tableType = overflowTuple[0]
@@ -20,8 +47,12 @@ class OverflowErrorRecord(object):
 		return str((self.tableType, "LookupIndex:", self.LookupListIndex, "SubTableIndex:", self.SubTableIndex, "ItemName:", self.itemName, "ItemIndex:", self.itemIndex))
 
 class OTLOffsetOverflowError(Exception):
-	def __init__(self, overflowErrorRecord):
+	def __init__(self, overflowErrorRecord, overflowErrorRecords=None):
 		self.value = overflowErrorRecord
+		# all the offsets found to overflow, if known; 'value' is the first
+		if overflowErrorRecords is None:
+			overflowErrorRecords = [overflowErrorRecord]
+		self.values = overflowErrorRecords
 
 	def __str__(self):
 		return repr(self.value)
@@ -34,6 +65,8 @@ class BaseTTXConverter(DefaultTable):
 	we use for OpenType tables, which is necessarily subtly different.
 	"""
 
+	acceptsBuffer = True
+
 	def decompile(self, data, font):
 		from . import otTables
 		reader = OTTableReader(data, tableTag=self.tableTag)
@@ -61,8 +94,11 @@ class BaseTTXConverter(DefaultTable):
 				pos's and offset are known.
 
 				If a lookup subtable overflows an offset, we have to start all over.
+				All the overflowing offsets are found at once, so that the
+				subtables they belong to can be fixed together before compiling
+				again.
 		"""
-		overflowRecord = None
+		overflowRecords = None
 
 		while True:
 			try:
@@ -72,28 +108,17 @@ class BaseTTXConverter(DefaultTable):
 
 			except OTLOffsetOverflowError as e:
 
-				if overflowRecord == e.value:
+				if overflowRecords == [repr(r) for r in e.values]:
 					raise # Oh well...
 
-				overflowRecord = e.value
-				log.info("Attempting to fix OTLOffsetOverflowError %s", e)
-				lastItem = overflowRecord
+				overflowRecords = [repr(r) for r in e.values]
+				log.info(
+					"Attempting to fix %d OTLOffsetOverflowErrors, first: %s",
+					len(e.values), e)
 
-				ok = 0
-				if overflowRecord.itemName is None:
-					from .otTables import fixLookupOverFlows
-					ok = fixLookupOverFlows(font, overflowRecord)
-				else:
-					from .otTables import fixSubTableOverFlows
-					ok = fixSubTableOverFlows(font, overflowRecord)
-				if not ok:
-					# Try upgrading lookup to Extension and hope
-					# that cross-lookup sharing not happening would
-					# fix overflow...
-					from .otTables import fixLookupOverFlows
-					ok = fixLookupOverFlows(font, overflowRecord)
-					if not ok:
-						raise
+				from .otTables import fixOverFlows
+				if not fixOverFlows(font, e.values):
+					raise
 
 	def toXML(self, writer, font):
 		self.table.toXML2(writer, font)
@@ -136,65 +161,67 @@ class OTTableReader(object):
 
 	def readUShort(self):
 		pos = self.pos
-		newpos = pos + 2
-		value, = struct.unpack(">H", self.data[pos:newpos])
-		self.pos = newpos
+		value, = _uint16.unpack_from(self.data, pos)
+		self.pos = pos + 2
 		return value
 
 	def readUShortArray(self, count):
+		return self.readArray("H", count)
+
+	def readArray(self, structFormat, count):
+		"""Read an array.array of 'count' big-endian integers, of the type
+		given by a struct format character ("b", "B", "h", "H", "l" or "L").
+		"""
+		value = array.array(_arrayTypecodes[structFormat])
 		pos = self.pos
-		newpos = pos + count * 2
-		value = array.array("H", self.data[pos:newpos])
+		newpos = pos + count * value.itemsize
+		value.fromstring(self.data[pos:newpos])
 		if sys.byteorder != "big": value.byteswap()
 		self.pos = newpos
 		return value
 
 	def readInt8(self):
 		pos = self.pos
-		newpos = pos + 1
-		value, = struct.unpack(">b", self.data[pos:newpos])
-		self.pos = newpos
+		value, = _int8.unpack_from(self.data, pos)
+		self.pos = pos + 1
 		return value
 
 	def readShort(self):
 		pos = self.pos
-		newpos = pos + 2
-		value, = struct.unpack(">h", self.data[pos:newpos])
-		self.pos = newpos
+		value, = _int16.unpack_from(self.data, pos)
+		self.pos = pos + 2
 		return value
 
 	def readLong(self):
 		pos = self.pos
-		newpos = pos + 4
-		value, = struct.unpack(">l", self.data[pos:newpos])
-		self.pos = newpos
+		value, = _int32.unpack_from(self.data, pos)
+		self.pos = pos + 4
 		return value
 
 	def readUInt8(self):
 		pos = self.pos
-		newpos = pos + 1
-		value, = struct.unpack(">B", self.data[pos:newpos])
-		self.pos = newpos
+		value, = _uint8.unpack_from(self.data, pos)
+		self.pos = pos + 1
 		return value
 
 	def readUInt24(self):
 		pos = self.pos
 		newpos = pos + 3
-		value, = struct.unpack(">l", b'\0'+self.data[pos:newpos])
+		hi, lo = struct.unpack(">BH", self.data[pos:newpos])
+		value = (hi << 16) | lo
 		self.pos = newpos
 		return value
 
 	def readULong(self):
 		pos = self.pos
-		newpos = pos + 4
-		value, = struct.unpack(">L", self.data[pos:newpos])
-		self.pos = newpos
+		value, = _uint32.unpack_from(self.data, pos)
+		self.pos = pos + 4
 		return value
 
 	def readTag(self):
 		pos = self.pos
 		newpos = pos + 4
-		value = Tag(self.data[pos:newpos])
+		value = Tag(bytes(self.data[pos:newpos]))
 		assert len(value) == 4, value
 		self.pos = newpos
 		return value
@@ -202,7 +229,7 @@ class OTTableReader(object):
 	def readData(self, count):
 		pos = self.pos
 		newpos = pos + count
-		value = self.data[pos:newpos]
+		value = bytes(self.data[pos:newpos])
 		self.pos = newpos
 		return value
 
@@ -218,6 +245,51 @@ class OTTableReader(object):
 		return self.localState and name in self.localState
 
 
+class _SpanReader(OTTableReader):
+
+	"""OTTableReader that keeps track of all the readers made from it, so
+	that the data read through them can be found afterwards."""
+
+	__slots__ = ('readers',)
+
+	def __init__(self, data, localState=None, offset=0, tableTag=None, readers=None):
+		OTTableReader.__init__(self, data, localState, offset, tableTag)
+		if readers is None:
+			readers = []
+		readers.append(self)
+		self.readers = readers
+
+	def copy(self):
+		other = self.__class__(self.data, self.localState, self.offset, self.tableTag, self.readers)
+		other.pos = self.pos
+		return other
+
+	def getSubReader(self, offset):
+		offset = self.offset + offset
+		return self.__class__(self.data, self.localState, offset, self.tableTag, self.readers)
+
+	def getSpans(self):
+		"""Return the (start, end) ranges read so far by all the readers."""
+		return [(reader.offset, reader.pos) for reader in self.readers
+			if reader.pos > reader.offset]
+
+
+def _iterLazyTables(value):
+	# yield the not yet decompiled tables referenced from a table's values,
+	# looking into lists and inline records
+	if isinstance(value, BaseTable):
+		if "reader" in value.__dict__:
+			yield value
+		else:
+			for v in value.__dict__.values():
+				for table in _iterLazyTables(v):
+					yield table
+	elif isinstance(value, (list, UserList)):
+		for v in value:
+			for table in _iterLazyTables(v):
+				yield table
+
+
 class OTTableWriter(object):
 
 	"""Helper class to gather and assemble data for OpenType tables."""
@@ -277,9 +349,21 @@ class OTTableWriter(object):
 
 		return bytesjoin(items)
 
+	def _collectOverflows(self, overflowErrorRecords):
+		"""Append an OverflowErrorRecord to 'overflowErrorRecords' for each
+		16-bit offset of this table that can't hold the distance to its
+		subtable. Positions must have been assigned.
+		"""
+		pos = self.pos
+		for item in self.items:
+			if hasattr(item, "getData") and not item.longOffset:
+				if not 0 <= item.pos - pos < 0x10000:
+					overflowErrorRecords.append(self.getOverflowErrorRecord(item))
+
 	def __hash__(self):
-		# only works after self._doneWriting() has been called
-		return hash(self.items)
+		# only works after self._doneWriting() has been called, which
+		# caches the hash of the (by then immutable) items tuple
+		return self._hash
 
 	def __ne__(self, other):
 		result = self.__eq__(other)
@@ -288,7 +372,13 @@ class OTTableWriter(object):
 	def __eq__(self, other):
 		if type(self) != type(other):
 			return NotImplemented
-		return self.longOffset == other.longOffset and self.items == other.items
+		if self is other:
+			return True
+		# subtables are interned bottom-up, so equal subtrees usually are
+		# identical objects and comparing the items tuples stays shallow
+		return (self._hash == other._hash and
+			self.longOffset == other.longOffset and
+			self.items == other.items)
 
 	def _doneWriting(self, internedTables):
 		# Convert CountData references to data string items
@@ -319,6 +409,8 @@ class OTTableWriter(object):
 				if not dontShare:
 					items[i] = item = internedTables.setdefault(item, item)
 		self.items = tuple(items)
+		# the subtables' hashes are cached already, so this doesn't recurse
+		self._hash = hash(self.items)
 
 	def _gatherTables(self, tables, extTables, done):
 		# Convert table references in self.items tree to a flat
@@ -396,6 +488,15 @@ class OTTableWriter(object):
 			table.pos = pos
 			pos = pos + table.getDataLength()
 
+		overflowErrorRecords = []
+		for table in tables:
+			table._collectOverflows(overflowErrorRecords)
+		for table in extTables:
+			table._collectOverflows(overflowErrorRecords)
+		if overflowErrorRecords:
+			raise OTLOffsetOverflowError(
+				overflowErrorRecords[0], overflowErrorRecords)
+
 		data = []
 		for table in tables:
 			tableData = table.getData()
@@ -419,19 +520,19 @@ class OTTableWriter(object):
 
 	def writeUShort(self, value):
 		assert 0 <= value < 0x10000, value
-		self.items.append(struct.pack(">H", value))
+		self.items.append(_uint16.pack(value))
 
 	def writeShort(self, value):
 		assert -32768 <= value < 32768, value
-		self.items.append(struct.pack(">h", value))
+		self.items.append(_int16.pack(value))
 
 	def writeUInt8(self, value):
 		assert 0 <= value < 256, value
-		self.items.append(struct.pack(">B", value))
+		self.items.append(_uint8.pack(value))
 
 	def writeInt8(self, value):
 		assert -128 <= value < 128, value
-		self.items.append(struct.pack(">b", value))
+		self.items.append(_int8.pack(value))
 
 	def writeUInt24(self, value):
 		assert 0 <= value < 0x1000000, value
@@ -439,10 +540,10 @@ class OTTableWriter(object):
 		self.items.append(b[1:])
 
 	def writeLong(self, value):
-		self.items.append(struct.pack(">l", value))
+		self.items.append(_int32.pack(value))
 
 	def writeULong(self, value):
-		self.items.append(struct.pack(">L", value))
+		self.items.append(_uint32.pack(value))
 
 	def writeTag(self, tag):
 		tag = Tag(tag).tobytes()
@@ -520,14 +621,165 @@ class CountReference(object):
 
 
 def packUInt8 (value):
-	return struct.pack(">B", value)
+	return _uint8.pack(value)
 
 def packUShort(value):
-	return struct.pack(">H", value)
+	return _uint16.pack(value)
 
 def packULong(value):
 	assert 0 <= value < 0x100000000, value
-	return struct.pack(">L", value)
+	return _uint32.pack(value)
+
+
+def _isFixedSizeField(conv):
+	return (getattr(conv, "structFormat", None) is not None and
+		not conv.repeat and not conv.aux)
+
+
+class _FieldRun(object):
+
+	"""A run of consecutive fixed-size integer and glyph ID fields, which
+	are read and written at once with a single precompiled struct.
+
+	Runs covering whole records may also contain ValueRecords, given the
+	ValueRecordFactory for each of them in 'valueFactories'; such runs
+	only read records, and are built anew for every array."""
+
+	def __init__(self, converters, valueFactories=None):
+		self.converters = converters
+		self.names = [conv.name for conv in converters]
+		formats = []
+		self.layout = None
+		if valueFactories:
+			# where each field starts in the unpacked values; for
+			# ValueRecords, the names of the values that follow
+			self.layout = []
+			start = 0
+			for conv in converters:
+				if conv.isValueRecord:
+					factory = valueFactories[conv.name]
+					formats.extend("h" if signed else "H"
+						for name, isDevice, signed in factory.format)
+					self.layout.append((start, factory.names))
+					start += len(factory.names)
+				else:
+					formats.append(conv.structFormat)
+					self.layout.append((start, None))
+					start += 1
+		else:
+			formats = [conv.structFormat for conv in converters]
+		self.struct = struct.Struct(">" + "".join(formats))
+		self.glyphFields = [i for i, conv in enumerate(converters) if conv.isGlyphID]
+		self.propagated = [conv.name for conv in converters if conv.isPropagated]
+
+	def read(self, reader, font, table):
+		pos = reader.pos
+		try:
+			values = self.struct.unpack_from(reader.data, pos)
+		except struct.error:
+			# read field by field, to report which one is missing
+			return self._readEach(reader, font, table)
+		reader.pos = pos + self.struct.size
+		if self.glyphFields:
+			values = list(values)
+			for i in self.glyphFields:
+				values[i] = font.getGlyphName(values[i])
+		table.update(zip(self.names, values))
+		for name in self.propagated:
+			reader[name] = table[name]
+
+	def _readEach(self, reader, font, table):
+		for conv in self.converters:
+			try:
+				table[conv.name] = conv.read(reader, font, table)
+			except Exception as e:
+				e.args = e.args + (conv.name,)
+				raise
+			if conv.isPropagated:
+				reader[conv.name] = table[conv.name]
+
+	def readRecords(self, reader, font, tableClass, count):
+		"""Read an array of 'count' records of 'tableClass'."""
+		unpack_from = self.struct.unpack_from
+		size = self.struct.size
+		data = reader.data
+		pos = reader.pos
+		rows = [unpack_from(data, pos + i * size) for i in range(count)]
+		reader.pos = pos + count * size
+		if self.layout is not None:
+			rows = [self._groupValueRecords(row) for row in rows]
+		if self.glyphFields:
+			rows = self._mapGlyphFields(rows, font.getGlyphNameMany)
+		names = self.names
+		records = []
+		for row in rows:
+			record = tableClass()
+			record.__dict__.update(zip(names, row))
+			records.append(record)
+		return records
+
+	def _groupValueRecords(self, row):
+		values = []
+		for start, names in self.layout:
+			if names is None:
+				values.append(row[start])
+			elif names:
+				valueRecord = ValueRecord()
+				valueRecord.__dict__.update(zip(names, row[start:start + len(names)]))
+				values.append(valueRecord)
+			else:
+				values.append(None)
+		return values
+
+	def _mapGlyphFields(self, rows, convert):
+		"""Return 'rows' as lists, with the glyph fields of all of them
+		converted at once with 'convert'."""
+		rows = [list(row) for row in rows]
+		for i in self.glyphFields:
+			for row, value in zip(rows, convert([row[i] for row in rows])):
+				row[i] = value
+		return rows
+
+	def packRecords(self, records, font):
+		"""Return the data for an array of records, as BaseTable.compile
+		would write them."""
+		pack = self.struct.pack
+		names = self.names
+		rows = [[record.__dict__.get(name) for name in names] for record in records]
+		if self.glyphFields:
+			rows = self._mapGlyphFields(rows, font.getGlyphIDMany)
+		return bytesjoin([pack(*row) for row in rows])
+
+
+# Decompile plans, by id() of the converters list they're made from
+_decompilePlans = {}
+
+def _getDecompilePlan(converters):
+	"""Return the 'converters' list with runs of fixed-size fields replaced
+	by _FieldRun objects, building it on first use."""
+	try:
+		cached, plan = _decompilePlans[id(converters)]
+		if cached is converters:
+			return plan
+	except KeyError:
+		pass
+	if not converters:
+		return converters
+	plan = []
+	run = []
+	for conv in converters + [None]:
+		if conv is not None and _isFixedSizeField(conv):
+			run.append(conv)
+			continue
+		if len(run) > 1:
+			plan.append(_FieldRun(run))
+		else:
+			plan.extend(run)
+		run = []
+		if conv is not None:
+			plan.append(conv)
+	_decompilePlans[id(converters)] = (converters, plan)
+	return plan
 
 
 class BaseTable(object):
@@ -540,6 +792,7 @@ class BaseTable(object):
 			del self.reader
 			font = self.font
 			del self.font
+			self.__dict__.pop("_dataSpan", None)
 			self.decompile(reader, font)
 			return getattr(self, attr)
 
@@ -551,8 +804,82 @@ class BaseTable(object):
 			del self.reader
 			font = self.font
 			del self.font
+			self.__dict__.pop("_dataSpan", None)
 			self.decompile(reader, font)
 
+	def getDataSpan(self):
+		"""For a GSUB or GPOS table that hasn't been decompiled yet (see
+		TTFont.lazy), return the (start, end) range of the original table
+		data that holds it and all its subtables, and nothing else. Return
+		None if the table is decompiled, or its subtables are interleaved
+		with other data.
+
+		Compiling such a table just copies that range, as the offsets within
+		it stay valid. Finding the range decompiles the table; if there is
+		none, the table keeps the decompiled contents.
+		"""
+		if "reader" not in self.__dict__:
+			return None
+		span = self.__dict__.get("_dataSpan", False)
+		if span is not False:
+			return span
+		reader = self.reader
+		font = self.font
+		if reader.tableTag not in ("GSUB", "GPOS"):
+			self._dataSpan = None
+			return None
+		spanReader = _SpanReader(reader.data, reader.localState, reader.offset, reader.tableTag)
+		spanReader.seek(reader.pos)
+		table = self.__class__()
+		table.decompile(spanReader, font)
+
+		spans = []
+		for subTable in _iterLazyTables(table):
+			subSpan = subTable.getDataSpan()
+			if subSpan is None:
+				spans = None
+				break
+			spans.append(subSpan)
+		span = None
+		if spans is not None:
+			# the lazy lists of the table may only have been read now
+			spans.extend(spanReader.getSpans())
+			spans.sort()
+			start, end = spans[0]
+			for subStart, subEnd in spans[1:]:
+				if subStart > end:
+					break
+				end = max(end, subEnd)
+			else:
+				if start == reader.offset:
+					span = (start, end)
+
+		if span is None:
+			# keep what we have decompiled
+			del self.reader
+			del self.font
+			self.__dict__.update(table.__dict__)
+		else:
+			self._dataSpan = span
+		return span
+
+	def _compileDataSpan(self, writer):
+		# tables that depend on values of their parent table (like the
+		# ClassCount of a BaseArray) can only be copied along with it
+		if self.reader.localState:
+			return False
+		span = self.getDataSpan()
+		if span is None:
+			return False
+		if hasattr(self.__class__, 'LookupType'):
+			writer['LookupType'].setValue(self.__class__.LookupType)
+		start, end = span
+		data = self.reader.data[start:end]
+		if isinstance(data, memoryview):
+			data = data.tobytes()
+		writer.writeData(data)
+		return True
+
 	@classmethod
 	def getRecordSize(cls, reader):
 		totalSize = 0
@@ -568,6 +895,52 @@ class BaseTable(object):
 			totalSize += size * countValue
 		return totalSize
 
+	@classmethod
+	def getRecordRun(cls, reader=None):
+		"""If this table is a fixed-size record made of integer and glyph ID
+		fields only (like RangeRecord), return a _FieldRun to read and write
+		arrays of it at once. Else return None.
+
+		Records that also contain ValueRecords without Device tables (like
+		PairValueRecord) can be read at once too, given the 'reader' that
+		holds their ValueFormats."""
+		if "_recordConverters" not in cls.__dict__:
+			cls._recordConverters = cls._getRecordConverters()
+			cls._recordRun = None
+			if cls._recordConverters is not None and not any(
+					conv.isValueRecord for conv in cls._recordConverters):
+				cls._recordRun = _FieldRun(cls._recordConverters)
+		converters = cls._recordConverters
+		if converters is None or cls._recordRun is not None or reader is None:
+			return cls._recordRun
+		valueFactories = {}
+		for conv in converters:
+			if conv.isValueRecord:
+				if conv.which not in reader:
+					return None
+				factory = reader[conv.which]
+				if factory.hasDevice:
+					return None
+				valueFactories[conv.name] = factory
+		return _FieldRun(converters, valueFactories)
+
+	@classmethod
+	def _getRecordConverters(cls):
+		converters = getattr(cls, "converters", None)
+		if (not isinstance(converters, list) or not converters or
+				hasattr(cls, "postRead") or hasattr(cls, "preWrite") or
+				hasattr(cls, "sortCoverageLast") or hasattr(cls, "DontShare")):
+			return None
+		for conv in converters:
+			if conv.isCount or conv.isPropagated or conv.isLookupType:
+				return None
+			if conv.isValueRecord:
+				if conv.repeat or conv.aux:
+					return None
+			elif not _isFixedSizeField(conv):
+				return None
+		return converters
+
 	def getConverters(self):
 		return self.converters
 
@@ -602,7 +975,10 @@ class BaseTable(object):
 		self.readFormat(reader)
 		table = {}
 		self.__rawTable = table  # for debugging
-		for conv in self.getConverters():
+		for conv in _getDecompilePlan(self.getConverters()):
+			if conv.__class__ is _FieldRun:
+				conv.read(reader, font, table)
+				continue
 			if conv.name == "SubTable":
 				conv = conv.getConverter(reader.tableTag,
 						table["LookupType"])
@@ -636,7 +1012,7 @@ class BaseTable(object):
 				e.args = e.args + (name,)
 				raise
 
-		if hasattr(self, 'postRead'):
+		if hasattr(self.__class__, 'postRead'):
 			self.postRead(table, font)
 		else:
 			self.__dict__.update(table)
@@ -644,6 +1020,8 @@ class BaseTable(object):
 		del self.__rawTable  # succeeded, get rid of debugging info
 
 	def compile(self, writer, font):
+		if "reader" in self.__dict__ and self._compileDataSpan(writer):
+			return
 		self.ensureDecompiled()
 		if hasattr(self, 'preWrite'):
 			table = self.preWrite(font)
@@ -674,14 +1052,7 @@ class BaseTable(object):
 				else:
 					# conv.repeat is a propagated count
 					writer[conv.repeat].setValue(countValue)
-				values = value
-				for i, value in enumerate(values):
-					try:
-						conv.write(writer, font, table, value, i)
-					except Exception as e:
-						name = value.__class__.__name__ if value is not None else conv.name
-						e.args = e.args + (name+'['+str(i)+']',)
-						raise
+				conv.writeArray(writer, font, table, value)
 			elif conv.isCount:
 				# Special-case Count values.
 				# Assumption: a Count field will *always* precede
@@ -851,6 +1222,11 @@ class ValueRecordFactory(object):
 			if valueFormat & mask:
 				format.append((name, isDevice, signed))
 		self.format = format
+		# all fields are read and written at once
+		self.names = [name for name, isDevice, signed in format]
+		self.struct = struct.Struct(
+			">" + "".join("h" if signed else "H" for name, isDevice, signed in format))
+		self.hasDevice = any(isDevice for name, isDevice, signed in format)
 
 	def __len__(self):
 		return len(self.format)
@@ -859,12 +1235,14 @@ class ValueRecordFactory(object):
 		format = self.format
 		if not format:
 			return None
+		pos = reader.pos
+		values = self.struct.unpack_from(reader.data, pos)
+		reader.pos = pos + self.struct.size
 		valueRecord = ValueRecord()
-		for name, isDevice, signed in format:
-			if signed:
-				value = reader.readShort()
-			else:
-				value = reader.readUShort()
+		if not self.hasDevice:
+			valueRecord.__dict__.update(zip(self.names, values))
+			return valueRecord
+		for (name, isDevice, signed), value in zip(format, values):
 			if isDevice:
 				if value:
 					from . import otTables
@@ -877,6 +1255,15 @@ class ValueRecordFactory(object):
 		return valueRecord
 
 	def writeValueRecord(self, writer, font, valueRecord):
+		if self.format and not self.hasDevice:
+			try:
+				data = self.struct.pack(
+					*[getattr(valueRecord, name, 0) for name in self.names])
+			except struct.error:
+				pass  # write them one by one, to report the offending value
+			else:
+				writer.writeData(data)
+				return
 		for name, isDevice, signed in self.format:
 			value = getattr(valueRecord, name, 0)
 			if isDevice:
@@ -123,6 +123,12 @@ class BaseConverter(object):
 	"""Base class for converter objects. Apart from the constructor, this
 	is an abstract class."""
 
+	# struct format character of fixed-size integer and glyph ID fields,
+	# which BaseTable reads in runs with a single struct
+	structFormat = None
+	isGlyphID = False
+	isValueRecord = False
+
 	def __init__(self, name, repeat, aux, tableClass=None):
 		self.name = name
 		self.repeat = repeat
@@ -135,6 +141,10 @@ class BaseConverter(object):
 	def readArray(self, reader, font, tableDict, count):
 		"""Read an array of values from the reader."""
 		lazy = font.lazy and count > 8
+		if not lazy:
+			run = self.getRecordRun(reader)
+			if run is not None:
+				return run.readRecords(reader, font, self.tableClass, count)
 		if lazy:
 			recordSize = self.getRecordSize(reader)
 			if recordSize is NotImplemented:
@@ -159,13 +169,33 @@ class BaseConverter(object):
 		if hasattr(self, 'staticSize'): return self.staticSize
 		return NotImplemented
 
+	def getRecordRun(self, reader=None):
+		"""Return an otBase._FieldRun to read and write arrays of values of
+		this converter at once, or None. Given a 'reader', the run may be
+		good for reading only."""
+		return None
+
 	def read(self, reader, font, tableDict):
 		"""Read a value from the reader."""
 		raise NotImplementedError(self)
 
 	def writeArray(self, writer, font, tableDict, values):
+		run = self.getRecordRun()
+		if run is not None:
+			try:
+				data = run.packRecords(values, font)
+			except Exception:
+				pass  # write them one by one, to report the offending value
+			else:
+				writer.writeData(data)
+				return
 		for i, value in enumerate(values):
-			self.write(writer, font, tableDict, value, i)
+			try:
+				self.write(writer, font, tableDict, value, i)
+			except Exception as e:
+				name = value.__class__.__name__ if value is not None else self.name
+				e.args = e.args + (name+'['+str(i)+']',)
+				raise
 
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
 		"""Write a value to the writer."""
@@ -190,9 +220,27 @@ class SimpleValue(BaseConverter):
 class IntValue(SimpleValue):
 	def xmlRead(self, attrs, content, font):
 		return int(attrs["value"], 0)
+	def readArray(self, reader, font, tableDict, count):
+		if self.structFormat is None:
+			return BaseConverter.readArray(self, reader, font, tableDict, count)
+		values = reader.readArray(self.structFormat, count)
+		if len(values) != count:
+			raise struct.error("not enough data for %d values" % count)
+		return values.tolist()
+	def writeArray(self, writer, font, tableDict, values):
+		if self.structFormat is not None:
+			try:
+				data = struct.pack(">%d%s" % (len(values), self.structFormat), *values)
+			except Exception:
+				pass  # write them one by one, to report the offending value
+			else:
+				writer.writeData(data)
+				return
+		BaseConverter.writeArray(self, writer, font, tableDict, values)
 
 class Long(IntValue):
 	staticSize = 4
+	structFormat = "l"
 	def read(self, reader, font, tableDict):
 		return reader.readLong()
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
@@ -200,6 +248,7 @@ class Long(IntValue):
 
 class ULong(IntValue):
 	staticSize = 4
+	structFormat = "L"
 	def read(self, reader, font, tableDict):
 		return reader.readULong()
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
@@ -212,6 +261,7 @@ class Flags32(ULong):
 
 class Short(IntValue):
 	staticSize = 2
+	structFormat = "h"
 	def read(self, reader, font, tableDict):
 		return reader.readShort()
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
@@ -219,6 +269,7 @@ class Short(IntValue):
 
 class UShort(IntValue):
 	staticSize = 2
+	structFormat = "H"
 	def read(self, reader, font, tableDict):
 		return reader.readUShort()
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
@@ -226,6 +277,7 @@ class UShort(IntValue):
 
 class Int8(IntValue):
 	staticSize = 1
+	structFormat = "b"
 	def read(self, reader, font, tableDict):
 		return reader.readInt8()
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
@@ -233,6 +285,7 @@ class Int8(IntValue):
 
 class UInt8(IntValue):
 	staticSize = 1
+	structFormat = "B"
 	def read(self, reader, font, tableDict):
 		return reader.readUInt8()
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
@@ -267,19 +320,22 @@ class Tag(SimpleValue):
 
 class GlyphID(SimpleValue):
 	staticSize = 2
+	structFormat = "H"
+	isGlyphID = True
 	def readArray(self, reader, font, tableDict, count):
-		glyphOrder = font.getGlyphOrder()
-		gids = reader.readUShortArray(count)
-		try:
-			l = [glyphOrder[gid] for gid in gids]
-		except IndexError:
-			# Slower, but will not throw an IndexError on an invalid glyph id.
-			l = [font.getGlyphName(gid) for gid in gids]
-		return l
+		return font.getGlyphNameMany(reader.readUShortArray(count))
 	def read(self, reader, font, tableDict):
 		return font.getGlyphName(reader.readUShort())
 	def write(self, writer, font, tableDict, value, repeatIndex=None):
 		writer.writeUShort(font.getGlyphID(value))
+	def writeArray(self, writer, font, tableDict, values):
+		try:
+			gids = font.getGlyphIDMany(values)
+			data = struct.pack(">%dH" % len(gids), *gids)
+		except Exception:
+			BaseConverter.writeArray(self, writer, font, tableDict, values)
+		else:
+			writer.writeData(data)
 
 
 class NameID(UShort):
@@ -385,6 +441,9 @@ class Struct(BaseConverter):
 	def getRecordSize(self, reader):
 		return self.tableClass and self.tableClass.getRecordSize(reader)
 
+	def getRecordRun(self, reader=None):
+		return self.tableClass and self.tableClass.getRecordRun(reader)
+
 	def read(self, reader, font, tableDict):
 		table = self.tableClass()
 		table.decompile(reader, font)
@@ -453,6 +512,9 @@ class Struct(BaseConverter):
 
 
 class StructWithLength(Struct):
+	def getRecordRun(self, reader=None):
+		return None
+
 	def read(self, reader, font, tableDict):
 		pos = reader.pos
 		table = self.tableClass()
@@ -485,6 +547,9 @@ class Table(Struct):
 	longOffset = False
 	staticSize = 2
 
+	def getRecordRun(self, reader=None):
+		return None
+
 	def readOffset(self, reader):
 		return reader.readUShort()
 
@@ -574,6 +639,7 @@ class ValueFormat(IntValue):
 
 
 class ValueRecord(ValueFormat):
+	isValueRecord = True
 	def getRecordSize(self, reader):
 		return 2 * len(reader[self.which])
 	def read(self, reader, font, tableDict):
@@ -9,6 +9,7 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 from fontTools.misc.py23 import *
 from fontTools.misc.textTools import pad, safeEval
 from .otBase import BaseTable, FormatSwitchingBaseTable, ValueRecord
+import array
 import operator
 import logging
 import struct
@@ -505,99 +506,278 @@ class FeatureParamsStylisticSet(FeatureParams):
 class FeatureParamsCharacterVariants(FeatureParams):
 	pass
 
+class _GlyphOrder(object):
+
+	"""The glyph order that the glyph IDs of decompiled Coverage and ClassDef
+	tables refer to. All the tables decompiled with the same glyph order
+	share one, and so do their copies; the reverse glyph map is built on
+	first use."""
+
+	__slots__ = ('glyphOrder', '_reverseGlyphMap', '_glyphIDs')
+
+	def __init__(self, glyphOrder):
+		self.glyphOrder = glyphOrder
+		self._reverseGlyphMap = None
+		self._glyphIDs = None
+
+	@classmethod
+	def fromFont(cls, font):
+		glyphOrder = font.getGlyphOrder()
+		shared = getattr(font, '_otGlyphOrder', None)
+		if shared is None or shared.glyphOrder is not glyphOrder:
+			shared = font._otGlyphOrder = cls(glyphOrder)
+		return shared
+
+	def getGlyphID(self, glyphName):
+		"""Return the glyph ID of 'glyphName', or None if there is no such
+		glyph."""
+		reverseGlyphMap = self._reverseGlyphMap
+		if reverseGlyphMap is None:
+			reverseGlyphMap = self._reverseGlyphMap = {
+				glyphName: glyphID for glyphID, glyphName in enumerate(self.glyphOrder)}
+		return reverseGlyphMap.get(glyphName)
+
+	def getGlyphIDRange(self, start, end):
+		"""Return an array of the glyph IDs from 'start' to 'end'."""
+		glyphIDs = self._glyphIDs
+		if glyphIDs is None:
+			glyphIDs = self._glyphIDs = array.array('H', range(len(self.glyphOrder)))
+		return glyphIDs[start:end + 1]
+
+	def isValid(self, glyphIDs):
+		"""Return whether 'glyphIDs' are strictly ascending and all in the
+		glyph order."""
+		return (not glyphIDs or glyphIDs[-1] < len(self.glyphOrder) and
+			all(map(operator.lt, glyphIDs, glyphIDs[1:])))
+
+	def __copy__(self):
+		return self
+
+	def __deepcopy__(self, memo):
+		return self
+
+	def __reduce__(self):
+		return (self.__class__, (self.glyphOrder,))
+
+
 class Coverage(FormatSwitchingBaseTable):
 
 	# manual implementation to get rid of glyphID dependencies
 
+	# A decompiled Coverage keeps its glyphs as an ascending array of glyph
+	# IDs, along with the _GlyphOrder they refer to, and only looks up their
+	# names when 'glyphs' is first used; from then on (or once 'glyphs' is
+	# set) the list of names is what counts.
+
+	_glyphIDKeys = ("_glyphIDs", "_glyphOrder")
+
+	@property
+	def glyphs(self):
+		d = self.__dict__
+		if "_glyphs" not in d:
+			if "_glyphIDs" not in d:
+				# let BaseTable.__getattr__ decompile lazily loaded tables
+				raise AttributeError("glyphs")
+			self.glyphs = self._getGlyphNames()
+		return d["_glyphs"]
+
+	@glyphs.setter
+	def glyphs(self, glyphs):
+		d = self.__dict__
+		for key in self._glyphIDKeys:
+			d.pop(key, None)
+		d["_glyphs"] = glyphs
+
+	@glyphs.deleter
+	def glyphs(self):
+		if "_glyphs" not in self.__dict__ and "_glyphIDs" not in self.__dict__:
+			raise AttributeError("glyphs")
+		for key in ("_glyphs",) + self._glyphIDKeys:
+			self.__dict__.pop(key, None)
+
+	def _getGlyphNames(self):
+		glyphOrder = self._glyphOrder.glyphOrder
+		return [glyphOrder[glyphID] for glyphID in self._glyphIDs]
+
+	def _getGlyphIDs(self):
+		"""Return the ascending array of glyph IDs of the covered glyphs and
+		the _GlyphOrder it refers to, or (None, None) if the glyphs are
+		stored by name."""
+		self.ensureDecompiled()
+		d = self.__dict__
+		return d.get("_glyphIDs"), d.get("_glyphOrder")
+
+	def _setGlyphIDs(self, glyphIDs, glyphOrder, valid=None):
+		"""Store the glyphs as the array of glyph IDs 'glyphIDs' in the
+		_GlyphOrder 'glyphOrder'; by name if they are not ascending. If
+		'valid' is True, the glyph IDs are known to be ascending and in the
+		glyph order."""
+		if not (valid or glyphOrder.isValid(glyphIDs)):
+			names = glyphOrder.glyphOrder
+			self.glyphs = [names[glyphID] for glyphID in glyphIDs]
+			return
+		d = self.__dict__
+		d.pop("_glyphs", None)
+		d["_glyphIDs"] = glyphIDs
+		d["_glyphOrder"] = glyphOrder
+
+	def getGlyphIDs(self, font):
+		"""Return the glyph IDs of the covered glyphs in the glyph order of
+		'font'."""
+		glyphIDs, glyphOrder = self._getGlyphIDs()
+		if glyphIDs is not None and glyphOrder.glyphOrder is font.getGlyphOrder():
+			return glyphIDs
+		glyphs = getattr(self, "glyphs", None)
+		if glyphs is None:
+			glyphs = self.glyphs = []
+		return font.getGlyphIDMany(glyphs)
+
+	def _getState(self):
+		state = self.__dict__.copy()
+		if "_glyphIDs" in state:
+			state["_glyphs"] = self._getGlyphNames()
+			for key in self._glyphIDKeys:
+				del state[key]
+		return state
+
+	def __eq__(self, other):
+		if type(self) != type(other):
+			return NotImplemented
+		self.ensureDecompiled()
+		other.ensureDecompiled()
+		return self._getState() == other._getState()
+
 	def populateDefaults(self, propagator=None):
 		if not hasattr(self, 'glyphs'):
 			self.glyphs = []
 
+	def decompile(self, reader, font):
+		# read the glyph IDs as they are, without going through glyph names
+		self.readFormat(reader)
+		if self.Format == 1:
+			glyphIDs = reader.readUShortArray(reader.readUShort())
+			glyphOrder = _GlyphOrder.fromFont(font)
+			if glyphOrder.isValid(glyphIDs):
+				self._setGlyphIDs(glyphIDs, glyphOrder, valid=True)
+			else:
+				# TODO only allow glyphs that are valid?
+				self.glyphs = font.getGlyphNameMany(glyphIDs)
+		elif self.Format == 2:
+			records = reader.readUShortArray(3 * reader.readUShort())
+			self._setRanges(list(zip(records[2::3], records[0::3], records[1::3])), font)
+		else:
+			self.glyphs = []
+			log.warning("Unknown Coverage format: %s", self.Format)
+
 	def postRead(self, rawTable, font):
 		if self.Format == 1:
 			# TODO only allow glyphs that are valid?
 			self.glyphs = rawTable["GlyphArray"]
 		elif self.Format == 2:
-			glyphs = self.glyphs = []
 			ranges = rawTable["RangeRecord"]
-			glyphOrder = font.getGlyphOrder()
-			# Some SIL fonts have coverage entries that don't have sorted
-			# StartCoverageIndex.  If it is so, fixup and warn.  We undo
-			# this when writing font out.
-			sorted_ranges = sorted(ranges, key=lambda a: a.StartCoverageIndex)
-			if ranges != sorted_ranges:
-				log.warning("GSUB/GPOS Coverage is not sorted by glyph ids.")
-				ranges = sorted_ranges
-			del sorted_ranges
-			for r in ranges:
-				assert r.StartCoverageIndex == len(glyphs), \
-					(r.StartCoverageIndex, len(glyphs))
-				start = r.Start
-				end = r.End
-				try:
-					startID = font.getGlyphID(start, requireReal=True)
-				except KeyError:
-					log.warning("Coverage table has start glyph ID out of range: %s.", start)
-					continue
-				try:
-					endID = font.getGlyphID(end, requireReal=True) + 1
-				except KeyError:
-					# Apparently some tools use 65535 to "match all" the range
-					if end != 'glyph65535':
-						log.warning("Coverage table has end glyph ID out of range: %s.", end)
-					# NOTE: We clobber out-of-range things here.  There are legit uses for those,
-					# but none that we have seen in the wild.
-					endID = len(glyphOrder)
-				glyphs.extend(glyphOrder[glyphID] for glyphID in range(startID, endID))
+			self._setRanges(list(zip(
+				[r.StartCoverageIndex for r in ranges],
+				font.getGlyphIDMany([r.Start for r in ranges]),
+				font.getGlyphIDMany([r.End for r in ranges]))), font)
 		else:
 			self.glyphs = []
 			log.warning("Unknown Coverage format: %s", self.Format)
 
+	def _setRanges(self, ranges, font):
+		# 'ranges' holds a (StartCoverageIndex, startID, endID) tuple for
+		# each RangeRecord
+		glyphIDs = array.array('H')
+		numGlyphs = len(font.getGlyphOrder())
+		# Some SIL fonts have coverage entries that don't have sorted
+		# StartCoverageIndex.  If it is so, fixup and warn.  We undo
+		# this when writing font out.
+		sorted_ranges = sorted(ranges, key=operator.itemgetter(0))
+		if ranges != sorted_ranges:
+			log.warning("GSUB/GPOS Coverage is not sorted by glyph ids.")
+			ranges = sorted_ranges
+		del sorted_ranges
+		glyphOrder = _GlyphOrder.fromFont(font)
+		ascending = True
+		lastID = -1
+		for startCoverageIndex, startID, endID in ranges:
+			assert startCoverageIndex == len(glyphIDs), \
+				(startCoverageIndex, len(glyphIDs))
+			if startID >= numGlyphs:
+				log.warning("Coverage table has start glyph ID out of range: %s.",
+					font.getGlyphName(startID))
+				continue
+			if endID >= numGlyphs:
+				# Apparently some tools use 65535 to "match all" the range
+				if endID != 0xFFFF:
+					log.warning("Coverage table has end glyph ID out of range: %s.",
+						font.getGlyphName(endID))
+				# NOTE: We clobber out-of-range things here.  There are legit uses for those,
+				# but none that we have seen in the wild.
+				endID = numGlyphs - 1
+			if startID <= endID:
+				ascending = ascending and startID > lastID
+				lastID = endID
+			glyphIDs.extend(glyphOrder.getGlyphIDRange(startID, endID))
+		self._setGlyphIDs(glyphIDs, glyphOrder, valid=ascending or None)
+
+	@staticmethod
+	def _getRanges(glyphIDs):
+		# Return None if Format 1 is more compact for the glyph IDs, else
+		# a (startID, endID, StartCoverageIndex) tuple for each range.
+		if not glyphIDs:
+			return None
+		brokenOrder = sorted(glyphIDs) != list(glyphIDs)
+
+		# indices at which a new range of consecutive glyph IDs starts
+		starts = [i for i, (prev, glyphID) in enumerate(
+				zip(glyphIDs, glyphIDs[1:]), 1) if glyphID != prev + 1]
+		if not brokenOrder and (len(starts) + 1) * 3 >= len(glyphIDs):  # 3 words vs. 1 word
+			return None
+		# Format 2 is more compact
+		ranges = [(glyphIDs[i], glyphIDs[j - 1], i)
+			for i, j in zip([0] + starts, starts + [len(glyphIDs)])]
+		if brokenOrder:
+			log.warning("GSUB/GPOS Coverage is not sorted by glyph ids.")
+			ranges.sort(key=operator.itemgetter(0))
+		return ranges
+
 	def preWrite(self, font):
 		glyphs = getattr(self, "glyphs", None)
 		if glyphs is None:
 			glyphs = self.glyphs = []
 		format = 1
 		rawTable = {"GlyphArray": glyphs}
-		getGlyphID = font.getGlyphID
-		if glyphs:
-			# find out whether Format 2 is more compact or not
-			glyphIDs = [getGlyphID(glyphName) for glyphName in glyphs ]
-			brokenOrder = sorted(glyphIDs) != glyphIDs
-
-			last = glyphIDs[0]
-			ranges = [[last]]
-			for glyphID in glyphIDs[1:]:
-				if glyphID != last + 1:
-					ranges[-1].append(last)
-					ranges.append([glyphID])
-				last = glyphID
-			ranges[-1].append(last)
-
-			if brokenOrder or len(ranges) * 3 < len(glyphs):  # 3 words vs. 1 word
-				# Format 2 is more compact
-				index = 0
-				for i in range(len(ranges)):
-					start, end = ranges[i]
-					r = RangeRecord()
-					r.StartID = start
-					r.Start = font.getGlyphName(start)
-					r.End = font.getGlyphName(end)
-					r.StartCoverageIndex = index
-					ranges[i] = r
-					index = index + end - start + 1
-				if brokenOrder:
-					log.warning("GSUB/GPOS Coverage is not sorted by glyph ids.")
-					ranges.sort(key=lambda a: a.StartID)
-				for r in ranges:
-					del r.StartID
-				format = 2
-				rawTable = {"RangeRecord": ranges}
-			#else:
-			#	fallthrough; Format 1 is more compact
+		ranges = self._getRanges(font.getGlyphIDMany(glyphs))
+		if ranges is not None:
+			for i in range(len(ranges)):
+				start, end, index = ranges[i]
+				r = RangeRecord()
+				r.Start = font.getGlyphName(start)
+				r.End = font.getGlyphName(end)
+				r.StartCoverageIndex = index
+				ranges[i] = r
+			format = 2
+			rawTable = {"RangeRecord": ranges}
 		self.Format = format
 		return rawTable
 
+	def compile(self, writer, font):
+		if "reader" in self.__dict__ and self._compileDataSpan(writer):
+			return
+		self.ensureDecompiled()
+		# write the glyph IDs directly, without going through glyph names
+		glyphIDs = self.getGlyphIDs(font)
+		ranges = self._getRanges(glyphIDs)
+		if ranges is None:
+			self.Format = 1
+			values = glyphIDs
+		else:
+			self.Format = 2
+			values = [value for r in ranges for value in r]
+		self.writeFormat(writer)
+		writer.writeUShort(len(values) if ranges is None else len(ranges))
+		writer.writeData(struct.pack(">%dH" % len(values), *values))
+
 	def toXML2(self, xmlWriter, font):
 		for glyphName in getattr(self, "glyphs", []):
 			xmlWriter.simpletag("Glyph", value=glyphName)
@@ -701,9 +881,9 @@ class SingleSubst(FormatSwitchingBaseTable):
 		lenMapping = len(input)
 		if self.Format == 1:
 			delta = rawTable["DeltaGlyphID"]
-			inputGIDS =  [ font.getGlyphID(name) for name in input ]
+			inputGIDS = font.getGlyphIDMany(input)
 			outGIDS = [ (glyphID + delta) % 65536 for glyphID in inputGIDS ]
-			outNames = [ font.getGlyphName(glyphID) for glyphID in outGIDS ]
+			outNames = font.getGlyphNameMany(outGIDS)
 			list(map(operator.setitem, [mapping]*lenMapping, input, outNames))
 		elif self.Format == 2:
 			assert len(input) == rawTable["GlyphCount"], \
@@ -845,87 +1025,211 @@ class MultipleSubst(FormatSwitchingBaseTable):
 		return seq
 
 
+def _mergeClassRanges(ranges):
+	# Return arrays of the first glyph IDs, last glyph IDs and classes of
+	# the ascending, disjoint (startID, endID, class) 'ranges', merging the
+	# ranges that follow on each other with the same class.
+	starts = array.array('H')
+	ends = array.array('H')
+	classes = array.array('H')
+	for start, end, cls in ranges:
+		if ends and start == ends[-1] + 1 and cls == classes[-1]:
+			ends[-1] = end
+		else:
+			starts.append(start)
+			ends.append(end)
+			classes.append(cls)
+	return starts, ends, classes
+
+
 class ClassDef(FormatSwitchingBaseTable):
 
+	# A decompiled ClassDef keeps its classes as ascending, disjoint ranges
+	# of glyph IDs (arrays of the first and last glyph ID and the class of
+	# each range), along with the _GlyphOrder they refer to, and only builds
+	# the 'classDefs' dict when it is first used; from then on (or once
+	# 'classDefs' is set) the dict of glyph names is what counts.
+
+	_glyphIDKeys = ("_starts", "_ends", "_classes", "_glyphOrder")
+
+	@property
+	def classDefs(self):
+		d = self.__dict__
+		if "_classDefs" not in d:
+			if "_starts" not in d:
+				# let BaseTable.__getattr__ decompile lazily loaded tables
+				raise AttributeError("classDefs")
+			self.classDefs = self._getClassDefs()
+		return d["_classDefs"]
+
+	@classDefs.setter
+	def classDefs(self, classDefs):
+		d = self.__dict__
+		for key in self._glyphIDKeys:
+			d.pop(key, None)
+		d["_classDefs"] = classDefs
+
+	@classDefs.deleter
+	def classDefs(self):
+		if "_classDefs" not in self.__dict__ and "_starts" not in self.__dict__:
+			raise AttributeError("classDefs")
+		for key in ("_classDefs",) + self._glyphIDKeys:
+			self.__dict__.pop(key, None)
+
+	def _getClassDefs(self):
+		glyphOrder = self._glyphOrder.glyphOrder
+		classDefs = {}
+		for start, end, cls in zip(self._starts, self._ends, self._classes):
+			classDefs.update(dict.fromkeys(glyphOrder[start:end + 1], cls))
+		return classDefs
+
+	def _getGlyphIDRanges(self):
+		"""Return the arrays of first glyph IDs, last glyph IDs and classes of
+		the ranges, and the _GlyphOrder they refer to; or four Nones if the
+		classes are stored by glyph name."""
+		self.ensureDecompiled()
+		d = self.__dict__
+		return tuple(d.get(key) for key in self._glyphIDKeys)
+
+	def _setGlyphIDRanges(self, starts, ends, classes, glyphOrder):
+		"""Store the classes as ranges of glyph IDs in the _GlyphOrder
+		'glyphOrder'. The ranges must be ascending and disjoint."""
+		d = self.__dict__
+		d.pop("_classDefs", None)
+		d.update(zip(self._glyphIDKeys, (starts, ends, classes, glyphOrder)))
+
+	def _setGlyphIDClasses(self, items, glyphOrder):
+		"""Store the classes of the (glyphID, class) pairs 'items', which
+		must be ascending by glyph ID."""
+		starts, ends, classes = _mergeClassRanges(
+			(glyphID, glyphID, cls) for glyphID, cls in items)
+		self._setGlyphIDRanges(starts, ends, classes, glyphOrder)
+
+	def _getState(self):
+		state = self.__dict__.copy()
+		if "_starts" in state:
+			state["_classDefs"] = self._getClassDefs()
+			for key in self._glyphIDKeys:
+				del state[key]
+		return state
+
+	def __eq__(self, other):
+		if type(self) != type(other):
+			return NotImplemented
+		self.ensureDecompiled()
+		other.ensureDecompiled()
+		return self._getState() == other._getState()
+
 	def populateDefaults(self, propagator=None):
 		if not hasattr(self, 'classDefs'):
 			self.classDefs = {}
 
-	def postRead(self, rawTable, font):
-		classDefs = {}
-		glyphOrder = font.getGlyphOrder()
+	def decompile(self, reader, font):
+		# read the glyph IDs as they are, without going through glyph names
+		self.readFormat(reader)
+		if self.Format == 1:
+			startID = reader.readUShort()
+			classList = reader.readUShortArray(reader.readUShort())
+			start = font.getGlyphName(startID)
+			numGlyphs = len(font.getGlyphOrder())
+			if startID >= numGlyphs:
+				log.warning("ClassDef table has start glyph ID out of range: %s.", start)
+				startID = numGlyphs
+			self._setClassValues(start, startID, classList, font)
+		elif self.Format == 2:
+			records = reader.readUShortArray(3 * reader.readUShort())
+			self._setRanges(list(zip(records[0::3], records[1::3], records[2::3])), font)
+		else:
+			self.classDefs = {}
+			log.warning("Unknown ClassDef format: %s", self.Format)
 
+	def postRead(self, rawTable, font):
 		if self.Format == 1:
 			start = rawTable["StartGlyph"]
-			classList = rawTable["ClassValueArray"]
 			try:
 				startID = font.getGlyphID(start, requireReal=True)
 			except KeyError:
 				log.warning("ClassDef table has start glyph ID out of range: %s.", start)
-				startID = len(glyphOrder)
-			endID = startID + len(classList)
-			if endID > len(glyphOrder):
-				log.warning("ClassDef table has entries for out of range glyph IDs: %s,%s.",
-					start, len(classList))
-				# NOTE: We clobber out-of-range things here.  There are legit uses for those,
-				# but none that we have seen in the wild.
-				endID = len(glyphOrder)
-
-			for glyphID, cls in zip(range(startID, endID), classList):
-				if cls:
-					classDefs[glyphOrder[glyphID]] = cls
-
+				startID = len(font.getGlyphOrder())
+			self._setClassValues(start, startID, rawTable["ClassValueArray"], font)
 		elif self.Format == 2:
 			records = rawTable["ClassRangeRecord"]
-			for rec in records:
-				start = rec.Start
-				end = rec.End
-				cls = rec.Class
-				try:
-					startID = font.getGlyphID(start, requireReal=True)
-				except KeyError:
-					log.warning("ClassDef table has start glyph ID out of range: %s.", start)
-					continue
-				try:
-					endID = font.getGlyphID(end, requireReal=True) + 1
-				except KeyError:
-					# Apparently some tools use 65535 to "match all" the range
-					if end != 'glyph65535':
-						log.warning("ClassDef table has end glyph ID out of range: %s.", end)
-					# NOTE: We clobber out-of-range things here.  There are legit uses for those,
-					# but none that we have seen in the wild.
-					endID = len(glyphOrder)
-				for glyphID in range(startID, endID):
-					if cls:
-						classDefs[glyphOrder[glyphID]] = cls
+			self._setRanges(list(zip(
+				font.getGlyphIDMany([rec.Start for rec in records]),
+				font.getGlyphIDMany([rec.End for rec in records]),
+				[rec.Class for rec in records])), font)
 		else:
+			self.classDefs = {}
 			log.warning("Unknown ClassDef format: %s", self.Format)
-		self.classDefs = classDefs
 
-	def _getClassRanges(self, font):
-		classDefs = getattr(self, "classDefs", None)
-		if classDefs is None:
-			self.classDefs = {}
-			return
-		getGlyphID = font.getGlyphID
-		items = []
-		for glyphName, cls in classDefs.items():
-			if not cls:
+	def _setClassValues(self, start, startID, classList, font):
+		endID = startID + len(classList)
+		numGlyphs = len(font.getGlyphOrder())
+		if endID > numGlyphs:
+			log.warning("ClassDef table has entries for out of range glyph IDs: %s,%s.",
+				start, len(classList))
+			# NOTE: We clobber out-of-range things here.  There are legit uses for those,
+			# but none that we have seen in the wild.
+			endID = numGlyphs
+		self._setGlyphIDClasses(
+			[(glyphID, cls) for glyphID, cls in zip(range(startID, endID), classList) if cls],
+			_GlyphOrder.fromFont(font))
+
+	def _setRanges(self, ranges, font):
+		# 'ranges' holds a (startID, endID, Class) tuple for each
+		# ClassRangeRecord
+		numGlyphs = len(font.getGlyphOrder())
+		validRanges = []
+		for startID, endID, cls in ranges:
+			if startID >= numGlyphs:
+				log.warning("ClassDef table has start glyph ID out of range: %s.",
+					font.getGlyphName(startID))
 				continue
-			items.append((getGlyphID(glyphName), glyphName, cls))
-		if items:
-			items.sort()
-			last, lastName, lastCls = items[0]
-			ranges = [[lastCls, last, lastName]]
-			for glyphID, glyphName, cls in items[1:]:
-				if glyphID != last + 1 or cls != lastCls:
-					ranges[-1].extend([last, lastName])
-					ranges.append([cls, glyphID, glyphName])
-				last = glyphID
-				lastName = glyphName
-				lastCls = cls
-			ranges[-1].extend([last, lastName])
-			return ranges
+			if endID >= numGlyphs:
+				# Apparently some tools use 65535 to "match all" the range
+				if endID != 0xFFFF:
+					log.warning("ClassDef table has end glyph ID out of range: %s.",
+						font.getGlyphName(endID))
+				# NOTE: We clobber out-of-range things here.  There are legit uses for those,
+				# but none that we have seen in the wild.
+				endID = numGlyphs - 1
+			if cls and startID <= endID:
+				validRanges.append((startID, endID, cls))
+		glyphOrder = _GlyphOrder.fromFont(font)
+		validRanges.sort()
+		if any(start <= prevEnd for (_, prevEnd, _), (start, _, _) in
+				zip(validRanges, validRanges[1:])):
+			# overlapping ranges: the last record wins
+			classDefs = {}
+			for startID, endID, cls in ranges:
+				if cls and startID < numGlyphs:
+					classDefs.update(dict.fromkeys(
+						glyphOrder.glyphOrder[startID:endID + 1], cls))
+			self.classDefs = classDefs
+			return
+		starts, ends, classes = _mergeClassRanges(validRanges)
+		self._setGlyphIDRanges(starts, ends, classes, glyphOrder)
+
+	def _getGlyphIDClassRanges(self, font):
+		# Return a (startID, endID, Class) tuple for each run of consecutive
+		# glyph IDs of the same class (but 0) in the glyph order of 'font'.
+		starts, ends, classes, glyphOrder = self._getGlyphIDRanges()
+		if starts is not None and glyphOrder.glyphOrder is font.getGlyphOrder():
+			ranges = zip(starts, ends, classes)
+		else:
+			classDefs = getattr(self, "classDefs", None)
+			if classDefs is None:
+				classDefs = self.classDefs = {}
+			glyphNames = [glyphName for glyphName, cls in classDefs.items() if cls]
+			ranges = sorted((glyphID, glyphID, classDefs[glyphName]) for glyphID, glyphName
+				in zip(font.getGlyphIDMany(glyphNames), glyphNames))
+		return list(zip(*_mergeClassRanges(r for r in ranges if r[2])))
+
+	def _getClassRanges(self, font):
+		ranges = self._getGlyphIDClassRanges(font)
+		if ranges:
+			return [[cls, start, font.getGlyphName(start), end, font.getGlyphName(end)]
+				for start, end, cls in ranges]
 
 	def preWrite(self, font):
 		format = 2
@@ -958,6 +1262,31 @@ class ClassDef(FormatSwitchingBaseTable):
 		self.Format = format
 		return rawTable
 
+	def compile(self, writer, font):
+		if "reader" in self.__dict__ and self._compileDataSpan(writer):
+			return
+		self.ensureDecompiled()
+		# write the glyph IDs directly, without going through glyph names
+		ranges = self._getGlyphIDClassRanges(font)
+		self.Format = 2
+		values = [value for r in ranges for value in r]
+		if ranges:
+			startGlyph = ranges[0][0]
+			glyphCount = ranges[-1][1] - startGlyph + 1
+			if len(ranges) * 3 >= glyphCount + 1:
+				# Format 1 is more compact
+				self.Format = 1
+				values = [0] * glyphCount
+				for start, end, cls in ranges:
+					values[start - startGlyph:end - startGlyph + 1] = [cls] * (end - start + 1)
+		self.writeFormat(writer)
+		if self.Format == 1:
+			writer.writeUShort(startGlyph)
+			writer.writeUShort(len(values))
+		else:
+			writer.writeUShort(len(ranges))
+		writer.writeData(struct.pack(">%dH" % len(values), *values))
+
 	def toXML2(self, xmlWriter, font):
 		items = sorted(self.classDefs.items())
 		for glyphName, cls in items:
@@ -1488,6 +1817,58 @@ def fixSubTableOverFlows(ttf, overflowRecord):
 		lookup.SubTable.insert(subIndex + 1, toInsert)
 	return ok
 
+def fixOverFlows(ttf, overflowRecords):
+	""" Fix all the given overflows of a GSUB/GPOS table at once, before the
+	table is compiled again. Return true if all of them could be addressed.
+
+	Overflows within different subtables are independent of each other, so
+	each overflowing subtable gets fixed (which first means it stops being
+	shared, then split) in one go; subtables of the same lookup are handled
+	from last to first, so that inserting split-off subtables doesn't shift
+	the indices of the ones that remain to be fixed. Promoting a lookup to
+	an Extension moves all of its subtables, and thus changes the offsets of
+	every lookup that follows it; only the first overflowing offset from the
+	LookupList is fixed in one go, as the other ones may well be gone after.
+	"""
+	subTableRecords = {}
+	lookupRecords = []
+	for overflowRecord in overflowRecords:
+		if overflowRecord.LookupListIndex is None:
+			# not within a lookup: nothing we know how to fix
+			return False
+		if overflowRecord.itemName is None:
+			lookupRecords.append(overflowRecord)
+		else:
+			key = (overflowRecord.LookupListIndex, overflowRecord.SubTableIndex)
+			subTableRecords.setdefault(key, overflowRecord)
+
+	for key in sorted(subTableRecords, reverse=True):
+		overflowRecord = subTableRecords[key]
+		if not fixSubTableOverFlows(ttf, overflowRecord):
+			# Try upgrading lookup to Extension and hope
+			# that cross-lookup sharing not happening would
+			# fix overflow...
+			lookupRecords.append(overflowRecord)
+
+	promoted = set()
+	firstLookupListRecord = None
+	for overflowRecord in lookupRecords:
+		if overflowRecord.SubTableIndex is None:
+			if (firstLookupListRecord is None or overflowRecord.LookupListIndex <
+					firstLookupListRecord.LookupListIndex):
+				firstLookupListRecord = overflowRecord
+			continue
+		if overflowRecord.LookupListIndex in promoted:
+			continue
+		if not fixLookupOverFlows(ttf, overflowRecord):
+			return False
+		promoted.add(overflowRecord.LookupListIndex)
+	if firstLookupListRecord is not None:
+		if firstLookupListRecord.LookupListIndex - 1 not in promoted:
+			if not fixLookupOverFlows(ttf, firstLookupListRecord):
+				return False
+	return True
+
 # End of OverFlow logic
 
 
@@ -2,6 +2,7 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.ttLib.ttFont import TTFont
 from fontTools.ttLib.sfnt import readTTCHeader, writeTTCHeader
+from fontTools.ttLib.tableCache import TableCache
 import struct
 import logging
 
@@ -18,9 +19,13 @@ class TTCollection(object):
 	the same in the font file.  Note, however, that this might result
 	in suprises and incorrect behavior if the different fonts involved
 	have different GlyphOrder.  Use only if you know what you are doing.
+
+	A fontTools.ttLib.TableCache object can be passed as 'tableCache' to
+	share tables with other fonts and collections using the same cache;
+	this implies shareTables.
 	"""
 
-	def __init__(self, file=None, shareTables=False, **kwargs):
+	def __init__(self, file=None, shareTables=False, tableCache=None, **kwargs):
 		fonts = self.fonts = []
 		if file is None:
 			return
@@ -30,11 +35,12 @@ class TTCollection(object):
 		if not hasattr(file, "read"):
 			file = open(file, "rb")
 
-		tableCache = {} if shareTables else None
+		if tableCache is None and shareTables:
+			tableCache = TableCache(maxsize=None)
 
 		header = readTTCHeader(file)
 		for i in range(header.numFonts):
-			font = TTFont(file, fontNumber=i, _tableCache=tableCache, **kwargs)
+			font = TTFont(file, fontNumber=i, tableCache=tableCache, **kwargs)
 			fonts.append(font)
 
 	def save(self, file, shareTables=True):
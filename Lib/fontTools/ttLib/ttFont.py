@@ -5,8 +5,11 @@ from fontTools.misc.loggingTools import deprecateArgument
 from fontTools.ttLib import TTLibError
 from fontTools.ttLib.sfnt import SFNTReader, SFNTWriter
 import os
+import copy
+import mmap
 import logging
 import itertools
+from collections import OrderedDict
 
 log = logging.getLogger(__name__)
 
@@ -22,7 +25,7 @@ class TTFont(object):
 			sfntVersion="\000\001\000\000", flavor=None, checkChecksums=False,
 			verbose=None, recalcBBoxes=True, allowVID=False, ignoreDecompileErrors=False,
 			recalcTimestamp=True, fontNumber=-1, lazy=None, quiet=None,
-			_tableCache=None):
+			mmap=False, tableCache=None):
 
 		"""The constructor can be called with a few different arguments.
 		When reading a font from disk, 'file' should be either a pathname
@@ -79,6 +82,21 @@ class TTFont(object):
 		If lazy is set to True, many data structures are loaded lazily, upon
 		access only.  If it is set to False, many data structures are loaded
 		immediately.  The default is lazy=None which is somewhere in between.
+
+		If mmap is set to True, the input file is mapped into memory instead
+		of being read, and the raw table data is handed out as read-only
+		memoryview slices over the shared mapping. Tables that know how to
+		decompile from a buffer (e.g. 'glyf', 'loca', 'hmtx', 'CFF ' and the
+		OpenType layout tables) then avoid copying their data, which keeps
+		memory usage low when many processes open the same large font.
+		The 'file' argument must be a path or a real file object with a
+		fileno(); an existing mmap.mmap object may also be passed directly.
+
+		The 'tableCache' argument can be a fontTools.ttLib.TableCache object,
+		shared between many fonts. Tables read from the file are then looked
+		up in, and added to, the cache: fonts with identical table data (and
+		glyph orders, etc.) will share the same decompiled table object.
+		Call markDirty() before modifying such a table.
 		"""
 
 		for name in ("verbose", "quiet"):
@@ -92,6 +110,12 @@ class TTFont(object):
 		self.recalcTimestamp = recalcTimestamp
 		self.tables = {}
 		self.reader = None
+		self._cleanTables = set()
+		self.tableCache = tableCache
+		# tables shared with other fonts through the table cache, and
+		# tables this font must not share, as it modifies them
+		self._sharedTables = set()
+		self._privateTables = set()
 
 		# Permit the user to reference glyphs that are not int the font.
 		self.last_vid = 0xFFFE # Can't make it be 0xFFFF, as the world is full unsigned short integer counters that get incremented after the last seen GID value.
@@ -126,7 +150,9 @@ class TTFont(object):
 			closeStream = False
 			file.seek(0)
 
-		if not self.lazy:
+		if mmap:
+			file = _mapFile(file, closeStream)
+		elif not self.lazy:
 			# read input file in memory and wrap a stream around it to allow overwriting
 			file.seek(0)
 			tmp = BytesIO(file.read())
@@ -136,7 +162,6 @@ class TTFont(object):
 			if closeStream:
 				file.close()
 			file = tmp
-		self._tableCache = _tableCache
 		self.reader = SFNTReader(file, checkChecksums, fontNumber=fontNumber)
 		self.sfntVersion = self.reader.sfntVersion
 		self.flavor = self.reader.flavor
@@ -153,24 +178,47 @@ class TTFont(object):
 		if self.reader is not None:
 			self.reader.close()
 
-	def save(self, file, reorderTables=True):
+	def save(self, file, reorderTables=True, workers=None, compression=None):
 		"""Save the font to disk. Similarly to the constructor,
 		the 'file' argument can be either a pathname or a writable
 		file object.
+
+		If 'workers' is greater than 1, loaded tables that no other table
+		depends upon (e.g. 'GSUB', 'GPOS' or 'gvar') are compiled concurrently
+		in a pool of that many worker processes, while all the other tables
+		(e.g. 'glyf' or 'CFF ') are compiled in this one. Note that any
+		changes these tables make to themselves while compiling are then
+		not reflected in this font object. This requires the 'fork' start
+		method of multiprocessing; where it is not available, the tables are
+		compiled serially.
+
+		For WOFF and WOFF2 fonts, 'compression' can be a
+		sfnt.CompressionOptions object or the name of one of its presets
+		("fast", "default", "max") to trade file size for speed. When it's
+		None, the 'compression' attribute of self.flavorData is used, if any.
 		"""
 		if not hasattr(file, "write"):
-			if self.lazy and self.reader.file.name == file:
+			readerFile = getattr(self.reader, "file", None)
+			if self.lazy and getattr(readerFile, "name", None) == file:
 				raise TTLibError(
 					"Can't overwrite TTFont when 'lazy' attribute is True")
+			if isinstance(readerFile, _MappedFile) and readerFile.name == file:
+				raise TTLibError(
+					"Can't overwrite TTFont while its input file is memory-mapped")
 			closeStream = True
 			file = open(file, "wb")
 		else:
 			# assume "file" is a writable file object
 			closeStream = False
 
+		if compression is None and self.flavorData is not None:
+			# also used when the WOFF tables get reordered below
+			compression = getattr(self.flavorData, 'compression', None)
+
 		tmp = BytesIO()
 
-		writer_reordersTables = self._save(tmp)
+		writer_reordersTables = self._save(
+			tmp, workers=workers, compression=compression)
 
 		if (reorderTables is None or writer_reordersTables or
 				(reorderTables is False and self.reader is None)):
@@ -186,7 +234,7 @@ class TTFont(object):
 				tableOrder = None
 			tmp.flush()
 			tmp2 = BytesIO()
-			reorderFontTables(tmp, tmp2, tableOrder)
+			reorderFontTables(tmp, tmp2, tableOrder, compression=compression)
 			file.write(tmp2.getvalue())
 			tmp.close()
 			tmp2.close()
@@ -194,22 +242,41 @@ class TTFont(object):
 		if closeStream:
 			file.close()
 
-	def _save(self, file, tableCache=None):
+	def _save(self, file, tableCache=None, workers=None, compression=None):
 		"""Internal function, to be shared by save() and TTCollection.save()"""
 
 		if self.recalcTimestamp and 'head' in self:
 			self['head']  # make sure 'head' is loaded so the recalculation is actually done
 
+		# Compiling a table may update it (e.g. the timestamp in 'head', or
+		# 'loca' after 'glyf'): the tables shared with other fonts through
+		# the table cache that get compiled are replaced by copies first.
+		unshared = True
+		while unshared:
+			unshared = False
+			for tag in sorted(self._sharedTables):
+				if ((tag == 'head' and self.recalcTimestamp) or
+						not self._isUnchanged(tag)):
+					self.markDirty(tag)
+					self[tag]
+					unshared = True
+
 		tags = list(self.keys())
 		if "GlyphOrder" in tags:
 			tags.remove("GlyphOrder")
 		numTables = len(tags)
+
+		tableData = None
+		if workers is not None and workers > 1:
+			tableData = self._compileTablesInParallel(tags, workers)
+
 		# write to a temporary stream to allow saving to unseekable streams
-		writer = SFNTWriter(file, numTables, self.sfntVersion, self.flavor, self.flavorData)
+		writer = SFNTWriter(file, numTables, self.sfntVersion, self.flavor,
+			self.flavorData, compression=compression)
 
 		done = []
 		for tag in tags:
-			self._writeTable(tag, writer, done, tableCache)
+			self._writeTable(tag, writer, done, tableCache, tableData)
 
 		writer.close()
 
@@ -335,6 +402,46 @@ class TTFont(object):
 		reader = xmlReader.XMLReader(fileOrPath, self)
 		reader.read()
 
+	def markClean(self, tag):
+		"""Declare that the loaded table identified by 'tag' has not been
+		modified since it was read from the input file. Upon save, its
+		original binary data is then written as is, instead of compiling
+		the table again. This is much faster for big tables that were only
+		inspected, and guarantees an unchanged output for them.
+
+		Modifying the table afterwards has no effect on the saved font,
+		unless markDirty() is called or a new table is set for 'tag'.
+		A clean table is still compiled if any of the tables it depends
+		on (e.g. 'loca' on 'glyf') is loaded and not marked clean, as
+		compiling those may update it.
+		"""
+		tag = Tag(tag)
+		if not (self.reader and tag in self.reader):
+			raise TTLibError(
+				"can't mark '%s' table clean: no original data" % tag)
+		self._cleanTables.add(tag)
+
+	def markDirty(self, tag):
+		"""Undo markClean(): the table identified by 'tag' will be compiled
+		again upon save, if it is loaded.
+
+		This also declares that the table is going to be modified: if it
+		was shared with other fonts through the table cache, it is dropped,
+		and this font decompiles its own copy of it when it is next
+		accessed. It is never shared again.
+		"""
+		tag = Tag(tag)
+		self._cleanTables.discard(tag)
+		self._privateTables.add(tag)
+		if tag in self._sharedTables:
+			self._sharedTables.discard(tag)
+			self.tables.pop(tag, None)
+
+	def isClean(self, tag):
+		"""Return true if the table identified by 'tag' was marked clean
+		with markClean()."""
+		return Tag(tag) in self._cleanTables
+
 	def isLoaded(self, tag):
 		"""Return true if the table identified by 'tag' has been
 		decompiled and loaded into memory."""
@@ -378,13 +485,29 @@ class TTFont(object):
 				return table
 			if self.reader is not None:
 				import traceback
+				if self.lazy is True and hasattr(self.reader, "getLazyTable"):
+					# e.g. WOFF2 'glyf' tables, whose glyphs can be decoded
+					# one at a time from the transformed data
+					table = self.reader.getLazyTable(tag, self)
+					if table is not None:
+						log.debug("Lazily reconstructing '%s' table", tag)
+						self.tables[tag] = table
+						return table
 				log.debug("Reading '%s' table from disk", tag)
 				data = self.reader[tag]
-				if self._tableCache is not None:
-					table = self._tableCache.get((Tag(tag), data))
+				cacheKey = None
+				if self.tableCache is not None and tag not in self._privateTables:
+					cacheKey = self._getTableCacheKey(tag, data)
+				if cacheKey is not None:
+					table = self.tableCache.get(cacheKey)
 					if table is not None:
+						log.debug("Reusing cached '%s' table", tag)
+						self.tables[tag] = table
+						self._sharedTables.add(tag)
 						return table
 				tableClass = getTableClass(tag)
+				if isinstance(data, memoryview) and not tableClass.acceptsBuffer:
+					data = data.tobytes()
 				table = tableClass(tag)
 				self.tables[tag] = table
 				log.debug("Decompiling '%s' table", tag)
@@ -403,18 +526,55 @@ class TTFont(object):
 					table.ERROR = file.getvalue()
 					self.tables[tag] = table
 					table.decompile(data, self)
-				if self._tableCache is not None:
-					self._tableCache[(Tag(tag), data)] = table
+				if cacheKey is not None:
+					self.tableCache[cacheKey] = table
+					self._sharedTables.add(tag)
 				return table
 			else:
 				raise KeyError("'%s' table not found" % tag)
 
+	def _getTableCacheKey(self, tag, data):
+		"""Return the key of the table 'tag' with binary 'data' in the table
+		cache, or None if it must not be shared.
+		"""
+		from fontTools.ttLib.tableCache import (
+			_unsharedTags, _glyphOrderIndependentTags, _decompileDependencies)
+		if tag in _unsharedTags:
+			return None
+		context = []
+		if tag not in _glyphOrderIndependentTags:
+			context.append(self._getGlyphOrderDigest())
+		for masterTag in _decompileDependencies.get(tag, ()):
+			if masterTag in self._privateTables:
+				# the table is read with modified tables
+				return None
+			if self.reader is not None and masterTag in self.reader:
+				context.append(self.tableCache.digest(self.reader[masterTag]))
+			else:
+				context.append(None)
+		return self.tableCache.makeKey(tag, data, context)
+
+	def _getGlyphOrderDigest(self):
+		glyphOrder = self.getGlyphOrder()
+		cached = self.__dict__.get("_glyphOrderDigest")
+		if cached is not None and cached[0] is glyphOrder and cached[1] == len(glyphOrder):
+			return cached[2]
+		digest = self.tableCache.digest(tobytes("\0".join(glyphOrder), encoding="utf-8"))
+		self._glyphOrderDigest = (glyphOrder, len(glyphOrder), digest)
+		return digest
+
 	def __setitem__(self, tag, table):
-		self.tables[Tag(tag)] = table
+		tag = Tag(tag)
+		self.tables[tag] = table
+		self._cleanTables.discard(tag)
+		self._sharedTables.discard(tag)
+		self._privateTables.add(tag)
 
 	def __delitem__(self, tag):
 		if tag not in self:
 			raise KeyError("'%s' table not found" % tag)
+		self._cleanTables.discard(Tag(tag))
+		self._sharedTables.discard(Tag(tag))
 		if tag in self.tables:
 			del self.tables[tag]
 		if self.reader and tag in self.reader:
@@ -436,7 +596,12 @@ class TTFont(object):
 			pass
 		if 'CFF ' in self:
 			cff = self['CFF ']
-			self.glyphOrder = cff.getGlyphOrder()
+			if 'CFF ' in self._sharedTables:
+				# the table may have given its glyph order to another font
+				topDict = cff.cff[cff.cff.fontNames[0]]
+				self.glyphOrder = list(topDict.getGlyphOrder())
+			else:
+				self.glyphOrder = cff.getGlyphOrder()
 		elif 'post' in self:
 			# TrueType font
 			glyphOrder = self['post'].getGlyphOrder()
@@ -605,6 +770,30 @@ class TTFont(object):
 			return self.getGlyphID(glyphName)
 		return glyphID
 
+	def getGlyphNameMany(self, lst):
+		"""Return a list of glyph names for the glyph IDs in 'lst'."""
+		glyphOrder = self.getGlyphOrder()
+		try:
+			return [glyphOrder[glyphID] for glyphID in lst]
+		except IndexError:
+			getGlyphName = self.getGlyphName
+			return [getGlyphName(glyphID) for glyphID in lst]
+
+	def getGlyphIDMany(self, lst):
+		"""Return a list of glyph IDs for the glyph names in 'lst'."""
+		glyphOrder = self.getGlyphOrder()
+		d = self.getReverseGlyphMap()
+		try:
+			glyphIDs = [d[glyphName] for glyphName in lst]
+			# the reverse map goes stale if the glyph order was modified
+			if all(glyphOrder[glyphID] == glyphName
+					for glyphID, glyphName in zip(glyphIDs, lst)):
+				return glyphIDs
+		except (KeyError, IndexError):
+			pass
+		getGlyphID = self.getGlyphID
+		return [getGlyphID(glyphName) for glyphName in lst]
+
 	def getReverseGlyphMap(self, rebuild=False):
 		if rebuild or not hasattr(self, "_reverseGlyphOrderDict"):
 			self._buildReverseGlyphOrderDict()
@@ -616,9 +805,93 @@ class TTFont(object):
 		for glyphID in range(len(glyphOrder)):
 			d[glyphOrder[glyphID]] = glyphID
 
-	def _writeTable(self, tag, writer, done, tableCache=None):
+	def _compileTablesInParallel(self, tags, workers):
+		"""Internal helper function for self.save(). Return a dict mapping
+		tags to compiled table data for all the tables in 'tags', compiling
+		the loaded tables that no other table depends upon concurrently in
+		forked worker processes.
+		"""
+		dependencies = set()
+		for tag in tags:
+			dependencies.update(getTableClass(tag).dependencies)
+		parallelTags = [tag for tag in tags
+				if tag not in dependencies and self.isLoaded(tag)
+				and not self._isUnchanged(tag)]
+		# 'glyf' is needed by 'loca', 'maxp' and 'hhea': rather than
+		# compiling it whole, split its glyphs among the workers too
+		glyfChunks = []
+		if ('glyf' in tags and 'glyf' not in parallelTags and
+				self.isLoaded('glyf') and not self._isUnchanged('glyf')):
+			glyf = self['glyf']
+			if not hasattr(glyf, "glyphOrder"):
+				glyf.glyphOrder = self.getGlyphOrder()
+			glyphOrder = glyf.glyphOrder
+			size = max(1, -(-len(glyphOrder) // (workers * 2)))
+			glyfChunks = [glyphOrder[i:i + size]
+					for i in range(0, len(glyphOrder), size)]
+		if len(parallelTags) + len(glyfChunks) < 2:
+			return None
+		context = _getForkContext()
+		if context is None:
+			log.debug("can't fork worker processes; compiling tables serially")
+			return None
+
+		# The workers must not read from this font's reader: if it reads
+		# from a file, they would all share the same file offset. Load the
+		# tables the parallel ones depend upon now, so they are inherited.
+		pending = [masterTag for tag in parallelTags
+				for masterTag in getTableClass(tag).dependencies]
+		seen = set()
+		while pending:
+			masterTag = pending.pop()
+			if masterTag in seen or masterTag not in self:
+				continue
+			seen.add(masterTag)
+			self[masterTag]
+			pending.extend(getTableClass(masterTag).dependencies)
+
+		log.debug("compiling %s in %d worker processes",
+				", ".join("'%s'" % tag for tag in
+					parallelTags + (["glyf"] if glyfChunks else [])), workers)
+		pool = context.Pool(min(workers, len(parallelTags) + len(glyfChunks)),
+				initializer=_initCompileWorker, initargs=(self,))
+		try:
+			glyfResults = pool.map_async(
+				_compileGlyphsInWorker, glyfChunks, chunksize=1)
+			results = pool.map_async(
+				_compileTableInWorker, parallelTags, chunksize=1)
+			tableData = {}
+			if glyfChunks:
+				dataList = []
+				for glyphNames, (chunkData, bounds) in zip(
+						glyfChunks, glyfResults.get()):
+					dataList.extend(chunkData)
+					if bounds is None:
+						continue
+					# as compiling the glyphs here would have done
+					for glyphName, glyphBounds in zip(glyphNames, bounds):
+						if glyphBounds is not None:
+							glyph = glyf[glyphName]
+							glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax = glyphBounds
+				tableData['glyf'] = glyf.compileGlyphData_(self, dataList)
+			# Then compile all the other tables (e.g. 'loca' and 'head') in
+			# dependency order. The workers were forked before, and don't
+			# see the changes this makes to the tables the parallel ones
+			# depend upon; these are only read, e.g. the number of points
+			# of the glyphs by 'gvar'.
+			done = []
+			for tag in tags:
+				if tag not in parallelTags:
+					self._writeTable(tag, tableData, done, tableData=tableData)
+			tableData.update(zip(parallelTags, results.get()))
+		finally:
+			pool.terminate()
+		return tableData
+
+	def _writeTable(self, tag, writer, done, tableCache=None, tableData=None):
 		"""Internal helper function for self.save(). Keeps track of
-		inter-table dependencies.
+		inter-table dependencies. If given, 'tableData' maps tags to the
+		already compiled data of tables.
 		"""
 		if tag in done:
 			return
@@ -626,11 +899,23 @@ class TTFont(object):
 		for masterTable in tableClass.dependencies:
 			if masterTable not in done:
 				if masterTable in self:
-					self._writeTable(masterTable, writer, done, tableCache)
+					self._writeTable(masterTable, writer, done, tableCache, tableData)
 				else:
 					done.append(masterTable)
 		done.append(tag)
-		tabledata = self.getTableData(tag)
+		if (tag == 'glyf' and tableCache is None and
+				hasattr(writer, 'writeGlyfTable') and
+				self.isLoaded(tag) and not self._isUnchanged(tag) and
+				(tableData is None or tag not in tableData)):
+			# let the WOFF2 writer transform the glyphs we already have,
+			# rather than decompiling them again from the compiled table
+			log.debug("writing '%s' table to disk", tag)
+			writer.writeGlyfTable(self.tables[tag], self)
+			return
+		if tableData is not None and tag in tableData:
+			tabledata = tableData[tag]
+		else:
+			tabledata = self.getTableData(tag)
 		if tableCache is not None:
 			entry = tableCache.get((Tag(tag), tabledata))
 			if entry is not None:
@@ -646,16 +931,31 @@ class TTFont(object):
 		"""Returns raw table data, whether compiled or directly read from disk.
 		"""
 		tag = Tag(tag)
-		if self.isLoaded(tag):
+		if self.isLoaded(tag) and not self._isUnchanged(tag):
 			log.debug("compiling '%s' table", tag)
 			return self.tables[tag].compile(self)
 		elif self.reader and tag in self.reader:
 			log.debug("Reading '%s' table from disk", tag)
-			return self.reader[tag]
+			data = self.reader[tag]
+			if isinstance(data, memoryview):
+				data = data.tobytes()
+			return data
 		else:
 			raise KeyError(tag)
 
-	def getGlyphSet(self, preferCFF=True):
+	def _isUnchanged(self, tag):
+		"""Return true if the original data of a loaded table can be saved
+		as is, i.e. if it and all the loaded tables it depends on were
+		marked clean, or shared through the table cache.
+		"""
+		if tag not in self._cleanTables and tag not in self._sharedTables:
+			return False
+		for masterTable in getTableClass(tag).dependencies:
+			if self.isLoaded(masterTable) and not self._isUnchanged(masterTable):
+				return False
+		return True
+
+	def getGlyphSet(self, preferCFF=True, location=None, normalized=False):
 		"""Return a generic GlyphSet, which is a dict-like object
 		mapping glyph names to glyph objects. The returned glyph objects
 		have a .draw() method that supports the Pen protocol, and will
@@ -666,7 +966,19 @@ class TTFont(object):
 		If the font contains both a 'CFF '/'CFF2' and a 'glyf' table, you can use
 		the 'preferCFF' argument to specify which one should be taken. If the
 		font contains both a 'CFF ' and a 'CFF2' table, the latter is taken.
+
+		If 'location' is given, a dict mapping axis tags to user-space
+		coordinates (or normalized ones, if 'normalized' is True), the glyphs
+		of a TrueType variable font are returned as instanced at that location:
+		the 'gvar' deltas, and the 'HVAR' advance width deltas, are applied on
+		the fly to each glyph as it is accessed. The outlines are then always
+		taken from the 'glyf' table; vertical metrics are not varied.
 		"""
+		if location is not None:
+			if "glyf" not in self:
+				raise TTLibError("Only 'glyf' outlines can be drawn at a location")
+			return _TTVarGlyphSet(self, location, normalized)
+
 		glyphs = None
 		if (preferCFF and any(tb in self for tb in ["CFF ", "CFF2"]) or
 		   ("glyf" not in self and any(tb in self for tb in ["CFF ", "CFF2"]))):
@@ -694,6 +1006,131 @@ class TTFont(object):
 		return self["cmap"].getBestCmap(cmapPreferences=cmapPreferences)
 
 
+def _getForkContext():
+	"""Return a multiprocessing context that forks worker processes, or
+	None if forking is not available on this platform.
+	"""
+	import multiprocessing
+	try:
+		return multiprocessing.get_context("fork")
+	except AttributeError:
+		# Python 2: multiprocessing always forks on POSIX
+		return multiprocessing if os.name == "posix" else None
+	except ValueError:
+		return None
+
+
+# the font being saved, in worker processes forked by TTFont.save()
+_workerFont = None
+
+def _initCompileWorker(font):
+	global _workerFont
+	_workerFont = font
+
+def _compileTableInWorker(tag):
+	return _workerFont.getTableData(tag)
+
+def _compileGlyphsInWorker(glyphNames):
+	# return the compiled data of some of the 'glyf' glyphs, and their
+	# recalculated bounds, if any, to update the font being saved with
+	glyf = _workerFont['glyf']
+	dataList = glyf.compileGlyphs_(_workerFont, glyphNames)
+	if not _workerFont.recalcBBoxes:
+		return dataList, None
+	bounds = []
+	for glyphName in glyphNames:
+		glyph = glyf.glyphs[glyphName]
+		if glyph.numberOfContours == 0 or not hasattr(glyph, "xMin"):
+			bounds.append(None)
+		else:
+			bounds.append((glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax))
+	return dataList, bounds
+
+
+class _TableData(OrderedDict):
+	"""Stand-in for the SFNTReader of the fonts made by _FontSnapshot,
+	holding the binary data of their tables.
+	"""
+
+	def close(self):
+		pass
+
+
+class _FontSnapshot(object):
+	"""The binary data of all the tables of a TTFont, to make copies of the
+	font from without saving and reparsing it. Only the tables that were
+	loaded in the original font get compiled; the copies decompile their
+	tables on demand, and write the ones they never accessed back out as
+	they are.
+	"""
+
+	def __init__(self, font):
+		self.tables = _TableData()
+		for tag in font.keys():
+			if tag != "GlyphOrder":
+				self._addTable(font, tag)
+		self.sfntVersion = font.sfntVersion
+		self.flavor = font.flavor
+		self.flavorData = font.flavorData
+		self.recalcBBoxes = font.recalcBBoxes
+		self.recalcTimestamp = font.recalcTimestamp
+		self.lazy = font.lazy
+		self.glyphOrder = list(font.getGlyphOrder())
+
+	def _addTable(self, font, tag):
+		if tag in self.tables:
+			return
+		for masterTag in getTableClass(tag).dependencies:
+			if masterTag in font:
+				self._addTable(font, masterTag)
+		self.tables[tag] = font.getTableData(tag)
+
+	def newFont(self):
+		"""Return a new, independent TTFont copy of the font."""
+		font = TTFont(recalcBBoxes=self.recalcBBoxes,
+		              recalcTimestamp=self.recalcTimestamp, lazy=self.lazy)
+		font.sfntVersion = self.sfntVersion
+		font.flavor = self.flavor
+		font.flavorData = self.flavorData
+		# each copy gets its own mapping, as deleting a table from a font
+		# deletes it from its reader too
+		font.reader = _TableData(self.tables)
+		font.setGlyphOrder(list(self.glyphOrder))
+		return font
+
+	def close(self):
+		self.tables.clear()
+
+
+def _mapFile(file, closeStream):
+	"""Return a read-only memory map of the open 'file' object. The file
+	object is closed if 'closeStream' is true, as the mapping stays valid on
+	its own.
+	"""
+	if isinstance(file, mmap.mmap):
+		return file
+	try:
+		fileno = file.fileno()
+	except (AttributeError, IOError, ValueError):
+		raise TTLibError("Can't memory-map a file object without a fileno()")
+	mapped = _MappedFile(fileno, getattr(file, "name", None))
+	if closeStream:
+		file.close()
+	return mapped
+
+
+class _MappedFile(mmap.mmap):
+
+	"""A read-only memory map of a whole font file, which also remembers
+	the name of the file it was created from.
+	"""
+
+	def __new__(cls, fileno, name=None):
+		self = mmap.mmap.__new__(cls, fileno, 0, access=mmap.ACCESS_READ)
+		self.name = name
+		return self
+
+
 class _TTGlyphSet(object):
 
 	"""Generic dict-like GlyphSet class that pulls metrics from hmtx and
@@ -729,6 +1166,132 @@ class _TTGlyphSet(object):
 		except KeyError:
 			return default
 
+class _TTVarGlyphSet(_TTGlyphSet):
+
+	"""GlyphSet class for the 'glyf' outlines of a variable font at a given
+	location. A glyph's 'gvar' deltas are only applied when it is accessed,
+	and the instanced glyphs are cached.
+	"""
+
+	def __init__(self, ttFont, location, normalized=False):
+		from fontTools.misc.fixedTools import floatToFixedToFloat
+		from fontTools.varLib.models import normalizeLocation, piecewiseLinearMap
+		_TTGlyphSet.__init__(self, ttFont, ttFont['glyf'], _TTGlyphGlyf)
+		if not normalized:
+			axes = {a.axisTag: (a.minValue, a.defaultValue, a.maxValue)
+			        for a in ttFont['fvar'].axes}
+			location = normalizeLocation(location, axes)
+			if 'avar' in ttFont:
+				maps = ttFont['avar'].segments
+				location = {k: piecewiseLinearMap(v, maps[k])
+				            for k, v in location.items()}
+			# Quantize to F2Dot14, like varLib.mutator does.
+			location = {k: floatToFixedToFloat(v, 14) for k, v in location.items()}
+		self.location = location
+		self._gvar = ttFont['gvar'] if 'gvar' in ttFont else None
+		self._hvar = None
+		if 'HVAR' in ttFont:
+			from fontTools.varLib.varStore import VarStoreInstancer
+			self._hvar = ttFont['HVAR'].table
+			self._hvarInstancer = VarStoreInstancer(
+				self._hvar.VarStore, ttFont['fvar'].axes, location)
+			self._reverseGlyphMap = ttFont.getReverseGlyphMap()
+		self._scalars = {}
+		self._instances = {}
+
+	def __getitem__(self, glyphName):
+		try:
+			glyph, horizontalMetrics = self._instances[glyphName]
+		except KeyError:
+			glyph, horizontalMetrics = self._instantiateGlyph(glyphName)
+			self._instances[glyphName] = glyph, horizontalMetrics
+		verticalMetrics = self._vmtx[glyphName] if self._vmtx else None
+		return self._glyphType(self, glyph, horizontalMetrics, verticalMetrics)
+
+	def _getScalar(self, axes):
+		key = tuple(sorted(axes.items()))
+		scalar = self._scalars.get(key)
+		if scalar is None:
+			from fontTools.varLib.models import supportScalar
+			scalar = self._scalars[key] = supportScalar(self.location, axes)
+		return scalar
+
+	def _instantiateGlyph(self, glyphName):
+		from fontTools.misc.fixedTools import otRound
+		glyph = self._glyphs[glyphName]
+		width, lsb = self._hmtx[glyphName]
+		variations = []
+		if self._gvar is not None and glyphName in self._gvar.variations:
+			variations = [v for v in self._gvar.variations[glyphName]
+			              if self._getScalar(v.axes)]
+		if variations:
+			glyph, width, lsb = self._applyVariations(glyph, width, lsb, variations)
+		if self._hvar is not None:
+			# 'HVAR' takes precedence over the phantom points for advances
+			advWidthMap = self._hvar.AdvWidthMap
+			if advWidthMap is not None:
+				varIdx = advWidthMap.mapping[glyphName]
+			else:
+				varIdx = self._reverseGlyphMap[glyphName]
+			width = max(0, self._hmtx[glyphName][0] + otRound(self._hvarInstancer[varIdx]))
+		return glyph, (width, lsb)
+
+	def _applyVariations(self, glyph, width, lsb, variations):
+		"""Return a modified copy of 'glyph' with its 'gvar' deltas applied,
+		along with the new advance width and left side bearing.
+		"""
+		from fontTools.misc.fixedTools import otRound
+		from fontTools.pens.boundsPen import ControlBoundsPen
+		from fontTools.ttLib.tables._g_l_y_f import GlyphCoordinates
+		from fontTools.varLib.iup import iup_delta
+		glyfTable = self._glyphs
+		if glyph.isComposite():
+			coordinates = GlyphCoordinates(
+				[(getattr(c, 'x', 0), getattr(c, 'y', 0)) for c in glyph.components])
+			endPts = list(range(len(glyph.components)))
+		else:
+			coordinates, endPts, _ = glyph.getCoordinates(glyfTable)
+			coordinates = coordinates.copy()
+		# Add phantom points for (left, right, top, bottom) positions.
+		leftSideX = getattr(glyph, 'xMin', 0) - lsb
+		coordinates.extend([(leftSideX, 0), (leftSideX + width, 0),
+		                    (0, getattr(glyph, 'yMax', 0)),
+		                    (0, -getattr(glyph, 'yMin', 0))])
+		origCoords = None
+		for var in variations:
+			delta = var.coordinates
+			if None in delta:
+				if origCoords is None:
+					origCoords = coordinates.copy()
+				delta = iup_delta(delta, origCoords, endPts)
+			coordinates += GlyphCoordinates(delta) * self._getScalar(var.axes)
+
+		leftSideX, rightSideX = coordinates[-4][0], coordinates[-3][0]
+		width = max(0, otRound(rightSideX - leftSideX))
+		for _ in range(4):
+			del coordinates[-1]
+		# Work on a shallow copy, the glyph in the 'glyf' table stays as is.
+		glyph = copy.copy(glyph)
+		if glyph.isComposite():
+			glyph.components = [copy.copy(c) for c in glyph.components]
+			for (x, y), component in zip(coordinates, glyph.components):
+				if hasattr(component, 'x'):
+					component.x, component.y = otRound(x), otRound(y)
+			# the bounds depend on the instanced components
+			boundsPen = ControlBoundsPen(self)
+			glyph.draw(boundsPen, glyfTable)
+			xMin = otRound(boundsPen.bounds[0]) if boundsPen.bounds else 0
+		elif glyph.numberOfContours > 0:
+			coordinates.toInt()
+			glyph.coordinates = coordinates
+			glyph.recalcBounds(glyfTable)
+			xMin = glyph.xMin
+		else:
+			xMin = 0
+		lsb = otRound(xMin - leftSideX)
+		return glyph, width, lsb
+
+
 class _TTGlyph(object):
 
 	"""Wrapper for a TrueType glyph that supports the Pen protocol, meaning
@@ -978,14 +1541,16 @@ def sortedTagList(tagList, tableOrder=None):
 	return orderedTables
 
 
-def reorderFontTables(inFile, outFile, tableOrder=None, checkChecksums=False):
+def reorderFontTables(inFile, outFile, tableOrder=None, checkChecksums=False,
+		compression=None):
 	"""Rewrite a font file, ordering the tables as recommended by the
 	OpenType specification 1.4.
 	"""
 	inFile.seek(0)
 	outFile.seek(0)
 	reader = SFNTReader(inFile, checkChecksums=checkChecksums)
-	writer = SFNTWriter(outFile, len(reader.tables), reader.sfntVersion, reader.flavor, reader.flavorData)
+	writer = SFNTWriter(outFile, len(reader.tables), reader.sfntVersion, reader.flavor,
+		reader.flavorData, compression=compression)
 	tables = list(reader.keys())
 	for tag in sortedTagList(tables, tableOrder):
 		writer[tag] = reader[tag]
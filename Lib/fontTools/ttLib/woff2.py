@@ -11,8 +11,12 @@ from fontTools.ttLib import (TTFont, TTLibError, getTableModule, getTableClass,
 	getSearchRange)
 from fontTools.ttLib.sfnt import (SFNTReader, SFNTWriter, DirectoryEntry,
 	WOFFFlavorData, sfntDirectoryFormat, sfntDirectorySize, SFNTDirectoryEntry,
-	sfntDirectoryEntrySize, calcChecksum)
+	sfntDirectoryEntrySize, calcChecksum, getMappedBuffer,
+	_getCompressionOptions)
 from fontTools.ttLib.tables import ttProgram
+from fontTools.ttLib.tables._g_l_y_f import (LazyGlyphs, ARG_1_AND_2_ARE_WORDS,
+	WE_HAVE_A_SCALE, WE_HAVE_AN_X_AND_Y_SCALE, WE_HAVE_A_TWO_BY_TWO,
+	MORE_COMPONENTS, WE_HAVE_INSTRUCTIONS)
 import logging
 
 
@@ -26,6 +30,13 @@ except ImportError:
 	pass
 
 
+# Optional process-wide cache of decompressed WOFF2 font data, shared by all
+# the WOFF2Reader objects. Set it to a fontTools.ttLib.TableCache to avoid
+# decompressing the same font data more than once; entries are keyed by a
+# digest of the compressed data.
+decompressionCache = None
+
+
 class WOFF2Reader(SFNTReader):
 
 	flavor = "woff2"
@@ -62,12 +73,27 @@ class WOFF2Reader(SFNTReader):
 
 		totalUncompressedSize = offset
 		compressedData = self.file.read(self.totalCompressedSize)
-		decompressedData = brotli.decompress(compressedData)
+		cache = decompressionCache
+		decompressedData = None
+		if cache is not None:
+			cacheKey = cache.makeKey("wOF2", compressedData)
+			decompressedData = cache.get(cacheKey)
+		cached = decompressedData is not None
+		if not cached:
+			decompressedData = brotli.decompress(compressedData)
 		if len(decompressedData) != totalUncompressedSize:
 			raise TTLibError(
 				'unexpected size for decompressed font data: expected %d, found %d'
 				% (totalUncompressedSize, len(decompressedData)))
+		if cache is not None and not cached:
+			cache[cacheKey] = decompressedData
 		self.transformBuffer = BytesIO(decompressedData)
+		# when reading from a memory-mapped file, hand out the untransformed
+		# tables as slices of the decompressed data instead of copies
+		if getMappedBuffer(file) is not None:
+			self.buffer = memoryview(decompressedData)
+		else:
+			self.buffer = None
 
 		self.file.seek(0, 2)
 		if self.length != self.file.tell():
@@ -84,10 +110,25 @@ class WOFF2Reader(SFNTReader):
 		if not hasattr(entry, 'data'):
 			if tag in woff2TransformedTableTags:
 				entry.data = self.reconstructTable(tag)
+			elif self.buffer is not None:
+				entry.data = entry.loadDataFromBuffer(self.buffer)
 			else:
 				entry.data = entry.loadData(self.transformBuffer)
 		return entry.data
 
+	def getLazyTable(self, tag, ttFont):
+		"""Return a 'glyf' table for ttFont whose glyphs are decoded from the
+		transformed data as they are accessed, instead of reconstructing the
+		whole table upfront. Return None for other tables, or if the 'glyf'
+		table data was already reconstructed.
+		"""
+		if tag != 'glyf' or hasattr(self.tables['glyf'], 'data'):
+			return None
+		glyfTable = WOFF2GlyfTable()
+		glyfTable.reconstruct(
+			self.tables['glyf'].loadData(self.transformBuffer), ttFont, lazy=True)
+		return glyfTable
+
 	def reconstructTable(self, tag):
 		"""Reconstruct table named 'tag' from transformed data."""
 		if tag not in woff2TransformedTableTags:
@@ -136,7 +177,7 @@ class WOFF2Writer(SFNTWriter):
 	flavor = "woff2"
 
 	def __init__(self, file, numTables, sfntVersion="\000\001\000\000",
-		         flavor=None, flavorData=None):
+		         flavor=None, flavorData=None, compression=None):
 		if not haveBrotli:
 			log.error(
 				'The WOFF2 encoder requires the Brotli Python extension, available at: '
@@ -147,6 +188,7 @@ class WOFF2Writer(SFNTWriter):
 		self.numTables = numTables
 		self.sfntVersion = Tag(sfntVersion)
 		self.flavorData = flavorData or WOFF2FlavorData()
+		self.compression = _getCompressionOptions(compression, flavorData)
 
 		self.directoryFormat = woff2DirectoryFormat
 		self.directorySize = woff2DirectorySize
@@ -162,6 +204,9 @@ class WOFF2Writer(SFNTWriter):
 		# make empty TTFont to store data while normalising and transforming tables
 		self.ttFont = TTFont(recalcBBoxes=False, recalcTimestamp=False)
 
+		# in-memory 'glyf' table given to writeGlyfTable(), if any
+		self.glyfTable = None
+
 	def __setitem__(self, tag, data):
 		"""Associate new entry named 'tag' with raw table data."""
 		if tag in self.tables:
@@ -180,6 +225,24 @@ class WOFF2Writer(SFNTWriter):
 
 		self.tables[tag] = entry
 
+	def writeGlyfTable(self, glyfTable, ttFont):
+		"""Compile the 'glyf' table of ttFont with the 4-byte aligned glyph
+		offsets WOFF2 needs, and keep hold of its glyphs, so that close() can
+		transform them as they are instead of decompiling the table data
+		again. ttFont's 'loca' table must be compiled after this one.
+		"""
+		hasPadding = 'padding' in glyfTable.__dict__
+		padding = glyfTable.padding
+		glyfTable.padding = 4
+		try:
+			self['glyf'] = glyfTable.compile(ttFont)
+		finally:
+			if hasPadding:
+				glyfTable.padding = padding
+			else:
+				del glyfTable.padding
+		self.glyfTable = glyfTable
+
 	def close(self):
 		""" All tags must have been specified. Now write the table data and directory.
 		"""
@@ -199,7 +262,7 @@ class WOFF2Writer(SFNTWriter):
 		# See:
 		# https://github.com/khaledhosny/ots/issues/60
 		# https://github.com/google/woff2/issues/15
-		if isTrueType:
+		if isTrueType and self.glyfTable is None:
 			self._normaliseGlyfAndLoca(padding=4)
 		self._setHeadTransformFlag()
 
@@ -213,8 +276,7 @@ class WOFF2Writer(SFNTWriter):
 
 		self.totalSfntSize = self._calcSFNTChecksumsLengthsAndOffsets()
 
-		fontData = self._transformTables()
-		compressedFont = brotli.compress(fontData, mode=brotli.MODE_FONT)
+		compressedFont = self._transformAndCompressTables()
 
 		self.totalCompressedSize = len(compressedFont)
 		self.length = self._calcTotalSize()
@@ -305,12 +367,56 @@ class WOFF2Writer(SFNTWriter):
 		fontData = self.transformBuffer.getvalue()
 		return fontData
 
+	def _transformAndCompressTables(self):
+		"""Return the compressed transformed font data. The tables are fed
+		to the compressor one at a time, as they get transformed, when the
+		brotli module supports streaming.
+		"""
+		compressor = self.compression.brotliCompressor(brotli.MODE_FONT)
+		if compressor is None:
+			return self.compression.compressBrotli(
+				self._transformTables(), brotli.MODE_FONT)
+
+		# the checksum adjustment only depends on the original table
+		# checksums, so it can be patched into 'head' before compressing
+		head = self.tables['head']
+		head.data = (head.data[:8] +
+			struct.pack(">L", self._calcMasterChecksum()) + head.data[12:])
+
+		compressed = []
+		for tag, entry in self.tables.items():
+			if tag in woff2TransformedTableTags:
+				data = self.transformTable(tag)
+			else:
+				data = entry.data
+			entry.offset = self.nextTableOffset
+			entry.length = len(data)
+			self.nextTableOffset += entry.length
+			compressed.append(compressor.process(data))
+		compressed.append(compressor.finish())
+		return bytesjoin(compressed)
+
 	def transformTable(self, tag):
 		"""Return transformed table data."""
 		if tag not in woff2TransformedTableTags:
 			raise TTLibError("Transform for table '%s' is unknown" % tag)
 		if tag == "loca":
 			data = b""
+		elif tag == "glyf" and self.glyfTable is not None:
+			self._decompileTable('head')
+			glyfTable = WOFF2GlyfTable()
+			glyfTable.glyphOrder = self.glyfTable.glyphOrder
+			glyfTable.glyphs = glyphs = {}
+			Glyph = getTableModule('glyf').Glyph
+			for glyphName in glyfTable.glyphOrder:
+				glyph = self.glyfTable.glyphs[glyphName]
+				# glyphs that were never expanded, or whose coordinates got
+				# rounded upon compiling, are transformed from their data
+				if hasattr(glyph, "data") or (glyph.numberOfContours > 0 and
+						glyph.coordinates.isFloat()):
+					glyph = Glyph(glyph.compile(self.glyfTable, recalcBBoxes=False))
+				glyphs[glyphName] = glyph
+			data = glyfTable.transform(self.ttFont)
 		elif tag == "glyf":
 			for tag in ('maxp', 'head', 'loca', 'glyf'):
 				self._decompileTable(tag)
@@ -371,8 +477,8 @@ class WOFF2Writer(SFNTWriter):
 		if data.metaData:
 			self.metaOrigLength = len(data.metaData)
 			self.metaOffset = offset
-			self.compressedMetaData = brotli.compress(
-				data.metaData, mode=brotli.MODE_TEXT)
+			self.compressedMetaData = self.compression.compressBrotli(
+				data.metaData, brotli.MODE_TEXT)
 			self.metaLength = len(self.compressedMetaData)
 			offset += self.metaLength
 		else:
@@ -600,8 +706,10 @@ class WOFF2GlyfTable(getTableClass('glyf')):
 	def __init__(self, tag=None):
 		self.tableTag = Tag(tag or 'glyf')
 
-	def reconstruct(self, data, ttFont):
-		""" Decompile transformed 'glyf' data. """
+	def reconstruct(self, data, ttFont, lazy=False):
+		""" Decompile transformed 'glyf' data. If 'lazy' is True, the glyphs
+		are only decoded when they are first accessed.
+		"""
 		inputDataSize = len(data)
 
 		if inputDataSize < woff2GlyfTableFormatSize:
@@ -629,7 +737,7 @@ class WOFF2GlyfTable(getTableClass('glyf')):
 		if sys.byteorder != "big": self.nContourStream.byteswap()
 		assert len(self.nContourStream) == self.numGlyphs
 
-		if 'head' in ttFont:
+		if not lazy and 'head' in ttFont:
 			ttFont['head'].indexToLocFormat = self.indexFormat
 		try:
 			self.glyphOrder = ttFont.getGlyphOrder()
@@ -644,10 +752,66 @@ class WOFF2GlyfTable(getTableClass('glyf')):
 					"incorrect glyphOrder: expected %d glyphs, found %d" %
 					(len(self.glyphOrder), self.numGlyphs))
 
-		glyphs = self.glyphs = {}
-		for glyphID, glyphName in enumerate(self.glyphOrder):
-			glyph = self._decodeGlyph(glyphID)
-			glyphs[glyphName] = glyph
+		self._indexGlyphs()
+		if lazy:
+			self.glyphs = WOFF2LazyGlyphs(self)
+		else:
+			glyphs = self.glyphs = {}
+			for glyphID, glyphName in enumerate(self.glyphOrder):
+				glyph = self._decodeGlyph(glyphID)
+				glyphs[glyphName] = glyph
+
+	# the sub-streams that the data of a glyph is spread across, after the
+	# 'nContourStream' which has one entry per glyph
+	glyphSubStreams = subStreams[1:]
+
+	def _indexGlyphs(self):
+		""" Record where the data of each glyph starts in each of the
+		sub-streams, without decoding it, so that glyphs can be decoded
+		independently of each other.
+		"""
+		nPointsStream = bytearray(self.nPointsStream)
+		flagStream = bytearray(self.flagStream)
+		glyphStream = bytearray(self.glyphStream)
+		compositeStream = bytearray(self.compositeStream)
+		bboxBitmap = self.bboxBitmap
+
+		nPointsPos = flagPos = glyphPos = compositePos = bboxPos = instructionPos = 0
+		offsets = self._glyphOffsets = []
+		for glyphID in range(self.numGlyphs):
+			offsets.append((nPointsPos, flagPos, glyphPos, compositePos, bboxPos,
+				instructionPos))
+			numberOfContours = self.nContourStream[glyphID]
+			if numberOfContours == 0:
+				continue
+			haveInstructions = True
+			if numberOfContours > 0:
+				nPoints = 0
+				for i in range(numberOfContours):
+					ptsOfContour, nPointsPos = _read255UShort(nPointsStream, nPointsPos)
+					nPoints += ptsOfContour
+				glyphPos += sum(flagStream[flagPos:flagPos+nPoints].translate(
+					_tripletSizes))
+				flagPos += nPoints
+			else:
+				haveInstructions = False
+				more = True
+				while more:
+					if compositePos + 2 > len(compositeStream):
+						raise TTLibError("not enough 'compositeStream' data")
+					flags = (compositeStream[compositePos] << 8) | compositeStream[compositePos+1]
+					compositePos += _componentSize(flags)
+					more = flags & MORE_COMPONENTS
+					haveInstructions = haveInstructions or flags & WE_HAVE_INSTRUCTIONS
+			if haveInstructions:
+				instructionLength, glyphPos = _read255UShort(glyphStream, glyphPos)
+				instructionPos += instructionLength
+			if bboxBitmap[glyphID >> 3] & (0x80 >> (glyphID & 7)):
+				bboxPos += 8
+		offsets.append((nPointsPos, flagPos, glyphPos, compositePos, bboxPos,
+			instructionPos))
+
+		self._glyphStreamData = [getattr(self, s) for s in self.glyphSubStreams]
 
 	def transform(self, ttFont):
 		""" Return transformed 'glyf' data """
@@ -669,15 +833,19 @@ class WOFF2GlyfTable(getTableClass('glyf')):
 			ttFont['maxp'].numGlyphs = self.numGlyphs
 		self.indexFormat = ttFont['head'].indexToLocFormat
 
+		# accumulate the streams in mutable buffers, as repeatedly
+		# concatenating immutable bytes is quadratic in the glyph count
 		for stream in self.subStreams:
-			setattr(self, stream, b"")
+			setattr(self, stream, bytearray())
 		bboxBitmapSize = ((self.numGlyphs + 31) >> 5) << 2
 		self.bboxBitmap = array.array('B', [0]*bboxBitmapSize)
 
 		for glyphID in range(self.numGlyphs):
 			self._encodeGlyph(glyphID)
 
-		self.bboxStream = self.bboxBitmap.tostring() + self.bboxStream
+		self.bboxStream = self.bboxBitmap.tostring() + bytes(self.bboxStream)
+		for stream in self.subStreams:
+			setattr(self, stream, bytes(getattr(self, stream)))
 		for stream in self.subStreams:
 			setattr(self, stream + 'Size', len(getattr(self, stream)))
 		self.version = 0
@@ -686,6 +854,12 @@ class WOFF2GlyfTable(getTableClass('glyf')):
 		return data
 
 	def _decodeGlyph(self, glyphID):
+		# point the sub-streams to the data of this glyph only
+		starts = self._glyphOffsets[glyphID]
+		ends = self._glyphOffsets[glyphID + 1]
+		for stream, data, start, end in zip(
+				self.glyphSubStreams, self._glyphStreamData, starts, ends):
+			setattr(self, stream, data[start:end])
 		glyph = getTableModule('glyf').Glyph()
 		glyph.numberOfContours = self.nContourStream[glyphID]
 		if glyph.numberOfContours == 0:
@@ -909,6 +1083,69 @@ class WOFF2GlyfTable(getTableClass('glyf')):
 		self.glyphStream += triplets.tostring()
 
 
+class WOFF2LazyGlyphs(LazyGlyphs):
+
+	"""LazyGlyphs mapping for a WOFF2GlyfTable reconstructed with lazy=True:
+	a glyph is decoded from the transformed 'glyf' sub-streams the first
+	time it is accessed.
+	"""
+
+	def __init__(self, glyfTable):
+		LazyGlyphs.__init__(self, None, None, glyfTable.glyphOrder)
+		self._glyfTable = glyfTable
+
+	def __getitem__(self, glyphName):
+		try:
+			return self._glyphs[glyphName]
+		except KeyError:
+			pass
+		glyph = self._glyfTable._decodeGlyph(self._indices[glyphName])
+		self._glyphs[glyphName] = glyph
+		return glyph
+
+	def getRawGlyphData(self, glyphName):
+		# there is no untransformed glyph data to copy: the glyphs must be
+		# decoded and compiled
+		return None
+
+
+# number of bytes in 'glyphStream' taken by the coordinates of a point,
+# indexed by its byte in 'flagStream'
+_tripletSizes = bytes(bytearray(
+	(1 if f < 84 else 2 if f < 120 else 3 if f < 124 else 4)
+	for f in [flag & 0x7f for flag in range(256)]))
+
+
+def _componentSize(flags):
+	""" Return the size of a composite glyph component with the given flags. """
+	size = 8 if flags & ARG_1_AND_2_ARE_WORDS else 6
+	if flags & WE_HAVE_A_SCALE:
+		size += 2
+	elif flags & WE_HAVE_AN_X_AND_Y_SCALE:
+		size += 4
+	elif flags & WE_HAVE_A_TWO_BY_TWO:
+		size += 8
+	return size
+
+
+def _read255UShort(data, pos):
+	""" Read a 255UInt16-encoded number at 'pos' in the bytearray 'data', and
+	return it along with the position following it.
+	"""
+	try:
+		code = data[pos]
+		if code == 253:
+			return (data[pos+1] << 8) | data[pos+2], pos + 3
+		elif code == 254:
+			return data[pos+1] + 506, pos + 2
+		elif code == 255:
+			return data[pos+1] + 253, pos + 2
+		else:
+			return code, pos + 1
+	except IndexError:
+		raise TTLibError('not enough data to unpack 255UInt16')
+
+
 class WOFF2FlavorData(WOFFFlavorData):
 
 	Flavor = 'woff2'
@@ -920,6 +1157,7 @@ class WOFF2FlavorData(WOFFFlavorData):
 		self.minorVersion = None
 		self.metaData = None
 		self.privData = None
+		self.compression = None
 		if reader:
 			self.majorVersion = reader.majorVersion
 			self.minorVersion = reader.minorVersion
@@ -39,6 +39,8 @@ from fontTools.varLib.featureVars import addFeatureVariations
 from fontTools.designspaceLib import DesignSpaceDocument, AxisDescriptor
 from collections import OrderedDict, namedtuple
 import os.path
+import hashlib
+import json
 import logging
 from pprint import pformat
 
@@ -280,7 +282,8 @@ def _SetCoordinates(font, glyphName, coord):
 	# XXX Handle vertical
 	font["hmtx"].metrics[glyphName] = horizontalAdvanceWidth, leftSideBearing
 
-def _add_gvar(font, model, master_ttfs, tolerance=0.5, optimize=True):
+def _add_gvar(font, model, master_ttfs, tolerance=0.5, optimize=True,
+              workers=None, iup_cache=None):
 
 	assert tolerance >= 0
 
@@ -291,6 +294,7 @@ def _add_gvar(font, model, master_ttfs, tolerance=0.5, optimize=True):
 	gvar.reserved = 0
 	gvar.variations = {}
 
+	glyphs = []
 	for glyph in font.getGlyphOrder():
 
 		allData = [_GetCoordinates(m, glyph) for m in master_ttfs]
@@ -302,37 +306,181 @@ def _add_gvar(font, model, master_ttfs, tolerance=0.5, optimize=True):
 			continue
 		del allControls
 
-		# Update gvar
-		gvar.variations[glyph] = []
-		deltas = model.getDeltas(allCoords)
-		supports = model.supports
-		assert len(deltas) == len(supports)
-
-		# Prepare for IUP optimization
-		origCoords = deltas[0]
 		endPts = control[1] if control[0] >= 1 else list(range(len(control[1])))
-
-		for i,(delta,support) in enumerate(zip(deltas[1:], supports[1:])):
-			if all(abs(v) <= tolerance for v in delta.array):
+		glyphs.append((glyph, allCoords, endPts))
+
+	if iup_cache is not None and not isinstance(iup_cache, GlyphVariationsCache):
+		iup_cache = GlyphVariationsCache(iup_cache)
+
+	results = {}
+	keys = {}
+	todo = []
+	for glyph, allCoords, endPts in glyphs:
+		if iup_cache is not None:
+			key = keys[glyph] = iup_cache.key(
+				model, allCoords, endPts, tolerance, optimize)
+			result = iup_cache.get(key)
+			if result is not None:
+				results[glyph] = result
 				continue
-			var = TupleVariation(support, delta)
-			if optimize:
-				delta_opt = iup_delta_optimize(delta, origCoords, endPts, tolerance=tolerance)
+		todo.append((glyph, allCoords, endPts))
+	if iup_cache is not None:
+		log.info("Reusing cached variations of %d out of %d glyphs",
+		         len(results), len(glyphs))
+
+	for glyph, result in zip(
+			(g for g, _, _ in todo),
+			_compute_gvar_variations(
+				[(c, e) for _, c, e in todo], model, tolerance, optimize, workers)):
+		results[glyph] = result
+		if iup_cache is not None:
+			iup_cache.set(keys[glyph], result)
+
+	supports = model.supports
+	for glyph, _, _ in glyphs:
+		gvar.variations[glyph] = [
+			TupleVariation(supports[i], coordinates)
+			for i, coordinates in results[glyph]]
+
+def _compute_gvar_variations(work, model, tolerance, optimize, workers=None):
+	"""Return a list of the gvar variations of each (allCoords, endPts)
+	item in 'work', as computed by _compute_glyph_variations().
+
+	If 'workers' is greater than 1, the glyphs are processed in a pool of
+	that many forked worker processes.
+	"""
+	if workers is not None and workers > 1 and len(work) > 1:
+		from fontTools.ttLib.ttFont import _getForkContext
+		context = _getForkContext()
+		if context is not None:
+			log.info("Computing variations of %d glyphs in %d worker processes",
+			         len(work), workers)
+			pool = context.Pool(workers, initializer=_init_gvar_worker,
+			                    initargs=(model, tolerance, optimize))
+			try:
+				chunksize = max(1, len(work) // (workers * 4))
+				return pool.map(_compute_gvar_in_worker, work, chunksize=chunksize)
+			finally:
+				pool.terminate()
+		log.debug("can't fork worker processes; computing variations serially")
+	return [_compute_glyph_variations(allCoords, endPts, model, tolerance, optimize)
+	        for allCoords, endPts in work]
+
+def _compute_glyph_variations(allCoords, endPts, model, tolerance=0.5, optimize=True):
+	"""Return the gvar variations of a glyph, given the coordinates of
+	the glyph in all masters, as a list of (supportIndex, coordinates)
+	tuples, where supportIndex indexes into model.supports.
+	"""
+	deltas = model.getDeltas(allCoords)
+	supports = model.supports
+	assert len(deltas) == len(supports)
+
+	# Prepare for IUP optimization
+	origCoords = deltas[0]
+
+	result = []
+	for i,(delta,support) in enumerate(zip(deltas[1:], supports[1:])):
+		if all(abs(v) <= tolerance for v in delta.array):
+			continue
+		var = TupleVariation(support, delta)
+		if optimize:
+			delta_opt = iup_delta_optimize(delta, origCoords, endPts, tolerance=tolerance, fast=True)
+
+			if None in delta_opt:
+				# Use "optimized" version only if smaller...
+				var_opt = TupleVariation(support, delta_opt)
+
+				axis_tags = sorted(support.keys()) # Shouldn't matter that this is different from fvar...?
+				tupleData, auxData, _ = var.compile(axis_tags, [], None)
+				unoptimized_len = len(tupleData) + len(auxData)
+				tupleData, auxData, _ = var_opt.compile(axis_tags, [], None)
+				optimized_len = len(tupleData) + len(auxData)
+
+				if optimized_len < unoptimized_len:
+					var = var_opt
 
-				if None in delta_opt:
-					# Use "optimized" version only if smaller...
-					var_opt = TupleVariation(support, delta_opt)
+		result.append((i + 1, var.coordinates))
+	return result
 
-					axis_tags = sorted(support.keys()) # Shouldn't matter that this is different from fvar...?
-					tupleData, auxData, _ = var.compile(axis_tags, [], None)
-					unoptimized_len = len(tupleData) + len(auxData)
-					tupleData, auxData, _ = var_opt.compile(axis_tags, [], None)
-					optimized_len = len(tupleData) + len(auxData)
+# the gvar build parameters, in worker processes forked by _add_gvar()
+_gvar_worker_args = None
 
-					if optimized_len < unoptimized_len:
-						var = var_opt
+def _init_gvar_worker(model, tolerance, optimize):
+	global _gvar_worker_args
+	_gvar_worker_args = (model, tolerance, optimize)
 
-			gvar.variations[glyph].append(var)
+def _compute_gvar_in_worker(item):
+	allCoords, endPts = item
+	return _compute_glyph_variations(allCoords, endPts, *_gvar_worker_args)
+
+
+class GlyphVariationsCache(object):
+	"""On-disk cache of the gvar variations computed for glyphs by build().
+
+	Entries are content-addressed: the key of a glyph is a digest of its
+	coordinates in all masters, its contour end points, the variation
+	model, and the IUP tolerance and optimize settings. Rebuilding a font
+	after editing some glyphs then only recomputes the variations of those
+	glyphs. Each entry is a small JSON file stored under 'path', which is
+	created if needed. Stale entries are never removed; delete the
+	directory to clear the cache.
+	"""
+
+	def __init__(self, path):
+		self.path = path
+		self._model = None
+		self._modelDigest = None
+
+	def _getModelDigest(self, model):
+		if model is not self._model:
+			data = json.dumps(
+				[model.locations, model.mapping,
+				 [sorted(s.items()) for s in model.supports]],
+				sort_keys=True)
+			self._modelDigest = hashlib.sha256(tobytes(data)).hexdigest()
+			self._model = model
+		return self._modelDigest
+
+	def key(self, model, allCoords, endPts, tolerance, optimize):
+		data = json.dumps(
+			[self._getModelDigest(model), list(endPts), tolerance, bool(optimize),
+			 [None if c is None else c.array.tolist() for c in allCoords]])
+		return hashlib.sha256(tobytes(data)).hexdigest()
+
+	def _entryPath(self, key):
+		return os.path.join(self.path, key[:2], key[2:] + ".json")
+
+	def get(self, key):
+		"""Return the cached variations for 'key' as a list of
+		(supportIndex, coordinates) tuples, or None if not in the cache.
+		"""
+		try:
+			with open(self._entryPath(key), "r") as f:
+				data = json.load(f)
+		except (IOError, OSError, ValueError):
+			return None
+		return [(i, [None if d is None else tuple(d) for d in coordinates])
+		        for i, coordinates in data]
+
+	def set(self, key, variations):
+		path = self._entryPath(key)
+		dirname = os.path.dirname(path)
+		if not os.path.isdir(dirname):
+			try:
+				os.makedirs(dirname)
+			except OSError:
+				if not os.path.isdir(dirname):
+					raise
+		# write to a temporary file first, so that concurrent builds
+		# sharing the cache never see partially written entries
+		tmp = "%s.%d.tmp" % (path, os.getpid())
+		with open(tmp, "w") as f:
+			json.dump(variations, f, separators=(",", ":"))
+		try:
+			os.rename(tmp, path)
+		except OSError:
+			# on Windows, rename fails if the destination exists
+			os.remove(tmp)
 
 def _remove_TTHinting(font):
 	for tag in ("cvar", "cvt ", "fpgm", "prep"):
@@ -424,21 +572,19 @@ def _add_HVAR(font, model, master_ttfs, axisTags):
 
 	log.info("Generating HVAR")
 
-	hAdvanceDeltas = {}
+	glyphOrder = font.getGlyphOrder()
 	metricses = [m["hmtx"].metrics for m in master_ttfs]
-	for glyph in font.getGlyphOrder():
-		hAdvances = [metrics[glyph][0] for metrics in metricses]
-		# TODO move round somewhere else?
-		hAdvanceDeltas[glyph] = tuple(otRound(d) for d in model.getDeltas(hAdvances)[1:])
+	# Compute the deltas of all glyph advances at once
+	hAdvances = [[metrics[glyph][0] for glyph in glyphOrder] for metrics in metricses]
+	# TODO move round somewhere else?
+	deltas = [[otRound(d) for d in delta] for delta in model.getDeltasBatch(hAdvances)[1:]]
 
 	# Direct mapping
 	supports = model.supports[1:]
 	varTupleList = builder.buildVarRegionList(supports, axisTags)
 	varTupleIndexes = list(range(len(supports)))
 	n = len(supports)
-	items = []
-	for glyphName in font.getGlyphOrder():
-		items.append(hAdvanceDeltas[glyphName])
+	items = [tuple(delta[i] for delta in deltas) for i in range(len(glyphOrder))]
 
 	# Build indirect mapping to save on duplicates, compare both sizes
 	uniq = list(set(items))
@@ -704,13 +850,22 @@ def load_designspace(designspace_filename):
 	)
 
 
-def build(designspace_filename, master_finder=lambda s:s, exclude=[], optimize=True):
+def build(designspace_filename, master_finder=lambda s:s, exclude=[], optimize=True,
+          workers=None, iup_cache=None):
 	"""
 	Build variation font from a designspace file.
 
 	If master_finder is set, it should be a callable that takes master
 	filename as found in designspace file and map it to master font
 	binary as to be opened (eg. .ttf or .otf).
+
+	If workers is greater than 1, the gvar variations of the glyphs are
+	computed in a pool of that many worker processes.
+
+	If iup_cache is set, it should be the path of a directory (or a
+	GlyphVariationsCache object) where the gvar variations computed for
+	each glyph are cached; subsequent builds only recompute the variations
+	of the glyphs whose outlines, or whose variation model, changed.
 	"""
 
 	ds = load_designspace(designspace_filename)
@@ -749,7 +904,8 @@ def build(designspace_filename, master_finder=lambda s:s, exclude=[], optimize=T
 	if 'GDEF' not in exclude or 'GPOS' not in exclude:
 		_merge_OTL(vf, model, master_fonts, axisTags)
 	if 'gvar' not in exclude and 'glyf' in vf:
-		_add_gvar(vf, model, master_fonts, optimize=optimize)
+		_add_gvar(vf, model, master_fonts, optimize=optimize,
+		          workers=workers, iup_cache=iup_cache)
 	if 'cvar' not in exclude and 'glyf' in vf:
 		_merge_TTHinting(vf, model, master_fonts)
 	if 'GSUB' not in exclude and ds.rules:
@@ -808,6 +964,23 @@ def main(args=None):
 		action='store_false',
 		help='do not perform IUP optimization'
 	)
+	parser.add_argument(
+		'-j',
+		'--workers',
+		metavar='N',
+		type=int,
+		default=None,
+		help='compute glyph variations in N worker processes'
+	)
+	parser.add_argument(
+		'--iup-cache',
+		metavar='DIR',
+		default=None,
+		help=(
+			'directory where to cache the variations computed for '
+			'each glyph, to speed up subsequent builds'
+		)
+	)
 	parser.add_argument(
 		'--master-finder',
 		default='master_ttf_interpolatable/{stem}.ttf',
@@ -838,7 +1011,9 @@ def main(args=None):
 		designspace_filename,
 		finder,
 		exclude=options.exclude,
-		optimize=options.optimize
+		optimize=options.optimize,
+		workers=options.workers,
+		iup_cache=options.iup_cache,
 	)
 
 	log.info("Saving variation font %s", outfile)
@@ -100,6 +100,72 @@ def can_iup_in_between(deltas, coords, i, j, tolerance):
 
 	return all(abs(complex(x-p, y-q)) <= tolerance for (x,y),(p,q) in zip(deltas, interp))
 
+def _can_iup_in_between_func(deltas, coords, tolerance):
+	"""Return a function (i, j) -> bool that is a faster drop-in replacement
+	for can_iup_in_between(deltas, coords, i, j, tolerance).
+
+	The X and Y components of deltas and coords are split into flat lists once
+	per contour, and each segment is checked point by point without building
+	any intermediate lists, bailing out at the first point that can't be
+	interpolated.  The arithmetic is the same as in iup_segment(), so results
+	are identical.
+	"""
+	dx = [d[0] for d in deltas]
+	dy = [d[1] for d in deltas]
+	cx = [c[0] for c in coords]
+	cy = [c[1] for c in coords]
+
+	def segment(cs, ds, i, j):
+		# Return (x1, x2, d1, d2, scale) as iup_segment() computes them,
+		# with scale set to None when x1 == x2.
+		x1, x2, d1, d2 = cs[i], cs[j], ds[i], ds[j]
+		if x1 == x2:
+			return x1, x2, (d1 if d1 == d2 else 0), None, None
+		if x1 > x2:
+			x1, x2 = x2, x1
+			d1, d2 = d2, d1
+		return x1, x2, d1, d2, (d2 - d1) / (x2 - x1)
+
+	def can_iup(i, j):
+		assert j - i >= 2
+		x1, x2, xd1, xd2, xscale = segment(cx, dx, i, j)
+		y1, y2, yd1, yd2, yscale = segment(cy, dy, i, j)
+		for k in range(i+1, j):
+			x = cx[k]
+			if xscale is None:
+				p = xd1
+			elif x <= x1:
+				p = xd1
+			elif x >= x2:
+				p = xd2
+			else:
+				p = xd1 + (x - x1) * xscale
+			ex = dx[k] - p
+			if ex > tolerance or -ex > tolerance:
+				return False
+
+			y = cy[k]
+			if yscale is None:
+				q = yd1
+			elif y <= y1:
+				q = yd1
+			elif y >= y2:
+				q = yd2
+			else:
+				q = yd1 + (y - y1) * yscale
+			ey = dy[k] - q
+			if ey > tolerance or -ey > tolerance:
+				return False
+
+			# Only compute the distance when both components are non-zero;
+			# otherwise it is exactly the absolute value of the other one,
+			# which was just checked.
+			if ex and ey and abs(complex(ex, ey)) > tolerance:
+				return False
+		return True
+
+	return can_iup
+
 def _iup_contour_bound_forced_set(delta, coords, tolerance=0):
 	"""The forced set is a conservative set of points on the contour that must be encoded
 	explicitly (ie. cannot be interpolated).  Calculating this set allows for significantly
@@ -168,7 +234,7 @@ def _iup_contour_bound_forced_set(delta, coords, tolerance=0):
 
 	return forced
 
-def _iup_contour_optimize_dp(delta, coords, forced={}, tolerance=0, lookback=None):
+def _iup_contour_optimize_dp(delta, coords, forced={}, tolerance=0, lookback=None, fast=False):
 	"""Straightforward Dynamic-Programming.  For each index i, find least-costly encoding of
 	points 0 to i where i is explicitly encoded.  We find this by considering all previous
 	explicit points j and check whether interpolation can fill points between j and i.
@@ -176,11 +242,17 @@ def _iup_contour_optimize_dp(delta, coords, forced={}, tolerance=0, lookback=Non
 	Note that solution always encodes last point explicitly.  Higher-level is responsible
 	for removing that restriction.
 
-	As major speedup, we stop looking further whenever we see a "forced" point."""
+	As major speedup, we stop looking further whenever we see a "forced" point.
+
+	If fast is True, segments are checked with _can_iup_in_between_func(), and the
+	lookback window of each point is cut at the last forced point before it upfront,
+	instead of being tested on every step."""
 
 	n = len(delta)
 	if lookback is None:
 		lookback = n
+	if fast:
+		return _iup_contour_optimize_dp_fast(delta, coords, forced, tolerance, lookback)
 	costs = {-1:0}
 	chain = {-1:None}
 	for i in range(0, n):
@@ -205,6 +277,42 @@ def _iup_contour_optimize_dp(delta, coords, forced={}, tolerance=0, lookback=Non
 
 	return chain, costs
 
+def _iup_contour_optimize_dp_fast(delta, coords, forced, tolerance, lookback):
+	n = len(delta)
+	can_iup = _can_iup_in_between_func(delta, coords, tolerance)
+
+	# For each index, the closest forced index at or before it (or -2 if none).
+	last_forced = [-2] * n
+	prev = -2
+	for i in range(n):
+		if i in forced:
+			prev = i
+		last_forced[i] = prev
+
+	costs = {-1:0}
+	chain = {-1:None}
+	for i in range(0, n):
+		best_cost = costs[i-1] + 1
+
+		costs[i] = best_cost
+		chain[i] = i - 1
+
+		if i - 1 in forced:
+			continue
+
+		# The slow loop visits j down to and including the first forced index
+		# at or below i-2, then stops.
+		stop = max(i-lookback, -2, last_forced[i-2] - 1 if i >= 2 else -2)
+		for j in range(i-2, stop, -1):
+
+			cost = costs[j] + 1
+
+			if cost < best_cost and can_iup(j, i):
+				costs[i] = best_cost = cost
+				chain[i] = j
+
+	return chain, costs
+
 def _rot_list(l, k):
 	"""Rotate list by k items forward.  Ie. item at position 0 will be
 	at position k in returned list.  Negative k is allowed."""
@@ -218,7 +326,32 @@ def _rot_set(s, k, n):
 	if not k: return s
 	return {(v + k) % n for v in s}
 
-def iup_contour_optimize(delta, coords, tolerance=0.):
+def iup_contour_optimize(delta, coords, tolerance=0., fast=False):
+	"""Return a copy of delta with as many points as possible replaced by
+	None, such that interpolating the remaining points reproduces delta
+	within tolerance.
+
+	If fast is True, a faster implementation of the same algorithm is used,
+	which returns identical results.  It also remembers the results for
+	recently seen contours, which pays off as the same contours often recur
+	in several masters and glyphs.
+	"""
+	if fast:
+		key = (tuple(delta), tuple(coords), tolerance)
+		result = _iup_contour_cache.get(key)
+		if result is None:
+			result = _iup_contour_optimize(delta, coords, tolerance, True)
+			if len(_iup_contour_cache) >= _IUP_CONTOUR_CACHE_SIZE:
+				_iup_contour_cache.clear()
+			_iup_contour_cache[key] = result
+		return list(result)
+	return _iup_contour_optimize(delta, coords, tolerance)
+
+# Results of iup_contour_optimize(..., fast=True), keyed by (delta, coords, tolerance)
+_iup_contour_cache = {}
+_IUP_CONTOUR_CACHE_SIZE = 4096
+
+def _iup_contour_optimize(delta, coords, tolerance=0., fast=False):
 	n = len(delta)
 
 	# Get the easy cases out of the way:
@@ -254,7 +387,7 @@ def iup_contour_optimize(delta, coords, tolerance=0.):
 		coords = _rot_list(coords, k)
 		forced = _rot_set(forced, k, n)
 
-		chain, costs = _iup_contour_optimize_dp(delta, coords, forced, tolerance)
+		chain, costs = _iup_contour_optimize_dp(delta, coords, forced, tolerance, fast=fast)
 
 		# Assemble solution.
 		solution = set()
@@ -270,7 +403,7 @@ def iup_contour_optimize(delta, coords, tolerance=0.):
 		# Repeat the contour an extra time, solve the 2*n case, then look for solutions of the
 		# circular n-length problem in the solution for 2*n linear case.  I cannot prove that
 		# this always produces the optimal solution...
-		chain, costs = _iup_contour_optimize_dp(delta+delta, coords+coords, forced, tolerance, n)
+		chain, costs = _iup_contour_optimize_dp(delta+delta, coords+coords, forced, tolerance, n, fast=fast)
 		best_sol, best_cost = None, n+1
 
 		for start in range(n-1, 2*n-1):
@@ -290,16 +423,78 @@ def iup_contour_optimize(delta, coords, tolerance=0.):
 
 	return delta
 
-def iup_delta_optimize(delta, coords, ends, tolerance=0.):
+def iup_delta_optimize(delta, coords, ends, tolerance=0., fast=False):
 	assert sorted(ends) == ends and len(coords) == (ends[-1]+1 if ends else 0) + 4
 	n = len(coords)
 	ends = ends + [n-4, n-3, n-2, n-1]
 	out = []
 	start = 0
 	for end in ends:
-		contour = iup_contour_optimize(delta[start:end+1], coords[start:end+1], tolerance)
+		contour = iup_contour_optimize(delta[start:end+1], coords[start:end+1], tolerance, fast)
 		assert len(contour) == end - start + 1
 		out.extend(contour)
 		start = end+1
 
 	return out
+
+
+def main(args=None):
+	"""Benchmark the IUP optimizers on the glyph variations of a font"""
+	from argparse import ArgumentParser
+	from fontTools import configLogger
+	from fontTools.ttLib import TTFont
+	from fontTools.varLib import _GetCoordinates
+	import time
+
+	parser = ArgumentParser(prog='varLib.iup')
+	parser.add_argument('fontfile', help='a TrueType variable font')
+	parser.add_argument(
+		'-t',
+		'--tolerance',
+		type=float,
+		default=0.5,
+		help='IUP tolerance, in font units (default: %(default)s)'
+	)
+	options = parser.parse_args(args)
+
+	# TODO: allow user to configure logging via command-line options
+	configLogger(level="INFO")
+
+	font = TTFont(options.fontfile)
+	gvar = font['gvar']
+
+	# Expand the glyph variations of the font back to full deltas, to be
+	# optimized again.
+	work = []
+	for glyphName in font.getGlyphOrder():
+		variations = gvar.variations.get(glyphName)
+		if not variations:
+			continue
+		coords, control = _GetCoordinates(font, glyphName)
+		endPts = control[1] if control[0] >= 1 else list(range(len(control[1])))
+		coords = list(coords)
+		for var in variations:
+			delta = iup_delta(var.coordinates, coords, endPts)
+			work.append((delta, coords, endPts))
+	print("%d glyph variations, %d points" % (len(work), sum(len(c) for _, c, _ in work)))
+
+	results = {}
+	for fast in (False, True):
+		_iup_contour_cache.clear()
+		start = time.time()
+		results[fast] = [iup_delta_optimize(delta, coords, endPts, options.tolerance, fast)
+		                 for delta, coords, endPts in work]
+		elapsed = time.time() - start
+		print("%-8s %8.3f s" % ("fast:" if fast else "default:", elapsed))
+
+	if results[True] != results[False]:
+		print("Optimizers returned different results!")
+		return 1
+
+
+if __name__ == "__main__":
+	import sys
+	if len(sys.argv) > 1:
+		sys.exit(main())
+	import doctest
+	sys.exit(doctest.testmod().failed)
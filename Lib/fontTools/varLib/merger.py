@@ -113,6 +113,19 @@ class Merger(object):
 class AligningMerger(Merger):
 	pass
 
+# Decompiled Coverage and ClassDef tables store glyph IDs, which may refer to
+# different glyph orders in each master: compare them by glyph name.
+
+@AligningMerger.merger(ot.Coverage)
+def merge(merger, self, lst):
+	assert all(getattr(self, 'Format', None) == getattr(v, 'Format', None) and
+		   self.glyphs == v.glyphs for v in lst), (self.glyphs, [v.glyphs for v in lst])
+
+@AligningMerger.merger(ot.ClassDef)
+def merge(merger, self, lst):
+	assert all(getattr(self, 'Format', None) == getattr(v, 'Format', None) and
+		   self.classDefs == v.classDefs for v in lst), (self.classDefs, [v.classDefs for v in lst])
+
 def _SinglePosUpgradeToFormat2(self):
 	if self.Format == 2: return self
 
@@ -700,7 +713,10 @@ class MutatorMerger(AligningMerger):
 			if gdef.Version >= 0x00010003:
 				store = gdef.VarStore
 
-		self.instancer = VarStoreInstancer(store, font['fvar'].axes, location)
+		# Most of the store is looked up when instancing GPOS; evaluate it
+		# all at once.
+		self.instancer = VarStoreInstancer(store, font['fvar'].axes, location,
+						   precompute=True)
 
 	def instantiate(self):
 		font = self.font
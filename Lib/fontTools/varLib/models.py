@@ -1,6 +1,7 @@
 """Variation fonts interpolation models."""
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
+from collections import OrderedDict
 
 __all__ = ['normalizeValue', 'normalizeLocation', 'supportScalar', 'VariationModel']
 
@@ -172,6 +173,7 @@ class VariationModel(object):
 		self.reverseMapping = [locations.index(l) for l in self.locations] # Reverse of above
 
 		self._computeMasterSupports(axisPoints, axisOrder)
+		self._scalarsCache = OrderedDict()
 
 	@staticmethod
 	def getMasterLocationsSortKeyFunc(locations, axisOrder=[]):
@@ -302,20 +304,56 @@ class VariationModel(object):
 
 		self.supports = supports
 		self.deltaWeights = deltaWeights
+		# Sparse rows of the lower-triangular matrix mapping master values to
+		# deltas, in the form used by getDeltas() and getDeltasBatch().
+		self._deltaWeightsMatrix = [
+			(self.reverseMapping[i], list(weights.items()))
+			for i,weights in enumerate(deltaWeights)]
 
 	def getDeltas(self, masterValues):
 		assert len(masterValues) == len(self.deltaWeights)
-		mapping = self.reverseMapping
 		out = []
-		for i,weights in enumerate(self.deltaWeights):
-			delta = masterValues[mapping[i]]
-			for j,weight in weights.items():
+		for masterIndex,weights in self._deltaWeightsMatrix:
+			delta = masterValues[masterIndex]
+			for j,weight in weights:
 				delta -= out[j] * weight
 			out.append(delta)
 		return out
 
+	def getDeltasBatch(self, masterValues):
+		"""Like getDeltas(), but for a batch of values at once: masterValues
+		holds one sequence of numbers per master, all of the same length
+		(eg. the advance widths of all glyphs in each master).  Returns one
+		list of deltas per support.  The result is the same as calling
+		getDeltas() on each column separately.
+
+		>>> model = VariationModel([{}, {'wght': 1}, {'wght': -1}])
+		>>> model.getDeltasBatch([[500, 600], [700, 600], [400, 600]])
+		[[500, 600], [-100.0, 0.0], [200.0, 0.0]]
+		"""
+		assert len(masterValues) == len(self.deltaWeights)
+		out = []
+		for masterIndex,weights in self._deltaWeightsMatrix:
+			delta = list(masterValues[masterIndex])
+			for j,weight in weights:
+				delta = [d - o * weight for d,o in zip(delta, out[j])]
+			out.append(delta)
+		return out
+
+	SCALARS_CACHE_SIZE = 128
+
 	def getScalars(self, loc):
-		return [supportScalar(loc, support) for support in self.supports]
+		"""Returns the list of support scalars at location loc.  The scalars
+		of the SCALARS_CACHE_SIZE most recently used locations are cached."""
+		key = tuple(sorted(loc.items()))
+		cache = self._scalarsCache
+		scalars = cache.pop(key, None)
+		if scalars is None:
+			scalars = tuple(supportScalar(loc, support) for support in self.supports)
+			while len(cache) >= self.SCALARS_CACHE_SIZE:
+				cache.popitem(last=False)
+		cache[key] = scalars
+		return list(scalars)
 
 	@staticmethod
 	def interpolateFromDeltasAndScalars(deltas, scalars):
@@ -330,6 +368,35 @@ class VariationModel(object):
 				v += contribution
 		return v
 
+	@staticmethod
+	def interpolateFromDeltasAndScalarsBatch(deltas, scalars):
+		"""Like interpolateFromDeltasAndScalars(), for the lists of deltas
+		returned by getDeltasBatch().  Returns a list of values."""
+		v = None
+		assert len(deltas) == len(scalars)
+		for delta,scalar in zip(deltas, scalars):
+			if not scalar: continue
+			if v is None:
+				v = [d * scalar for d in delta]
+			else:
+				v = [a + d * scalar for a,d in zip(v, delta)]
+		return v
+
+	def interpolateFromDeltasBatch(self, loc, deltas):
+		scalars = self.getScalars(loc)
+		return self.interpolateFromDeltasAndScalarsBatch(deltas, scalars)
+
+	def interpolateFromMastersBatch(self, loc, masterValues):
+		"""Interpolates a batch of values at location loc; masterValues
+		holds one sequence of numbers per master, as for getDeltasBatch().
+
+		>>> model = VariationModel([{}, {'wght': 1}, {'wght': -1}])
+		>>> model.interpolateFromMastersBatch({'wght': .5}, [[500, 600], [700, 600], [400, 600]])
+		[600.0, 600.0]
+		"""
+		deltas = self.getDeltasBatch(masterValues)
+		return self.interpolateFromDeltasBatch(loc, deltas)
+
 	def interpolateFromDeltas(self, loc, deltas):
 		scalars = self.getScalars(loc)
 		return self.interpolateFromDeltasAndScalars(deltas, scalars)
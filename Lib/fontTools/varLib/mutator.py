@@ -2,11 +2,16 @@
 Instantiate a variation font.  Run, eg:
 
 $ fonttools varLib.mutator ./NotoSansArabic-VF.ttf wght=140 wdth=85
+
+or, to generate all the named instances plus another one, using two processes:
+
+$ fonttools varLib.mutator ./NotoSansArabic-VF.ttf -n -l wght=140,wdth=85 -j 2
 """
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.misc.fixedTools import floatToFixedToFloat, otRound
 from fontTools.ttLib import TTFont
+from fontTools.ttLib.ttFont import _FontSnapshot
 from fontTools.ttLib.tables._g_l_y_f import GlyphCoordinates
 from fontTools.varLib import _GetCoordinates, _SetCoordinates
 from fontTools.varLib.models import (
@@ -16,6 +21,8 @@ from fontTools.varLib.merger import MutatorMerger
 from fontTools.varLib.varStore import VarStoreInstancer
 from fontTools.varLib.mvar import MVAR_ENTRIES
 from fontTools.varLib.iup import iup_delta
+from array import array
+import copy
 import os.path
 import logging
 
@@ -39,120 +46,398 @@ def instantiateVariableFont(varfont, location, inplace=False):
 
 	By default, a new TTFont object is returned. If ``inplace`` is True, the
 	input varfont is modified and reduced to a static font.
+
+	To generate several instances of the same variable font, use
+	instantiateVariableFonts() or VariableFontInstancer, which only do the
+	location-independent work once.
 	"""
-	if not inplace:
+	if inplace:
+		font = varfont
+	else:
 		# make a copy to leave input varfont unmodified
-		stream = BytesIO()
-		varfont.save(stream)
-		stream.seek(0)
-		varfont = TTFont(stream)
-
-	fvar = varfont['fvar']
-	axes = {a.axisTag:(a.minValue,a.defaultValue,a.maxValue) for a in fvar.axes}
-	loc = normalizeLocation(location, axes)
-	if 'avar' in varfont:
-		maps = varfont['avar'].segments
-		loc = {k: piecewiseLinearMap(v, maps[k]) for k,v in loc.items()}
-	# Quantize to F2Dot14, to avoid surprise interpolations.
-	loc = {k:floatToFixedToFloat(v, 14) for k,v in loc.items()}
-	# Location is normalized now
-	log.info("Normalized location: %s", loc)
-
-	log.info("Mutating glyf/gvar tables")
-	gvar = varfont['gvar']
-	glyf = varfont['glyf']
-	# get list of glyph names in gvar sorted by component depth
-	glyphnames = sorted(
-		gvar.variations.keys(),
-		key=lambda name: (
-			glyf[name].getCompositeMaxpValues(glyf).maxComponentDepth
-			if glyf[name].isComposite() else 0,
-			name))
-	for glyphname in glyphnames:
-		variations = gvar.variations[glyphname]
-		coordinates,_ = _GetCoordinates(varfont, glyphname)
-		origCoords, endPts = None, None
-		for var in variations:
-			scalar = supportScalar(loc, var.axes)
-			if not scalar: continue
-			delta = var.coordinates
-			if None in delta:
-				if origCoords is None:
-					origCoords,control = _GetCoordinates(varfont, glyphname)
-					endPts = control[1] if control[0] >= 1 else list(range(len(control[1])))
-				delta = iup_delta(delta, origCoords, endPts)
-			coordinates += GlyphCoordinates(delta) * scalar
-		_SetCoordinates(varfont, glyphname, coordinates)
-
-	if 'cvar' in varfont:
-		log.info("Mutating cvt/cvar tables")
-		cvar = varfont['cvar']
-		cvt = varfont['cvt ']
-		deltas = {}
-		for var in cvar.variations:
-			scalar = supportScalar(loc, var.axes)
-			if not scalar: continue
-			for i, c in enumerate(var.coordinates):
-				if c is not None:
+		font = _FontSnapshot(varfont).newFont()
+	# for a single instance, read the variation data from the very font
+	# being instantiated: it is all gathered before anything gets modified
+	instancer = VariableFontInstancer(varfont, source=font)
+	return instancer._instantiate(font, location)
+
+
+def instantiateVariableFonts(varfont, locations):
+	""" Generate a static instance from a variable TTFont for each of the
+	'locations', given as dictionaries of user-space coordinates like for
+	instantiateVariableFont(). Return the list of new TTFont objects; the
+	input varfont is left unmodified.
+	"""
+	instancer = VariableFontInstancer(varfont)
+	return [instancer.instantiate(location) for location in locations]
+
+
+def saveVariableFontInstances(varfont, locations, outfiles, workers=None):
+	""" Generate a static instance from a variable TTFont for each of the
+	'locations', and save it to the corresponding file in 'outfiles'.
+
+	If 'workers' is greater than one, the instances are generated and saved
+	in as many worker processes, which inherit the preprocessed variable
+	font. This requires a platform that can fork processes; elsewhere, the
+	instances are saved one after the other.
+	"""
+	locations = list(locations)
+	outfiles = list(outfiles)
+	if len(locations) != len(outfiles):
+		raise ValueError("expected %d output files, found %d" % (
+			len(locations), len(outfiles)))
+	seen = set()
+	for outfile in outfiles:
+		key = os.path.normcase(os.path.abspath(outfile))
+		if key in seen:
+			raise ValueError("output file %s given more than once" % outfile)
+		seen.add(key)
+	instancer = VariableFontInstancer(varfont)
+	instancer.prepare()
+
+	context = None
+	if workers is not None and workers > 1 and len(locations) > 1:
+		from fontTools.ttLib.ttFont import _getForkContext
+		context = _getForkContext()
+		if context is None:
+			log.warning("can't fork worker processes; saving instances serially")
+	if context is None:
+		for location, outfile in zip(locations, outfiles):
+			_saveInstance(instancer, location, outfile)
+		return
+
+	pool = context.Pool(min(workers, len(locations)),
+			initializer=_initInstanceWorker, initargs=(instancer,))
+	try:
+		pool.map(_saveInstanceInWorker, zip(locations, outfiles), chunksize=1)
+	finally:
+		pool.terminate()
+
+
+def getNamedInstances(varfont):
+	""" Return a list of (name, location) tuples for the named instances
+	defined in the 'fvar' table of the variable TTFont. The name is the
+	instance's PostScript name if the font has one, else the family name
+	and the subfamily name, joined by a hyphen and without spaces; the
+	location is a dictionary of user-space coordinates.
+
+	The names can be used as file names: path separators and control
+	characters are removed, and repeated names get a "-2", "-3", etc.
+	suffix.
+	"""
+	nameTable = varfont['name'] if 'name' in varfont else None
+	def getName(nameID):
+		if nameTable is None:
+			return None
+		name = nameTable.getName(nameID, 3, 1, 0x409) or nameTable.getName(nameID, 1, 0, 0)
+		return name.toUnicode() if name is not None else None
+
+	family = getName(16) or getName(1)
+	result = []
+	for i, instance in enumerate(varfont['fvar'].instances):
+		name = None
+		if instance.postscriptNameID != 0xFFFF:
+			name = getName(instance.postscriptNameID)
+		if name is None:
+			subfamily = getName(instance.subfamilyNameID)
+			if subfamily is not None:
+				name = "%s-%s" % (family, subfamily) if family else subfamily
+				name = name.replace(" ", "")
+			else:
+				name = "instance%d" % i
+		name = _fileNameSafe(name) or "instance%d" % i
+		result.append((name, dict(instance.coordinates)))
+	names = _makeUniqueNames([name for name, _ in result])
+	return [(name, location) for name, (_, location) in zip(names, result)]
+
+
+def _fileNameSafe(name):
+	# drop the characters that could make a file name point outside of
+	# its directory, or that file systems reject
+	return "".join(c for c in name if c not in '/\\:' and ord(c) >= 32)
+
+
+def _makeUniqueNames(names):
+	# append "-2", "-3", etc. to the names that were seen before, ignoring
+	# case for case-insensitive file systems
+	seen = set()
+	result = []
+	for name in names:
+		unique = name
+		i = 2
+		while unique.lower() in seen:
+			unique = "%s-%d" % (name, i)
+			i += 1
+		seen.add(unique.lower())
+		result.append(unique)
+	return result
+
+
+class VariableFontInstancer(object):
+	""" Generate static instances of a variable TTFont at any number of
+	locations. Everything that does not depend on the location is done only
+	once, and shared by all the instances: decoding the glyph variations and
+	interpolating the deltas of the points they leave out, sorting the glyphs
+	by component depth, and decompiling the variation stores.
+
+	The variable font itself is never modified. The variation data is read
+	from 'source' if given, else from a copy of the variable font.
+
+	>>> instancer = VariableFontInstancer(varfont)  # doctest: +SKIP
+	>>> light = instancer.instantiate({'wght': 300})  # doctest: +SKIP
+	>>> bold = instancer.instantiate({'wght': 700})  # doctest: +SKIP
+	"""
+
+	def __init__(self, varfont, source=None):
+		self.varfont = varfont
+		self.source = source
+		self._snapshot = None
+		self._glyphs = None
+
+	def _getSource(self):
+		# a private copy of varfont to read the variation tables from, so
+		# that only the copies made for each instance get modified
+		if self.source is None:
+			self._snapshot = _FontSnapshot(self.varfont)
+			self.source = self._snapshot.newFont()
+		return self.source
+
+	def normalizeLocation(self, location):
+		"""Return the normalized location for the user-space 'location',
+		with the 'avar' mappings applied.
+		"""
+		font = self._getSource()
+		axes = {a.axisTag:(a.minValue,a.defaultValue,a.maxValue)
+		        for a in font['fvar'].axes}
+		loc = normalizeLocation(location, axes)
+		if 'avar' in font:
+			maps = font['avar'].segments
+			loc = {k: piecewiseLinearMap(v, maps[k]) for k,v in loc.items()}
+		# Quantize to F2Dot14, to avoid surprise interpolations.
+		loc = {k:floatToFixedToFloat(v, 14) for k,v in loc.items()}
+		return loc
+
+	def prepare(self):
+		"""Do all the location-independent work up front. This is otherwise
+		done when generating the first instance.
+		"""
+		if self._glyphs is not None:
+			return
+		font = self._getSource()
+		self._glyphs = glyphs = []
+		if 'gvar' in font:
+			gvar = font['gvar']
+			glyf = font['glyf']
+			# get list of glyph names in gvar sorted by component depth
+			glyphnames = sorted(
+				gvar.variations.keys(),
+				key=lambda name: (
+					glyf[name].getCompositeMaxpValues(glyf).maxComponentDepth
+					if glyf[name].isComposite() else 0,
+					name))
+			for glyphname in glyphnames:
+				variations = gvar.variations[glyphname]
+				if not variations:
+					continue
+				coordinates, control = _GetCoordinates(font, glyphname)
+				endPts = control[1] if control[0] >= 1 else list(range(len(control[1])))
+				deltas = [(var.axes, _getFlatDeltas(var, coordinates, endPts))
+				          for var in variations]
+				glyphs.append((glyphname, array("d", coordinates.array), deltas))
+
+		self._cvtDeltas = cvtDeltas = []
+		if 'cvar' in font:
+			for var in font['cvar'].variations:
+				cvtDeltas.append((var.axes, [(i, c)
+					for i, c in enumerate(var.coordinates) if c is not None]))
+
+		self._mvarRecords = mvarRecords = []
+		self._mvarInstancer = None
+		if 'MVAR' in font:
+			mvar = font['MVAR'].table
+			for rec in mvar.ValueRecord:
+				if rec.ValueTag in MVAR_ENTRIES:
+					mvarRecords.append((MVAR_ENTRIES[rec.ValueTag], rec.VarIdx))
+			self._mvarInstancer = VarStoreInstancer(
+				mvar.VarStore, font['fvar'].axes)
+
+	def instantiate(self, location):
+		"""Return a new TTFont with the static instance at the user-space
+		'location'.
+		"""
+		self.prepare()
+		# all the instances are copies of the same snapshot of varfont
+		if self._snapshot is None:
+			self._snapshot = _FontSnapshot(self.varfont)
+		return self._instantiate(self._snapshot.newFont(), location)
+
+	def _instantiate(self, font, location):
+		self.prepare()
+		fvar = font['fvar']
+		loc = self.normalizeLocation(location)
+		# Location is normalized now
+		log.info("Normalized location: %s", loc)
+		scalars = _RegionScalars(loc)
+
+		if self._glyphs:
+			log.info("Mutating glyf/gvar tables")
+			# the glyphs in the font copy would have to be decompiled
+			# all over again: start from the ones already decompiled
+			# in the source font instead
+			sourceGlyf = self._getSource()['glyf']
+			glyf = font['glyf']
+			if glyf is sourceGlyf:
+				sourceGlyf = None
+		for glyphname, origCoords, variations in self._glyphs:
+			# sum up the scaled deltas of all the variations, in one flat
+			# array of x and y values, and add them to the coordinates
+			total = None
+			for axes, deltas in variations:
+				scalar = scalars[axes]
+				if not scalar:
+					continue
+				if total is None:
+					total = [d * scalar for d in deltas]
+				else:
+					total = [t + d * scalar for t, d in zip(total, deltas)]
+			if sourceGlyf is not None:
+				glyf[glyphname] = _copyGlyph(sourceGlyf[glyphname])
+			coordinates = GlyphCoordinates(typecode="d")
+			if total is None:
+				coordinates.array.extend(origCoords)
+			else:
+				coordinates.array.extend([c + t for c, t in zip(origCoords, total)])
+			# this also recomputes the glyph's bounds and side bearings,
+			# even if none of its variations applies at this location
+			_SetCoordinates(font, glyphname, coordinates)
+
+		if self._cvtDeltas:
+			log.info("Mutating cvt/cvar tables")
+			cvt = font['cvt ']
+			deltas = {}
+			for axes, coordinates in self._cvtDeltas:
+				scalar = scalars[axes]
+				if not scalar: continue
+				for i, c in coordinates:
 					deltas[i] = deltas.get(i, 0) + scalar * c
-		for i, delta in deltas.items():
-			cvt[i] += otRound(delta)
-
-	if 'MVAR' in varfont:
-		log.info("Mutating MVAR table")
-		mvar = varfont['MVAR'].table
-		varStoreInstancer = VarStoreInstancer(mvar.VarStore, fvar.axes, loc)
-		records = mvar.ValueRecord
-		for rec in records:
-			mvarTag = rec.ValueTag
-			if mvarTag not in MVAR_ENTRIES:
-				continue
-			tableTag, itemName = MVAR_ENTRIES[mvarTag]
-			delta = otRound(varStoreInstancer[rec.VarIdx])
-			if not delta:
-				continue
-			setattr(varfont[tableTag], itemName,
-				getattr(varfont[tableTag], itemName) + delta)
-
-	if 'GDEF' in varfont:
-		log.info("Mutating GDEF/GPOS/GSUB tables")
-		merger = MutatorMerger(varfont, loc)
-
-		log.info("Building interpolated tables")
-		merger.instantiate()
-
-	if 'name' in varfont:
-		log.info("Pruning name table")
-		exclude = {a.axisNameID for a in fvar.axes}
-		for i in fvar.instances:
-			exclude.add(i.subfamilyNameID)
-			exclude.add(i.postscriptNameID)
-		varfont['name'].names[:] = [
-			n for n in varfont['name'].names
-			if n.nameID not in exclude
-		]
-
-	if "wght" in location and "OS/2" in varfont:
-		varfont["OS/2"].usWeightClass = otRound(
-			max(1, min(location["wght"], 1000))
-		)
-	if "wdth" in location:
-		wdth = location["wdth"]
-		for percent, widthClass in sorted(OS2_WIDTH_CLASS_VALUES.items()):
-			if wdth < percent:
-				varfont["OS/2"].usWidthClass = widthClass
-				break
-		else:
-			varfont["OS/2"].usWidthClass = 9
-	if "slnt" in location and "post" in varfont:
-		varfont["post"].italicAngle = max(-90, min(location["slnt"], 90))
-
-	log.info("Removing variable tables")
-	for tag in ('avar','cvar','fvar','gvar','HVAR','MVAR','VVAR','STAT'):
-		if tag in varfont:
-			del varfont[tag]
-
-	return varfont
+			for i, delta in deltas.items():
+				cvt[i] += otRound(delta)
+
+		if self._mvarInstancer is not None:
+			log.info("Mutating MVAR table")
+			varStoreInstancer = self._mvarInstancer
+			varStoreInstancer.setLocation(loc)
+			for (tableTag, itemName), varIdx in self._mvarRecords:
+				delta = otRound(varStoreInstancer[varIdx])
+				if not delta:
+					continue
+				setattr(font[tableTag], itemName,
+					getattr(font[tableTag], itemName) + delta)
+
+		if 'GDEF' in font:
+			log.info("Mutating GDEF/GPOS/GSUB tables")
+			merger = MutatorMerger(font, loc)
+
+			log.info("Building interpolated tables")
+			merger.instantiate()
+
+		if 'name' in font:
+			log.info("Pruning name table")
+			exclude = {a.axisNameID for a in fvar.axes}
+			for i in fvar.instances:
+				exclude.add(i.subfamilyNameID)
+				exclude.add(i.postscriptNameID)
+			font['name'].names[:] = [
+				n for n in font['name'].names
+				if n.nameID not in exclude
+			]
+
+		if "wght" in location and "OS/2" in font:
+			font["OS/2"].usWeightClass = otRound(
+				max(1, min(location["wght"], 1000))
+			)
+		if "wdth" in location:
+			wdth = location["wdth"]
+			for percent, widthClass in sorted(OS2_WIDTH_CLASS_VALUES.items()):
+				if wdth < percent:
+					font["OS/2"].usWidthClass = widthClass
+					break
+			else:
+				font["OS/2"].usWidthClass = 9
+		if "slnt" in location and "post" in font:
+			font["post"].italicAngle = max(-90, min(location["slnt"], 90))
+
+		log.info("Removing variable tables")
+		for tag in ('avar','cvar','fvar','gvar','HVAR','MVAR','VVAR','STAT'):
+			if tag in font:
+				del font[tag]
+
+		return font
+
+
+class _RegionScalars(dict):
+	"""Maps the 'axes' dicts of TupleVariations to their scalars at the given
+	normalized location. Each scalar is only computed once.
+	"""
+
+	def __init__(self, location):
+		self.location = location
+
+	def __getitem__(self, axes):
+		return dict.__getitem__(self, tuple(sorted(axes.items())))
+
+	def __missing__(self, key):
+		scalar = self[key] = supportScalar(self.location, dict(key))
+		return scalar
+
+
+def _getFlatDeltas(var, coordinates, endPts):
+	"""Return the deltas of a gvar TupleVariation as a flat array of x and y
+	values, with the deltas of points without explicit ones interpolated.
+	"""
+	mask, deltasX, deltasY = var.getDeltaArrays()
+	if deltasY is not None and all(mask):
+		# interleave the x and y deltas
+		deltas = array("d", [0]) * (2 * len(mask))
+		deltas[0::2] = array("d", deltasX)
+		deltas[1::2] = array("d", deltasY)
+		return deltas
+	delta = var.coordinates
+	if None in delta:
+		delta = iup_delta(delta, coordinates, endPts)
+	return array("d", [v for pt in delta for v in pt])
+
+
+def _copyGlyph(glyph):
+	"""Return a copy of a decompiled glyph, sharing everything but the
+	coordinates and components, which are all _SetCoordinates() changes.
+	"""
+	glyph = copy.copy(glyph)
+	if glyph.isComposite():
+		glyph.components = [copy.copy(c) for c in glyph.components]
+	return glyph
+
+
+def _saveInstance(instancer, location, outfile):
+	log.info("Saving instance font %s", outfile)
+	instancer.instantiate(location).save(outfile)
+
+
+# the instancer used by worker processes forked by saveVariableFontInstances()
+_workerInstancer = None
+
+def _initInstanceWorker(instancer):
+	global _workerInstancer
+	_workerInstancer = instancer
+
+def _saveInstanceInWorker(args):
+	location, outfile = args
+	_saveInstance(_workerInstancer, location, outfile)
+
+def _locationFileName(location):
+	return "-".join(
+		"%s%s" % (tag.strip(), ("%g" % value).replace("-", "m"))
+		for tag, value in sorted(location.items()))
 
 
 def main(args=None):
@@ -171,6 +456,28 @@ def main(args=None):
 	parser.add_argument(
 		"-o", "--output", metavar="OUTPUT.ttf", default=None,
 		help="Output instance TTF file (default: INPUT-instance.ttf).")
+	batch_group = parser.add_argument_group(
+		"multiple instances",
+		"Generate several instances of the variable font at once. Each one "
+		"is saved in the output directory, and named after the instance's "
+		"PostScript name, or after its location.")
+	batch_group.add_argument(
+		"-l", "--location", metavar="AXIS=LOC[,AXIS=LOC...]", action="append",
+		default=[], dest="locations",
+		help="Comma-separated location of an instance to generate, in "
+		"addition to the one given as positional arguments, if any. Can be "
+		"repeated.")
+	batch_group.add_argument(
+		"-n", "--named-instances", action="store_true",
+		help="Generate all the named instances defined in the 'fvar' table.")
+	batch_group.add_argument(
+		"-d", "--output-dir", metavar="DIR", default=None,
+		help="Output directory for multiple instances (default: the "
+		"directory of the input file).")
+	batch_group.add_argument(
+		"-j", "--jobs", metavar="N", type=int, default=None,
+		help="Number of processes used to generate multiple instances "
+		"(default: 1).")
 	logging_group = parser.add_mutually_exclusive_group(required=False)
 	logging_group.add_argument(
 		"-v", "--verbose", action="store_true", help="Run more verbosely.")
@@ -179,31 +486,72 @@ def main(args=None):
 	options = parser.parse_args(args)
 
 	varfilename = options.input
-	outfile = (
-		os.path.splitext(varfilename)[0] + '-instance.ttf'
-		if not options.output else options.output)
 	configLogger(level=(
 		"DEBUG" if options.verbose else
 		"ERROR" if options.quiet else
 		"INFO"))
 
-	loc = {}
-	for arg in options.locargs:
-		try:
-			tag, val = arg.split('=')
-			assert len(tag) <= 4
-			loc[tag.ljust(4)] = float(val)
-		except (ValueError, AssertionError):
-			parser.error("invalid location argument format: %r" % arg)
-	log.info("Location: %s", loc)
+	def parseLocation(locargs):
+		loc = {}
+		for arg in locargs:
+			try:
+				tag, val = arg.split('=')
+				assert len(tag) <= 4
+				loc[tag.ljust(4)] = float(val)
+			except (ValueError, AssertionError):
+				parser.error("invalid location argument format: %r" % arg)
+		return loc
+
+	if not (options.locations or options.named_instances):
+		outfile = (
+			os.path.splitext(varfilename)[0] + '-instance.ttf'
+			if not options.output else options.output)
+
+		loc = parseLocation(options.locargs)
+		log.info("Location: %s", loc)
+
+		log.info("Loading variable font")
+		varfont = TTFont(varfilename)
+
+		instantiateVariableFont(varfont, loc, inplace=True)
+
+		log.info("Saving instance font %s", outfile)
+		varfont.save(outfile)
+		return
+
+	if options.output:
+		parser.error("-o/--output can't be used with multiple instances; "
+		             "use -d/--output-dir")
 
 	log.info("Loading variable font")
 	varfont = TTFont(varfilename)
 
-	instantiateVariableFont(varfont, loc, inplace=True)
+	instances = []
+	if options.named_instances:
+		instances.extend(getNamedInstances(varfont))
+	locations = [options.locargs] if options.locargs else []
+	locations.extend(arg.split(',') for arg in options.locations)
+	basename = os.path.splitext(os.path.basename(varfilename))[0]
+	for locargs in locations:
+		loc = parseLocation(locargs)
+		name = _fileNameSafe(basename + '-' + _locationFileName(loc))
+		instances.append((name, loc))
+	if not instances:
+		parser.error("no instances to generate")
+	instances = list(zip(_makeUniqueNames([name for name, _ in instances]),
+	                     [loc for _, loc in instances]))
 
-	log.info("Saving instance font %s", outfile)
-	varfont.save(outfile)
+	outdir = options.output_dir
+	if outdir is None:
+		outdir = os.path.dirname(varfilename)
+	elif not os.path.isdir(outdir):
+		os.makedirs(outdir)
+	outfiles = [os.path.join(outdir, name + '.ttf') for name, _ in instances]
+	locations = [loc for _, loc in instances]
+	for outfile, loc in zip(outfiles, locations):
+		log.info("Instance %s: %s", os.path.basename(outfile), loc)
+
+	saveVariableFontInstances(varfont, locations, outfiles, workers=options.jobs)
 
 
 if __name__ == "__main__":
@@ -9,6 +9,7 @@ from fontTools.varLib.builder import (buildVarRegionList, buildVarStore,
 from functools import partial
 from collections import defaultdict
 from array import array
+import heapq
 
 
 def _getLocationKey(loc):
@@ -25,10 +26,12 @@ class OnlineVarStoreBuilder(object):
 		self._data = None
 		self._model = None
 		self._cache = {}
+		self._mastersCache = {}
 
 	def setModel(self, model):
 		self._model = model
 		self._cache = {} # Empty cached items
+		self._mastersCache = {}
 
 	def finish(self, optimize=True):
 		self._regionList.RegionCount = len(self._regionList.Region)
@@ -58,6 +61,16 @@ class OnlineVarStoreBuilder(object):
 		self._store.VarData.append(data)
 
 	def storeMasters(self, master_values):
+		# The same master values recur a lot (eg. in kerning); skip
+		# computing their deltas again.
+		key = tuple(master_values)
+		result = self._mastersCache.get(key)
+		if result is not None:
+			return result
+		result = self._mastersCache[key] = self._storeMasters(master_values)
+		return result
+
+	def _storeMasters(self, master_values):
 		deltas = [otRound(d) for d in self._model.getDeltas(master_values)]
 		base = deltas.pop(0)
 		deltas = tuple(deltas)
@@ -71,7 +84,7 @@ class OnlineVarStoreBuilder(object):
 		if inner == 0xFFFF:
 			# Full array. Start new one.
 			self._add_VarData()
-			return self.storeMasters(master_values)
+			return self._storeMasters(master_values)
 		self._data.Item.append(deltas)
 
 		varIdx = (self._outer << 16) + inner
@@ -85,11 +98,20 @@ def VarRegion_get_support(self, fvar_axes):
 
 class VarStoreInstancer(object):
 
-	def __init__(self, varstore, fvar_axes, location={}):
+	"""Evaluates the deltas of a VarStore at a location, by VarIdx.
+
+	If precompute is True, the first lookup after setting a location
+	evaluates the deltas of all items in the store at once, using one vector
+	of region scalars per VarData, and all lookups are then mere table
+	lookups.  This pays off when most of the store is going to be looked up,
+	as when instancing a whole GPOS table."""
+
+	def __init__(self, varstore, fvar_axes, location={}, precompute=False):
 		self.fvar_axes = fvar_axes
 		assert varstore is None or varstore.Format == 1
 		self._varData = varstore.VarData if varstore else []
 		self._regions = varstore.VarRegionList.Region if varstore else []
+		self.precompute = precompute
 		self.setLocation(location)
 
 	def setLocation(self, location):
@@ -98,6 +120,8 @@ class VarStoreInstancer(object):
 
 	def _clearCaches(self):
 		self._scalars = {}
+		self._varDataScalars = {}
+		self._deltas = None
 
 	def _getScalar(self, regionIdx):
 		scalar = self._scalars.get(regionIdx)
@@ -107,20 +131,63 @@ class VarStoreInstancer(object):
 			self._scalars[regionIdx] = scalar
 		return scalar
 
+	def _getVarDataScalars(self, major):
+		scalars = self._varDataScalars.get(major)
+		if scalars is None:
+			scalars = self._varDataScalars[major] = [
+				self._getScalar(ri) for ri in self._varData[major].VarRegionIndex]
+		return scalars
+
+	def getDeltas(self):
+		"""Returns the deltas of all items in the store at the current
+		location, as a list holding an array of deltas for each VarData;
+		the delta of a VarIdx is deltas[VarIdx >> 16][VarIdx & 0xFFFF]."""
+		if self._deltas is None:
+			self._deltas = deltas = []
+			for major,data in enumerate(self._varData):
+				scalars = self._getVarDataScalars(major)
+				columns = [(i,s) for i,s in enumerate(scalars) if s]
+				if not columns:
+					deltas.append(array('d', [0.]) * len(data.Item))
+					continue
+				deltas.append(array('d', [
+					sum([item[i] * s for i,s in columns])
+					for item in data.Item]))
+		return self._deltas
+
 	def __getitem__(self, varidx):
 
 		major, minor = varidx >> 16, varidx & 0xFFFF
 
-		varData = self._varData
-		scalars = [self._getScalar(ri) for ri in varData[major].VarRegionIndex]
+		if self.precompute:
+			return self.getDeltas()[major][minor]
 
-		deltas = varData[major].Item[minor]
+		scalars = self._getVarDataScalars(major)
+
+		deltas = self._varData[major].Item[minor]
 		delta = 0.
 		for d,s in zip(deltas, scalars):
 			delta += d * s
 		return delta
 
 
+def getAdvanceDeltas(table, glyphOrder, fvar_axes, location):
+	"""Returns a dict mapping glyph names to the advance deltas of the
+	glyphs at (normalized) location, as stored in table, an HVAR or VVAR
+	table (otTables.HVAR or otTables.VVAR object).  The whole VarStore is
+	evaluated only once."""
+	if isinstance(table, ot.VVAR):
+		advMap = table.AdvHeightMap
+	else:
+		advMap = table.AdvWidthMap
+	instancer = VarStoreInstancer(table.VarStore, fvar_axes, location,
+				      precompute=True)
+	if advMap is not None:
+		mapping = advMap.mapping
+		return {glyphName: instancer[mapping[glyphName]] for glyphName in glyphOrder}
+	return {glyphName: instancer[glyphID] for glyphID,glyphName in enumerate(glyphOrder)}
+
+
 #
 # Optimizations
 #
@@ -259,6 +326,7 @@ class _Encoding(object):
 		self.chars = chars
 		self.width = self._popcount(chars)
 		self.overhead = self._characteristic_overhead(chars)
+		self.columns = self._characteristic_columns(chars)
 		self.items = set()
 
 	def append(self, row):
@@ -299,6 +367,19 @@ class _Encoding(object):
 		# https://stackoverflow.com/a/9831671
 		return bin(n).count('1')
 
+	@staticmethod
+	def _characteristic_columns(chars):
+		"""Returns a bitmask with one bit set for each column used by this
+		characteristic."""
+		columns = 0
+		bit = 1
+		while chars:
+			if chars & 3:
+				columns |= bit
+			chars >>= 2
+			bit <<= 1
+		return columns
+
 	@staticmethod
 	def _characteristic_overhead(chars):
 		"""Returns overhead in bytes of encoding this characteristic
@@ -346,13 +427,22 @@ class _EncodingDict(dict):
 		return chars
 
 
-def VarStore_optimize(self):
-	"""Optimize storage. Returns mapping from old VarIdxes to new ones."""
+def VarStore_optimize(self, fast=False):
+	"""Optimize storage. Returns mapping from old VarIdxes to new ones.
+
+	If fast is True, the optimizer from VarStore_optimize_fast() is used,
+	which scales better to stores with many items and regions, but may
+	produce a slightly different (not necessarily larger) encoding."""
 
-	# TODO
-	# Check that no two VarRegions are the same; if they are, fold them.
+	if fast:
+		return VarStore_optimize_fast(self)
 
-	n = len(self.VarRegionList.Region) # Number of columns
+	regionMap = _VarStore_fold_regions(self)
+
+	# Columns are the regions that are not folded into another one
+	columns = [i for i,j in enumerate(regionMap) if i == j]
+	columnIndex = {regionIdx:i for i,regionIdx in enumerate(columns)}
+	n = len(columns) # Number of columns
 	zeroes = array('h', [0]*n)
 
 	front_mapping = {} # Map from old VarIdxes to full row tuples
@@ -367,7 +457,7 @@ def VarStore_optimize(self):
 
 			row = array('h', zeroes)
 			for regionIdx,v in zip(regionIndices, item):
-				row[regionIdx] += v
+				row[columnIndex[regionMap[regionIdx]]] += v
 			row = tuple(row)
 
 			encodings.add_row(row)
@@ -445,7 +535,7 @@ def VarStore_optimize(self):
 	for major,encoding in enumerate(encodings):
 		data = ot.VarData()
 		self.VarData.append(data)
-		data.VarRegionIndex = range(n)
+		data.VarRegionIndex = list(columns)
 		data.VarRegionCount = len(data.VarRegionIndex)
 		data.Item = sorted(encoding.items)
 		for minor,item in enumerate(data.Item):
@@ -471,6 +561,235 @@ def VarStore_optimize(self):
 ot.VarStore.optimize = VarStore_optimize
 
 
+def _VarStore_fold_regions(self):
+	"""Return a list mapping each VarRegion index to the index of the first
+	VarRegion that is identical to it.  Deltas of folded regions are then
+	summed up when rows are collected, and prune_regions() drops the unused
+	duplicates.  A region is only folded into another one if none of the
+	summed deltas overflows a signed 16-bit integer; otherwise it is kept as
+	a column of its own."""
+	regionMap = []
+	seen = {}
+	duplicates = []
+	for i,region in enumerate(self.VarRegionList.Region):
+		key = tuple((axis.StartCoord, axis.PeakCoord, axis.EndCoord)
+			    for axis in region.VarRegionAxis)
+		columns = seen.setdefault(key, [])
+		if columns:
+			duplicates.append((i, columns))
+		else:
+			columns.append(i)
+		regionMap.append(i)
+	if not duplicates:
+		return regionMap
+
+	# The summed deltas of each item, by column, listed by region
+	rowsByRegion = defaultdict(list)
+	for data in self.VarData:
+		for item in data.Item:
+			row = defaultdict(int)
+			for regionIdx,v in zip(data.VarRegionIndex, item):
+				row[regionIdx] += v
+			for regionIdx in row:
+				rowsByRegion[regionIdx].append(row)
+
+	for i,columns in duplicates:
+		for column in columns:
+			if all(-0x8000 <= row.get(column, 0) + row[i] <= 0x7FFF
+			       for row in rowsByRegion[i]):
+				break
+		else:
+			columns.append(i)
+			continue
+		regionMap[i] = column
+		for row in rowsByRegion[i]:
+			if column not in row:
+				rowsByRegion[column].append(row)
+			row[column] += row.pop(i)
+	return regionMap
+
+
+def _sparse_row_characteristics(row):
+	"""Returns encoding characteristics for a sparse row; same as
+	_EncodingDict._row_characteristics() for the corresponding full row."""
+	chars = 0
+	for col,v in row:
+		if not (-128 <= v <= 127):
+			chars |= 3 << (col * 2)
+		else:
+			chars |= 1 << (col * 2)
+	return chars
+
+def _merge_gains(encoding, others, start=0):
+	"""Returns a list of (gain, index) tuples, for each encoding from
+	others[start:] that gives a positive byte gain when merged with encoding.
+	Items of others that are None are skipped."""
+	chars = encoding.chars
+	columns = encoding.columns
+	overhead = encoding.overhead
+	width = encoding.width
+	count = len(encoding.items)
+	out = []
+	for i in range(start, len(others)):
+		other = others[i]
+		if other is None:
+			continue
+		combined_width = bin(chars | other.chars).count('1')
+		# Same as _Encoding._characteristic_overhead() of the combined chars
+		combined_overhead = 6 + 2 * bin(columns | other.columns).count('1')
+		gain = (
+			+ overhead
+			+ other.overhead
+			- combined_overhead
+			- (combined_width - width) * count
+			- (combined_width - other.width) * len(other.items)
+			)
+		if gain > 0:
+			out.append((gain, i))
+	return out
+
+def VarStore_optimize_fast(self):
+	"""Optimize storage, scaling to large stores. Returns mapping from old
+	VarIdxes to new ones.
+
+	Items are collected as sparse rows of (regionIndex, delta) pairs instead
+	of rows spanning all regions, and identical regions are folded.  Encodings
+	are then merged greedily, always merging the pair with the largest gain
+	first, using a priority queue that is updated incrementally as merges
+	happen, rather than searching all pairs again."""
+
+	regionMap = _VarStore_fold_regions(self)
+
+	front_mapping = {} # Map from old VarIdxes to sparse row tuples
+
+	encodings = _EncodingDict()
+
+	for major,data in enumerate(self.VarData):
+		regionIndices = [regionMap[i] for i in data.VarRegionIndex]
+		folded = len(set(regionIndices)) != len(regionIndices)
+
+		for minor,item in enumerate(data.Item):
+
+			if folded:
+				row = defaultdict(int)
+				for regionIdx,v in zip(regionIndices, item):
+					row[regionIdx] += v
+				row = tuple(sorted((i,v) for i,v in row.items() if v))
+			else:
+				row = tuple(sorted((i,v) for i,v in zip(regionIndices, item) if v))
+
+			chars = _sparse_row_characteristics(row)
+			encodings[chars].append(row)
+			front_mapping[(major<<16)+minor] = row
+
+	# Encodings that have no gain are decided as they are; the others are
+	# candidates for merging.
+	done = []
+	todo = []
+	for encoding in encodings.values():
+		if not encoding.gain:
+			done.append(encoding)
+		else:
+			todo.append(encoding)
+	todo.sort(key=_Encoding.sort_key)
+
+	heap = []
+	for i,encoding in enumerate(todo):
+		heap.extend((-gain, i, j) for gain,j in _merge_gains(encoding, todo, i+1))
+	heapq.heapify(heap)
+
+	while heap:
+		_, i, j = heapq.heappop(heap)
+		if todo[i] is None or todo[j] is None:
+			# One of them got merged already
+			continue
+		encoding, other_encoding = todo[i], todo[j]
+		todo[i] = todo[j] = None
+		combined_chars = other_encoding.chars | encoding.chars
+		combined_encoding = _Encoding(combined_chars)
+		combined_encoding.extend(encoding.items)
+		combined_encoding.extend(other_encoding.items)
+		# In case the combined encoding exists already, fold it in.
+		for l,other in enumerate(todo):
+			if other is not None and other.chars == combined_chars:
+				combined_encoding.extend(other.items)
+				todo[l] = None
+		k = len(todo)
+		for gain,l in _merge_gains(combined_encoding, todo):
+			heapq.heappush(heap, (-gain, l, k))
+		todo.append(combined_encoding)
+
+	encodings = done + [encoding for encoding in todo if encoding is not None]
+	encodings.sort(key=_Encoding.sort_key)
+
+	# Assemble final store.
+	back_mapping = {} # Mapping from sparse rows to new VarIdxes
+	self.VarData = []
+	for major,encoding in enumerate(encodings):
+		columns = [col for col in range(encoding.columns.bit_length())
+			   if encoding.columns & (1 << col)]
+		columnIndex = {col:i for i,col in enumerate(columns)}
+		items = []
+		for row in encoding.items:
+			item = [0] * len(columns)
+			for col,v in row:
+				item[columnIndex[col]] = v
+			items.append((item, row))
+		items.sort()
+
+		data = ot.VarData()
+		self.VarData.append(data)
+		data.VarRegionIndex = list(columns)
+		data.VarRegionCount = len(data.VarRegionIndex)
+		data.Item = [item for item,_ in items]
+		for minor,(_,row) in enumerate(items):
+			back_mapping[row] = (major<<16)+minor
+
+	# Compile final mapping.
+	varidx_map = {}
+	for k,v in front_mapping.items():
+		varidx_map[k] = back_mapping[v]
+
+	# Remove unused regions.
+	self.prune_regions()
+
+	# Recalculate things and go home.
+	self.VarRegionList.RegionCount = len(self.VarRegionList.Region)
+	self.VarDataCount = len(self.VarData)
+	for data in self.VarData:
+		data.ItemCount = len(data.Item)
+		VarData_CalculateNumShorts(data)
+
+	return varidx_map
+
+
+def _benchmark_optimize(font, store, fast):
+	"""Optimize a copy of store; returns (seconds, peak memory in bytes or None,
+	compiled size in bytes)."""
+	from fontTools.ttLib.tables.otBase import OTTableWriter
+	from copy import deepcopy
+	import time
+	try:
+		import tracemalloc
+	except ImportError:
+		tracemalloc = None
+
+	store = deepcopy(store)
+	if tracemalloc is not None:
+		tracemalloc.start()
+	start = time.time()
+	store.optimize(fast=fast)
+	elapsed = time.time() - start
+	peak = None
+	if tracemalloc is not None:
+		peak = tracemalloc.get_traced_memory()[1]
+		tracemalloc.stop()
+
+	writer = OTTableWriter()
+	store.compile(writer, font)
+	return elapsed, peak, len(writer.getAllData())
+
+
 def main(args=None):
 	from argparse import ArgumentParser
 	from fontTools import configLogger
@@ -480,6 +799,19 @@ def main(args=None):
 	parser = ArgumentParser(prog='varLib.varStore')
 	parser.add_argument('fontfile')
 	parser.add_argument('outfile', nargs='?')
+	parser.add_argument(
+		'--fast',
+		action='store_true',
+		help='use the optimizer for large stores'
+	)
+	parser.add_argument(
+		'--benchmark',
+		action='store_true',
+		help=(
+			'compare time, peak memory and resulting size of both '
+			'optimizers, instead of optimizing the font'
+		)
+	)
 	options = parser.parse_args(args)
 
 	# TODO: allow user to configure logging via command-line options
@@ -497,7 +829,15 @@ def main(args=None):
 	size = len(writer.getAllData())
 	print("Before: %7d bytes" % size)
 
-	varidx_map = store.optimize()
+	if options.benchmark:
+		for fast in (False, True):
+			elapsed, peak, size = _benchmark_optimize(font, store, fast)
+			print("%-8s %7d bytes %8.3f s %s" % (
+				"fast:" if fast else "default:", size, elapsed,
+				"%8.1f MB peak" % (peak / 1024 / 1024) if peak is not None else ""))
+		return
+
+	varidx_map = store.optimize(fast=options.fast)
 
 	gdef.table.remap_device_varidxes(varidx_map)
 	if 'GPOS' in font:
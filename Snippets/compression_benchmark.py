@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+"""Compare the file size and saving time of WOFF and WOFF2 fonts compressed
+with the various CompressionOptions presets (or with custom brotli quality
+and zlib level settings).
+
+Usage: compression_benchmark.py [-n REPEAT] [-q QUALITY ...] [FONT ...]
+
+Without FONT arguments, the binary fonts in the Tests data directories are
+used. Each -q QUALITY adds a custom setting, using QUALITY both as brotli
+quality (0-11) and, capped at 9, as zlib level.
+"""
+
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.ttLib import TTFont, TTLibError
+from fontTools.ttLib.sfnt import CompressionOptions
+import argparse
+import glob
+import os
+import sys
+import timeit
+
+
+def corpus():
+    testsDir = os.path.join(
+        os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Tests")
+    paths = []
+    for pattern in ("*/data/*", "*/*/data/*"):
+        for path in glob.glob(os.path.join(testsDir, pattern)):
+            if os.path.splitext(path)[1].lower() in (".ttf", ".otf"):
+                paths.append(path)
+    return sorted(paths)
+
+
+def benchmark(data, flavor, compression, repeat):
+    font = TTFont(BytesIO(data), recalcBBoxes=False, recalcTimestamp=False)
+    # tables are left unloaded, so their data is compressed as is
+    font.flavor = flavor
+    out = BytesIO()
+
+    def save():
+        out.seek(0)
+        out.truncate()
+        font.save(out, reorderTables=None, compression=compression)
+
+    seconds = min(timeit.repeat(save, number=1, repeat=repeat))
+    return len(out.getvalue()), seconds
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("fonts", metavar="FONT", nargs="*")
+    parser.add_argument("-n", "--repeat", type=int, default=3)
+    parser.add_argument("-q", "--quality", type=int, action="append", default=[])
+    options = parser.parse_args(args)
+
+    settings = [(name, name) for name in ("fast", "default", "max")]
+    for quality in options.quality:
+        settings.append((
+            "q%d" % quality,
+            CompressionOptions(brotliQuality=quality, zlibLevel=min(quality, 9))))
+
+    paths = options.fonts or corpus()
+    if not paths:
+        print("No fonts found.", file=sys.stderr)
+        return 1
+
+    totals = {}
+    print("%-8s %-6s %-8s %10s %10s  %s" % (
+        "flavor", "ratio", "setting", "bytes", "ms", "font"))
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        for flavor in ("woff", "woff2"):
+            for name, compression in settings:
+                try:
+                    size, seconds = benchmark(data, flavor, compression, options.repeat)
+                except (TTLibError, ImportError) as e:
+                    print("%s: %s" % (path, e), file=sys.stderr)
+                    continue
+                total = totals.setdefault((flavor, name), [0, 0, 0.0])
+                total[0] += len(data)
+                total[1] += size
+                total[2] += seconds
+                print("%-8s %-6.3f %-8s %10d %10.2f  %s" % (
+                    flavor, size / len(data), name, size, seconds * 1000,
+                    os.path.basename(path)))
+
+    print()
+    for flavor in ("woff", "woff2"):
+        for name, _ in settings:
+            if (flavor, name) not in totals:
+                continue
+            origSize, size, seconds = totals[(flavor, name)]
+            print("%-8s %-6.3f %-8s %10d %10.2f  TOTAL" % (
+                flavor, size / origSize, name, size, seconds * 1000))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -2,16 +2,164 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools import subset
 from fontTools.ttLib import TTFont, newTable
+from fontTools.ttLib.tables import otTables as ot
 from fontTools.misc.loggingTools import CapturingLogHandler
 import difflib
 import logging
 import os
+import random
 import shutil
 import sys
 import tempfile
+import timeit
 import unittest
 
 
+def _coverage(glyphs):
+    c = ot.Coverage()
+    c.glyphs = list(glyphs)
+    return c
+
+def _classDef(rnd, glyphs, numClasses):
+    c = ot.ClassDef()
+    c.classDefs = {g: rnd.randrange(1, numClasses)
+                   for g in rnd.sample(glyphs, len(glyphs) // 2)}
+    return c
+
+def _lookupRecords(rnd, numLookups, inputLen):
+    records = []
+    for _ in range(rnd.randint(1, 2)):
+        r = ot.SubstLookupRecord()
+        r.SequenceIndex = rnd.randrange(inputLen)
+        r.LookupListIndex = rnd.randrange(numLookups)
+        records.append(r)
+    return records
+
+def _random_subtable(rnd, glyphs, numLookups):
+    kind = rnd.choice(["single", "multiple", "alternate", "ligature",
+                       "reverse", "context1", "context2", "chain1",
+                       "chain2", "chain3"])
+    pick = lambda n: rnd.sample(glyphs, n)
+    if kind == "single":
+        st = ot.SingleSubst()
+        st.mapping = {g: rnd.choice(glyphs) for g in pick(4)}
+    elif kind == "multiple":
+        st = ot.MultipleSubst()
+        st.mapping = {g: pick(2) for g in pick(3)}
+    elif kind == "alternate":
+        st = ot.AlternateSubst()
+        st.alternates = {g: pick(2) for g in pick(3)}
+    elif kind == "ligature":
+        st = ot.LigatureSubst()
+        st.ligatures = {}
+        for g in pick(3):
+            lig = ot.Ligature()
+            lig.Component = pick(rnd.randint(1, 2))
+            lig.LigGlyph = rnd.choice(glyphs)
+            st.ligatures[g] = [lig]
+    elif kind == "reverse":
+        st = ot.ReverseChainSingleSubst()
+        st.Format = 1
+        st.Coverage = _coverage(pick(3))
+        st.BacktrackCoverage = [_coverage(pick(3))]
+        st.LookAheadCoverage = [_coverage(pick(3))]
+        st.Substitute = pick(3)
+    elif kind in ("context1", "chain1"):
+        chain = kind == "chain1"
+        st = ot.ChainContextSubst() if chain else ot.ContextSubst()
+        st.Format = 1
+        st.Coverage = _coverage(pick(3))
+        ruleSets = []
+        for _ in st.Coverage.glyphs:
+            rs = ot.ChainSubRuleSet() if chain else ot.SubRuleSet()
+            rule = ot.ChainSubRule() if chain else ot.SubRule()
+            rule.Input = pick(rnd.randint(0, 2))
+            if chain:
+                rule.Backtrack = pick(rnd.randint(0, 1))
+                rule.LookAhead = pick(rnd.randint(0, 1))
+            rule.SubstLookupRecord = _lookupRecords(rnd, numLookups, len(rule.Input) + 1)
+            setattr(rs, "ChainSubRule" if chain else "SubRule", [rule])
+            ruleSets.append(rs)
+        if chain:
+            st.ChainSubRuleSet = ruleSets
+            st.ChainSubRuleSetCount = len(ruleSets)
+        else:
+            st.SubRuleSet = ruleSets
+            st.SubRuleSetCount = len(ruleSets)
+    elif kind in ("context2", "chain2"):
+        chain = kind == "chain2"
+        st = ot.ChainContextSubst() if chain else ot.ContextSubst()
+        st.Format = 2
+        st.Coverage = _coverage(pick(6))
+        classDef = _classDef(rnd, glyphs, 4)
+        ruleSets = []
+        for _ in range(4):
+            rs = ot.ChainSubClassSet() if chain else ot.SubClassSet()
+            rule = ot.ChainSubClassRule() if chain else ot.SubClassRule()
+            inputClasses = [rnd.randrange(4) for _ in range(rnd.randint(0, 2))]
+            if chain:
+                rule.Input = inputClasses
+                rule.Backtrack = [rnd.randrange(4) for _ in range(rnd.randint(0, 1))]
+                rule.LookAhead = [rnd.randrange(4) for _ in range(rnd.randint(0, 1))]
+            else:
+                rule.Class = inputClasses
+            rule.SubstLookupRecord = _lookupRecords(rnd, numLookups, len(inputClasses) + 1)
+            setattr(rs, "ChainSubClassRule" if chain else "SubClassRule", [rule])
+            ruleSets.append(rs)
+        if chain:
+            st.InputClassDef = classDef
+            st.BacktrackClassDef = _classDef(rnd, glyphs, 4)
+            st.LookAheadClassDef = _classDef(rnd, glyphs, 4)
+            st.ChainSubClassSet = ruleSets
+            st.ChainSubClassSetCount = len(ruleSets)
+        else:
+            st.ClassDef = classDef
+            st.SubClassSet = ruleSets
+            st.SubClassSetCount = len(ruleSets)
+    else:
+        st = ot.ChainContextSubst()
+        st.Format = 3
+        st.InputCoverage = [_coverage(pick(3)) for _ in range(rnd.randint(1, 3))]
+        st.BacktrackCoverage = [_coverage(pick(5)) for _ in range(rnd.randint(0, 1))]
+        st.LookAheadCoverage = [_coverage(pick(5)) for _ in range(rnd.randint(0, 1))]
+        st.SubstLookupRecord = _lookupRecords(rnd, numLookups, len(st.InputCoverage))
+    return st
+
+def _random_gsub(rnd, glyphs, numLookups=8):
+    lookups = []
+    for _ in range(numLookups):
+        lookup = ot.Lookup()
+        lookup.SubTable = [_random_subtable(rnd, glyphs, numLookups)
+                           for _ in range(rnd.randint(1, 2))]
+        lookups.append(lookup)
+    langSys = ot.LangSys()
+    langSys.ReqFeatureIndex = 0xFFFF
+    langSys.FeatureIndex = [0]
+    script = ot.Script()
+    script.DefaultLangSys = langSys
+    script.LangSysRecord = []
+    scriptRecord = ot.ScriptRecord()
+    scriptRecord.ScriptTag = "DFLT"
+    scriptRecord.Script = script
+    feature = ot.Feature()
+    feature.LookupListIndex = sorted(rnd.sample(range(numLookups), 3))
+    featureRecord = ot.FeatureRecord()
+    featureRecord.FeatureTag = "test"
+    featureRecord.Feature = feature
+    table = ot.GSUB()
+    table.ScriptList = ot.ScriptList()
+    table.ScriptList.ScriptRecord = [scriptRecord]
+    table.FeatureList = ot.FeatureList()
+    table.FeatureList.FeatureRecord = [featureRecord]
+    table.FeatureList.FeatureCount = 1
+    table.LookupList = ot.LookupList()
+    table.LookupList.Lookup = lookups
+    table.LookupList.LookupCount = numLookups
+    gsub = newTable("GSUB")
+    gsub.table = table
+    return gsub
+
+
 class SubsetTest(unittest.TestCase):
     def __init__(self, methodName):
         unittest.TestCase.__init__(self, methodName)
@@ -475,6 +623,161 @@ class SubsetTest(unittest.TestCase):
         subset.main([fontpath, "--recalc-timestamp", "--output-file=%s" % subsetpath, "*"])
         self.assertLess(modified, TTFont(subsetpath)['head'].modified)
 
+    def test_closure_glyphs_GSUB(self):
+        glyphs = ["g%d" % i for i in range(30)]
+        for seed in range(200):
+            rnd = random.Random(seed)
+            gsub = _random_gsub(rnd, glyphs)
+            for _ in range(5):
+                initial = set(rnd.sample(glyphs, rnd.randint(1, 6)))
+                s = subset.Subsetter()
+                s.glyphs = set(initial)
+                gsub.closure_glyphs_iterative(s)
+                expected = s.glyphs
+                s.glyphs = set(initial)
+                gsub.closure_glyphs(s)
+                self.assertEqual(expected, s.glyphs)
+
+    def test_closure_glyphs_GSUB_keeps_table(self):
+        _, fontpath = self.compile_font(self.getpath("Lobster.subset.ttx"), ".otf")
+        font = TTFont(fontpath, lazy=False)
+        subsetter = subset.Subsetter()
+        subsetter.populate(text="fi")
+        subsetter._closure_glyphs(font)
+        # the closure graph is not stored in the table
+        self.assertEqual(font["GSUB"], TTFont(fontpath, lazy=False)["GSUB"])
+
+    def test_session_reuses_closure_graph(self):
+        _, fontpath = self.compile_font(self.getpath("Lobster.subset.ttx"), ".otf")
+        session = subset.SubsetSession(fontpath)
+        session.subset(text="fi")
+        graphs = dict(session._closure_graphs)
+        self.assertEqual(len(graphs), 1)
+        session.subset(text="ff")
+        self.assertEqual(session._closure_graphs, graphs)
+
+    def test_session_matches_subsetter(self):
+        for ttx, suffix, requests in [
+                ("TestTTF-Regular.ttx", ".ttf", [{"text": "AC"}, {"gids": [2]}, {"glyphs": ["*"]}]),
+                ("TestOTF-Regular.ttx", ".otf", [{"text": "a"}, {"unicodes": [0x41]}]),
+                ("TestGVAR.ttx", ".ttf", [{"unicodes": [0x2B, 0x2212]}, {"unicodes": [0x30]}]),
+                ("TestMATH-Regular.ttx", ".otf", [{"unicodes": [0x41, 0x28, 0x302, 0x1D400, 0x1D435]}])]:
+            _, fontpath = self.compile_font(self.getpath(ttx), suffix)
+            options = subset.Options()
+            session = subset.SubsetSession(fontpath, options)
+            for request in requests:
+                if request.get("glyphs") == ["*"]:
+                    request = {"glyphs": TTFont(fontpath).getGlyphOrder()}
+                expectedpath = self.temp_path(suffix)
+                font = subset.load_font(fontpath, options)
+                subsetter = subset.Subsetter(options)
+                subsetter.populate(**request)
+                subsetter.subset(font)
+                subset.save_font(font, expectedpath, options)
+
+                actualpath = self.temp_path(suffix)
+                subset.save_font(session.subset(**request), actualpath, options)
+                with open(expectedpath, "rb") as expected, open(actualpath, "rb") as actual:
+                    self.assertEqual(expected.read(), actual.read())
+            session.close()
+
+    def test_session_independent_subsets(self):
+        _, fontpath = self.compile_font(self.getpath("TestTTF-Regular.ttx"), ".ttf")
+        session = subset.SubsetSession(TTFont(fontpath))
+        font1 = session.subset(gids=[1])
+        font2 = session.subset(gids=[2])
+        self.assertEqual(font1.getGlyphOrder(), [".notdef", "A"])
+        self.assertEqual(font2.getGlyphOrder(), [".notdef", "B"])
+        self.assertEqual(len(font1["glyf"].glyphs), 2)
+        self.assertEqual(len(font2["glyf"].glyphs), 2)
+        self.assertEqual(len(session.font.getGlyphOrder()), 4)
+
+    def test_session_keeps_dropped_tables(self):
+        _, fontpath = self.compile_font(self.getpath("TestCLR-Regular.ttx"), ".ttf")
+        session = subset.SubsetSession(fontpath)
+        # COLR is subsetted to empty and dropped from the first font only
+        font1 = session.subset(text="a")
+        font2 = session.subset(glyphs=["smileface"])
+        # like the font load_font() loads, the subsets are lazy
+        self.assertIs(font1.lazy, True)
+        self.assertNotIn("COLR", font1)
+        self.assertIn("COLR", font2)
+        self.assertIn("smileface", font2["COLR"].ColorLayers)
+
+    def test_session_faster_than_subsetter(self):
+        _, fontpath = self.compile_font(self.getpath("TestOTF-Regular.ttx"), ".otf")
+        options = subset.Options()
+        texts = ["abc", "ABC", "hello", "xyz", "0123"]
+
+        def subset_fonts():
+            for text in texts:
+                font = subset.load_font(fontpath, options)
+                subsetter = subset.Subsetter(options)
+                subsetter.populate(text=text)
+                subsetter.subset(font)
+                font.save(BytesIO())
+
+        session = subset.SubsetSession(fontpath, options)
+
+        def subset_session():
+            for text in texts:
+                session.subset(text=text).save(BytesIO())
+
+        # the session saves loading and pruning the font for each request;
+        # alternate the runs so that both see the same machine load
+        expected = []
+        actual = []
+        for _ in range(10):
+            expected.append(timeit.timeit(subset_fonts, number=1))
+            actual.append(timeit.timeit(subset_session, number=1))
+        session.close()
+        self.assertLess(min(actual), min(expected))
+
+    def test_glyph_id_coverage_and_class_def(self):
+        # decompiled Coverage and ClassDef tables are stored by glyph ID;
+        # subsetting them must give what the ones stored by name give
+        from fontTools.ttLib.tables.otBase import OTTableReader, OTTableWriter
+
+        def decompiled(table):
+            writer = OTTableWriter()
+            table.compile(writer, font)
+            result = table.__class__()
+            result.decompile(OTTableReader(writer.getAllData()), font)
+            return result
+
+        rnd = random.Random(0)
+        glyphs = ['.notdef'] + ['g%d' % i for i in range(1, 500)]
+        font = TTFont()
+        font.setGlyphOrder(glyphs)
+        for _ in range(10):
+            coverage = _coverage(glyphs[i] for i in
+                                 sorted(rnd.sample(range(500), 200)))
+            classDef = _classDef(rnd, glyphs, 8)
+            for size in (5, 100, 450):
+                sel = set(rnd.sample(glyphs, size))
+                byName, byID = coverage, decompiled(coverage)
+                self.assertIsNotNone(byID._getGlyphIDs()[0])
+                self.assertEqual(byID.intersect(sel), byName.intersect(sel))
+                self.assertEqual(byID.intersect_glyphs(sel),
+                                 byName.intersect_glyphs(sel))
+                byName, byID = _coverage(byName.glyphs), byID
+                self.assertEqual(byID.subset(sel), byName.subset(sel))
+                self.assertIsNotNone(byID._getGlyphIDs()[0])
+                self.assertEqual(byID.glyphs, byName.glyphs)
+
+                byName, byID = classDef, decompiled(classDef)
+                self.assertIsNotNone(byID._getGlyphIDRanges()[0])
+                self.assertEqual(byID.intersect(sel), byName.intersect(sel))
+                for klass in range(8):
+                    self.assertEqual(byID.intersect_class(sel, klass),
+                                     byName.intersect_class(sel, klass))
+                byName = ot.ClassDef()
+                byName.classDefs = dict(classDef.classDefs)
+                self.assertEqual(byID.subset(sel, remap=True),
+                                 byName.subset(sel, remap=True))
+                self.assertIsNotNone(byID._getGlyphIDRanges()[0])
+                self.assertEqual(byID.classDefs, byName.classDefs)
+
 
 if __name__ == "__main__":
     sys.exit(unittest.main())
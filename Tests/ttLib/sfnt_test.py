@@ -1,8 +1,60 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
-from fontTools.ttLib.sfnt import calcChecksum
+from fontTools.ttLib import TTFont
+from fontTools.ttLib.sfnt import calcChecksum, CompressionOptions, WOFFFlavorData
+import os
+import zlib
+import pytest
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
 
 
 def test_calcChecksum():
     assert calcChecksum(b"abcd") == 1633837924
     assert calcChecksum(b"abcdxyz") == 3655064932
+
+
+def test_CompressionOptions_presets():
+    options = CompressionOptions.fromValue("fast")
+    assert options.zlibLevel == 1
+    assert options.brotliQuality == 5
+    options = CompressionOptions("max", brotliWindow=20)
+    assert options.brotliWindow == 20
+    assert CompressionOptions.fromValue(options) is options
+    assert CompressionOptions.fromValue(None).zlibLevel is None
+    with pytest.raises(ValueError):
+        CompressionOptions("slow")
+
+
+def _woffNameTable(compression=None, flavorDataCompression=None):
+    font = TTFont(recalcBBoxes=False, recalcTimestamp=False, flavor="woff")
+    font.importXML(os.path.join(DATA_DIR, "TestTTF-Regular.ttx"))
+    if flavorDataCompression is not None:
+        font.flavorData = WOFFFlavorData()
+        font.flavorData.compression = flavorDataCompression
+    buf = BytesIO()
+    font.save(buf, compression=compression)
+    buf.seek(0)
+    woff = TTFont(buf)
+    name = woff.reader.tables["name"]
+    buf.seek(name.offset)
+    return buf.read(name.length), name.origLength
+
+
+@pytest.mark.parametrize("compression", [
+    "fast", CompressionOptions(zlibLevel=9), CompressionOptions(zlibLevel=0)])
+def test_save_woff_compression(compression):
+    level = CompressionOptions.fromValue(compression).zlibLevel
+    rawData, origLength = _woffNameTable(compression)
+    if level == 0:
+        # compressing doesn't make the table any smaller, so it's stored as is
+        assert len(rawData) == origLength
+    else:
+        data = zlib.decompress(rawData)
+        assert rawData == zlib.compress(data, level)
+
+
+def test_save_woff_flavorData_compression():
+    assert _woffNameTable("fast") == _woffNameTable(
+        flavorDataCompression="fast")
@@ -0,0 +1,189 @@
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.ttLib import TTFont, TTCollection, TableCache
+from fontTools.ttLib.sfnt import writeTTCHeader
+import os
+import struct
+import pytest
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def test_get_set():
+    cache = TableCache()
+    key = cache.makeKey("name", b"abcd")
+    assert key == cache.makeKey(b"name", b"abcd")
+    assert key != cache.makeKey("name", b"abce")
+    assert key != cache.makeKey("post", b"abcd")
+    assert cache.get(key) is None
+    table = object()
+    cache[key] = table
+    assert key in cache
+    assert cache.get(key) is table
+    assert (cache.hits, cache.misses) == (1, 1)
+    cache.clear()
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_lru_eviction():
+    cache = TableCache(maxsize=2)
+    keys = [cache.makeKey("name", tobytes(str(i))) for i in range(3)]
+    cache[keys[0]] = 0
+    cache[keys[1]] = 1
+    assert cache.get(keys[0]) == 0  # now keys[1] is least recently used
+    cache[keys[2]] = 2
+    assert len(cache) == 2
+    assert keys[1] not in cache
+    assert keys[0] in cache and keys[2] in cache
+
+
+def test_unbounded():
+    cache = TableCache(maxsize=None)
+    for i in range(300):
+        cache[cache.makeKey("name", tobytes(str(i)))] = i
+    assert len(cache) == 300
+
+
+def test_bad_maxsize():
+    with pytest.raises(ValueError):
+        TableCache(maxsize=-1)
+
+
+@pytest.fixture
+def fontdata():
+    font = TTFont()
+    font.importXML(os.path.join(DATA_DIR, "TestTTF-Regular.ttx"))
+    buf = BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+def test_shared_between_fonts(fontdata):
+    cache = TableCache()
+    font1 = TTFont(BytesIO(fontdata), tableCache=cache)
+    font2 = TTFont(BytesIO(fontdata), tableCache=cache)
+    assert font1["name"] is font2["name"]
+    assert (cache.hits, cache.misses) == (1, 1)
+    # the cached table is kept by the font, no further lookups
+    font2["name"]
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_collection(fontdata):
+    buf = BytesIO()
+    offsets_offset = writeTTCHeader(buf, 2)
+    offsets = []
+    for i in range(2):
+        offsets.append(buf.tell())
+        TTFont(BytesIO(fontdata))._save(buf)
+        buf.seek(0, 2)
+    buf.seek(offsets_offset)
+    buf.write(struct.pack(">2L", *offsets))
+
+    collection = TTCollection(BytesIO(buf.getvalue()), shareTables=True)
+    assert collection[0]["name"] is collection[1]["name"]
+
+    cache = TableCache()
+    first = TTCollection(BytesIO(buf.getvalue()), tableCache=cache)
+    second = TTCollection(BytesIO(buf.getvalue()), tableCache=cache)
+    assert first[0]["OS/2"] is second[1]["OS/2"]
+    assert cache.misses == 1
+
+
+def _variant(fontdata, modify):
+    font = TTFont(BytesIO(fontdata))
+    modify(font)
+    buf = BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+def test_glyph_order_in_key(fontdata):
+    def rename(font):
+        glyphOrder = font.getGlyphOrder()
+        font["post"]
+        font.setGlyphOrder([".notdef", "Z"] + glyphOrder[2:])
+    cache = TableCache()
+    font1 = TTFont(BytesIO(fontdata), tableCache=cache)
+    font2 = TTFont(BytesIO(_variant(fontdata, rename)), tableCache=cache)
+    assert font1.getTableData("hmtx") == font2.getTableData("hmtx")
+    # the metrics are keyed by different glyph names
+    assert font1["hmtx"] is not font2["hmtx"]
+    assert "Z" in font2["hmtx"].metrics
+    assert font1["name"] is font2["name"]
+
+
+def test_dependencies_in_key(fontdata):
+    def setRevision(font):
+        font["head"].fontRevision += 1
+    cache = TableCache()
+    font1 = TTFont(BytesIO(fontdata), tableCache=cache)
+    font2 = TTFont(BytesIO(fontdata), tableCache=cache)
+    font3 = TTFont(BytesIO(_variant(fontdata, setRevision)), tableCache=cache)
+    assert font1.getTableData("loca") == font3.getTableData("loca")
+    # 'loca' is read according to 'head'
+    assert font1["loca"] is font2["loca"]
+    assert font1["loca"] is not font3["loca"]
+    assert list(font1["loca"]) == list(font3["loca"])
+
+
+def test_markDirty_unshares(fontdata):
+    cache = TableCache()
+    font1 = TTFont(BytesIO(fontdata), tableCache=cache)
+    font2 = TTFont(BytesIO(fontdata), tableCache=cache)
+    name = font1["name"]
+    assert font2["name"] is name
+    font2.markDirty("name")
+    assert font2["name"] is not name
+    font2["name"].setName("Changed", 1, 3, 1, 0x409)
+    assert name.getDebugName(1) != "Changed"
+    # a table marked dirty is never shared again
+    assert font1["name"] is name
+    assert TTFont(BytesIO(fontdata), tableCache=cache)["name"] is name
+
+
+def test_save_keeps_shared_tables(fontdata):
+    cache = TableCache()
+    font1 = TTFont(BytesIO(fontdata), tableCache=cache)
+    font2 = TTFont(BytesIO(fontdata), tableCache=cache)
+    loca = list(font1["loca"])
+    modified = font1["head"].modified
+    font2.markDirty("glyf")
+    glyph = font2["glyf"]["period"]
+    glyph.coordinates.translate((0, 1000))
+    font2.save(BytesIO())
+    # compiling 'glyf' and 'head' updated font2's own copies only
+    assert font2["loca"] is not font1["loca"]
+    assert list(font1["loca"]) == loca
+    assert font2["head"] is not font1["head"]
+    assert font1["head"].modified == modified
+
+
+def test_subset_shared_tables(fontdata):
+    from fontTools import subset
+    cache = TableCache()
+    font1 = TTFont(BytesIO(fontdata), tableCache=cache)
+    font2 = TTFont(BytesIO(fontdata), tableCache=cache)
+    cmap = font1["cmap"].getBestCmap()
+    assert font2["cmap"] is font1["cmap"]
+    subsetter = subset.Subsetter()
+    subsetter.populate(glyphs=["period"])
+    subsetter.subset(font2)
+    assert font2.getGlyphOrder() == [".notdef", "period"]
+    assert font1["cmap"].getBestCmap() == cmap
+    assert len(font1["hmtx"].metrics) == len(font1.getGlyphOrder())
+
+
+def test_shared_CFF():
+    font = TTFont()
+    font.importXML(os.path.join(DATA_DIR, "TestOTF-Regular.otx"))
+    buf = BytesIO()
+    font.save(buf)
+    cache = TableCache()
+    font1 = TTFont(BytesIO(buf.getvalue()), tableCache=cache)
+    font2 = TTFont(BytesIO(buf.getvalue()), tableCache=cache)
+    assert font1["CFF "] is font2["CFF "]
+    assert font1.getGlyphOrder() == font2.getGlyphOrder() == font.getGlyphOrder()
+    assert font1["post"] is not font2["post"]
@@ -8,6 +8,7 @@ from fontTools.misc.xmlWriter import XMLWriter
 from fontTools.ttLib.tables.TupleVariation import \
 	log, TupleVariation, compileSharedTuples, decompileSharedTuples, \
 	compileTupleVariationStore, decompileTupleVariationStore, inferRegion_
+import array
 import random
 import unittest
 
@@ -663,6 +664,54 @@ class TupleVariationTest(unittest.TestCase):
 			                             data=b"", pos=4, dataPos=4),
 			[])
 
+	def test_deltaArrays(self):
+		mask = bytearray([1, 0, 1])
+		var = TupleVariation.fromDeltaArrays(
+			{"wght": (0.0, 1.0, 1.0)}, mask,
+			array.array("h", [1, 0, -300]), array.array("h", [2, 0, 4]))
+		self.assertTrue(var.hasImpact())
+		self.assertEqual(var.getUsedPoints(), {0, 2})
+		self.assertEqual(hexencode(var.compileDeltas({0, 2})),
+		                 "00 01 40 FE D4 01 02 04")
+		self.assertEqual(var.getDeltaArrays()[0], mask)
+		self.assertEqual(var.coordinates, [(1, 2), None, (-300, 4)])
+		var.coordinates[1] = (5, 6)
+		self.assertEqual(var.getDeltaArrays(), (
+			bytearray([1, 1, 1]),
+			array.array("d", [1, 5, -300]), array.array("d", [2, 6, 4])))
+
+	def test_deltaArrays_cvar(self):
+		var = TupleVariation.fromDeltaArrays(
+			{"wght": (0.0, 1.0, 1.0)}, bytearray(2), array.array("h", [0, 0]))
+		self.assertFalse(var.hasImpact())
+		self.assertEqual(var.coordinates, [None, None])
+		var = TupleVariation({"wght": (0.0, 1.0, 1.0)}, [7, None])
+		self.assertEqual(var.getDeltaArrays(),
+		                 (bytearray([1, 0]), array.array("d", [7, 0]), None))
+
+	def test_decompileTupleVariationStore_deltaArrays(self):
+		deltas = [(1, 1), None, (3, 300), (4, -4)]
+		variations = [
+			TupleVariation({"wght": (0.0, 1.0, 1.0)}, deltas),
+			TupleVariation({"wdth": (0.0, 1.0, 1.0)}, [(5, 5)] * 4),
+		]
+		tupleVariationCount, tuples, data = compileTupleVariationStore(
+			variations, pointCount=4, axisTags=["wght", "wdth"],
+			sharedTupleIndices={})
+		decompiled = decompileTupleVariationStore(
+			"gvar", ["wght", "wdth"], tupleVariationCount, pointCount=4,
+			sharedTuples={}, data=(tuples + data), pos=0, dataPos=len(tuples))
+		mask, deltasX, deltasY = decompiled[0].getDeltaArrays()
+		self.assertEqual(mask, bytearray([1, 0, 1, 1]))
+		self.assertEqual(list(deltasY), [1, 0, 300, -4])
+		# compiling the array-backed variations gives back the same data
+		self.assertEqual(
+			compileTupleVariationStore(
+				decompiled, pointCount=4, axisTags=["wght", "wdth"],
+				sharedTupleIndices={}),
+			(tupleVariationCount, tuples, data))
+		self.assertEqual(decompiled, variations)
+
 	def test_getTupleSize(self):
 		getTupleSize = TupleVariation.getTupleSize_
 		numAxes = 3
@@ -2,7 +2,8 @@ from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
 from fontTools.misc.fixedTools import otRound
 from fontTools.ttLib import TTFont, newTable
-from fontTools.ttLib.tables._g_l_y_f import GlyphCoordinates
+from fontTools.ttLib.tables._g_l_y_f import (
+    Glyph, GlyphCoordinates, LazyGlyphs)
 import sys
 import array
 import pytest
@@ -215,6 +216,56 @@ class glyfTableTest(unittest.TestCase):
         glyfData = glyfTable.compile(font)
         self.assertEqual(glyfData, self.glyfData)
 
+    def _lazyFont(self):
+        font = TTFont(sfntVersion="\x00\x01\x00\x00", lazy=True,
+                      recalcBBoxes=False)
+        font['head'] = newTable('head')
+        font['loca'] = newTable('loca')
+        font['maxp'] = newTable('maxp')
+        font['maxp'].decompile(self.maxpData, font)
+        font['head'].decompile(self.headData, font)
+        font['loca'].decompile(self.locaData, font)
+        glyfTable = font['glyf'] = newTable('glyf')
+        glyfTable.decompile(self.glyfData, font)
+        return font
+
+    def test_decompile_lazy(self):
+        font = self._lazyFont()
+        glyfTable = font['glyf']
+        glyphs = glyfTable.glyphs
+        self.assertIsInstance(glyphs, LazyGlyphs)
+        glyphOrder = font.getGlyphOrder()
+        self.assertEqual(len(glyfTable), len(glyphOrder))
+        self.assertEqual(sorted(glyfTable.keys()), sorted(glyphOrder))
+        self.assertFalse(any(glyphs.isLoaded(g) for g in glyphOrder))
+        glyph = glyfTable[glyphOrder[1]]
+        self.assertTrue(glyphs.isLoaded(glyphOrder[1]))
+        self.assertFalse(glyphs.isLoaded(glyphOrder[2]))
+        self.assertIs(glyfTable[glyphOrder[1]], glyph)
+
+    def test_compile_lazy_passthrough(self):
+        font = self._lazyFont()
+        glyfTable = font['glyf']
+        glyfTable[font.getGlyphOrder()[1]]
+        self.assertEqual(glyfTable.compile(font), self.glyfData)
+        self.assertEqual(
+            sum(glyfTable.glyphs.isLoaded(g) for g in glyfTable.keys()), 1)
+
+    def test_compile_lazy_modified(self):
+        font = self._lazyFont()
+        glyfTable = font['glyf']
+        glyphName = font.getGlyphOrder()[1]
+        del glyfTable[glyphName]
+        glyfTable[glyphName] = Glyph()
+        glyfTable.glyphOrder = font.getGlyphOrder()
+        data = glyfTable.compile(font)
+
+        font2 = TTFont(sfntVersion="\x00\x01\x00\x00")
+        font2.importXML(GLYF_TTX)
+        font2['glyf'][glyphName] = Glyph()
+        font2.recalcBBoxes = False
+        self.assertEqual(data, font2['glyf'].compile(font2))
+
 
 if __name__ == "__main__":
     import sys
@@ -5,6 +5,7 @@ from fontTools.misc.textTools import deHexStr, hexStr
 from fontTools.ttLib import TTLibError, getTableClass, getTableModule, newTable
 import unittest
 from fontTools.ttLib.tables.TupleVariation import TupleVariation
+from fontTools.ttLib.tables._g_v_a_r import LazyVariations
 
 
 gvarClass = getTableClass("gvar")
@@ -172,6 +173,34 @@ class GVARTableTest(unittest.TestCase):
 		self.assertEqual(gvar.variations,
 		                 {".notdef": [], "space": [], "I": []})
 
+	def test_decompile_lazy(self):
+		font, gvar = self.makeFont({})
+		font.lazy = True
+		gvar.decompile(GVAR_DATA, font)
+		self.assertIsInstance(gvar.variations, LazyVariations)
+		self.assertEqual(sorted(gvar.variations), sorted(GVAR_VARIATIONS))
+		self.assertFalse(gvar.variations.isLoaded("I"))
+		self.assertEqual(gvar.variations["I"], GVAR_VARIATIONS["I"])
+		self.assertTrue(gvar.variations.isLoaded("I"))
+		self.assertFalse(gvar.variations.isLoaded("space"))
+		self.assertEqual(dict(gvar.variations), GVAR_VARIATIONS)
+
+	def test_compile_lazy(self):
+		font, gvar = self.makeFont({})
+		font.lazy = True
+		gvar.decompile(GVAR_DATA, font)
+		self.assertEqual(gvar.variations.getRawGlyphData("I"), GVAR_DATA[52:])
+		self.assertEqual(hexStr(gvar.compile(font)), hexStr(GVAR_DATA))
+		gvar.variations["space"][0].coordinates[0] = (5, 55)
+		self.assertIsNone(gvar.variations.getRawGlyphData("space"))
+		data = gvar.compile(font)
+		# the variation data of "I" is copied as is
+		self.assertTrue(data.endswith(GVAR_DATA[52:]))
+		font2, gvar2 = self.makeFont({})
+		gvar2.decompile(data, font2)
+		self.assertEqual(gvar2.variations["space"][0].coordinates[0], (5, 55))
+		self.assertEqual(gvar2.variations["I"], GVAR_VARIATIONS["I"])
+
 	def test_fromXML(self):
 		font, gvar = self.makeFont({})
 		for name, attrs, content in parseXML(GVAR_XML):
@@ -32,6 +32,12 @@ class OTTableReaderTest(unittest.TestCase):
                          [0xDEAD, 0xBEEF, 0xCAFE])
         self.assertEqual(reader.pos, 6)
 
+    def test_readArray(self):
+        reader = OTTableReader(deHexStr("DE AD BE EF CA FE F0 0D"))
+        self.assertEqual(list(reader.readArray("l", 2)),
+                         [-559038737, -889262067])
+        self.assertEqual(reader.pos, 8)
+
     def test_readUInt24(self):
         reader = OTTableReader(deHexStr("C3 13 37"))
         self.assertEqual(reader.readUInt24(), 0xC31337)
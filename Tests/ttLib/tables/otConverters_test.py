@@ -5,9 +5,12 @@ from fontTools.misc.py23 import *
 from fontTools.misc.loggingTools import CapturingLogHandler
 from fontTools.misc.testTools import FakeFont, makeXMLWriter
 from fontTools.misc.textTools import deHexStr
+import fontTools.ttLib.tables.otTables as otTables
 import fontTools.ttLib.tables.otConverters as otConverters
 from fontTools.ttLib import newTable
-from fontTools.ttLib.tables.otBase import OTTableReader, OTTableWriter
+from fontTools.ttLib.tables.otBase import (
+    OTTableReader, OTTableWriter, ValueRecordFactory)
+import struct
 import unittest
 
 
@@ -82,6 +85,17 @@ class GlyphIDTest(unittest.TestCase):
         self.converter.write(writer, self.font, {}, "B")
         self.assertEqual(writer.getData(), deHexStr("0002"))
 
+    def test_writeArray(self):
+        writer = OTTableWriter()
+        self.converter.writeArray(writer, self.font, {}, ["B", "A", "C"])
+        self.assertEqual(writer.getData(), deHexStr("0002 0001 0003"))
+
+    def test_writeArray_missingGlyph(self):
+        writer = OTTableWriter()
+        with self.assertRaises(KeyError) as cm:
+            self.converter.writeArray(writer, self.font, {}, ["B", "X"])
+        self.assertTrue(cm.exception.args[-1].endswith("[1]"))
+
 
 class LongTest(unittest.TestCase):
     font = FakeFont([])
@@ -97,6 +111,22 @@ class LongTest(unittest.TestCase):
         self.converter.write(writer, self.font, {}, -16777213)
         self.assertEqual(writer.getData(), deHexStr("FF000003"))
 
+    def test_readArray(self):
+        reader = OTTableReader(deHexStr("FF0000EE 00000001"))
+        self.assertEqual(self.converter.readArray(reader, self.font, {}, 2),
+                         [-16776978, 1])
+        self.assertEqual(reader.pos, 8)
+
+    def test_readArray_truncated(self):
+        reader = OTTableReader(deHexStr("FF0000EE 00000001"))
+        with self.assertRaises(struct.error):
+            self.converter.readArray(reader, self.font, {}, 3)
+
+    def test_writeArray(self):
+        writer = OTTableWriter()
+        self.converter.writeArray(writer, self.font, {}, [-16777213, 1])
+        self.assertEqual(writer.getData(), deHexStr("FF000003 00000001"))
+
     def test_xmlRead(self):
         value = self.converter.xmlRead({"value": "314159"}, [], self.font)
         self.assertEqual(value, 314159)
@@ -183,6 +213,51 @@ class UInt8Test(unittest.TestCase):
         self.assertEqual(xml, '<Foo attr="v" value="251"/>')
 
 
+class StructTest(unittest.TestCase):
+    font = FakeFont(".notdef A B C D".split())
+
+    def test_readArray_fixedSizeRecords(self):
+        converter = otConverters.Struct(
+            "RangeRecord", "RangeCount", 0, otTables.RangeRecord)
+        reader = OTTableReader(deHexStr("0001 0002 0000 0004 DEAD 0002"))
+        records = converter.readArray(reader, self.font, {}, 2)
+        self.assertEqual(reader.pos, 12)
+        self.assertEqual([r.__dict__ for r in records], [
+            {"Start": "A", "End": "B", "StartCoverageIndex": 0},
+            {"Start": "D", "End": "glyph57005", "StartCoverageIndex": 2}])
+
+    def test_writeArray_fixedSizeRecords(self):
+        converter = otConverters.Struct(
+            "RangeRecord", "RangeCount", 0, otTables.RangeRecord)
+        record = otTables.RangeRecord()
+        record.Start, record.End, record.StartCoverageIndex = "B", "D", 7
+        writer = OTTableWriter()
+        converter.writeArray(writer, self.font, {}, [record, record])
+        self.assertEqual(writer.getData(), deHexStr("0002 0004 0007") * 2)
+
+    def test_writeArray_fixedSizeRecords_badValue(self):
+        converter = otConverters.Struct(
+            "RangeRecord", "RangeCount", 0, otTables.RangeRecord)
+        record = otTables.RangeRecord()
+        record.Start, record.End, record.StartCoverageIndex = "B", "D", -1
+        writer = OTTableWriter()
+        with self.assertRaises(AssertionError) as cm:
+            converter.writeArray(writer, self.font, {}, [record])
+        self.assertEqual(cm.exception.args[-1], "RangeRecord[0]")
+
+    def test_readArray_valueRecords(self):
+        converter = otConverters.Struct(
+            "PairValueRecord", "PairValueCount", 0, otTables.PairValueRecord)
+        reader = OTTableReader(deHexStr("0003 FFFE 0004 0010"))
+        reader["ValueFormat1"] = ValueRecordFactory(0x0004)  # XAdvance
+        reader["ValueFormat2"] = ValueRecordFactory(0)
+        records = converter.readArray(reader, self.font, {}, 2)
+        self.assertEqual(reader.pos, 8)
+        self.assertEqual(
+            [(r.SecondGlyph, r.Value1.__dict__, r.Value2) for r in records],
+            [("C", {"XAdvance": -2}, None), ("D", {"XAdvance": 16}, None)])
+
+
 class AATLookupTest(unittest.TestCase):
     font = FakeFont(".notdef A B C D E F G H A.alt B.alt".split())
     converter = otConverters.AATLookup("AATLookup", 0, None,
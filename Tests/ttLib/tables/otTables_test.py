@@ -3,10 +3,12 @@ from __future__ import print_function, division, absolute_import, unicode_litera
 from fontTools.misc.py23 import *
 from fontTools.misc.testTools import getXML, parseXML, FakeFont
 from fontTools.misc.textTools import deHexStr, hexStr
+from fontTools.misc.loggingTools import CapturingLogHandler
 from fontTools.misc.xmlWriter import XMLWriter
 from fontTools.ttLib.tables.otBase import OTTableReader, OTTableWriter
 import fontTools.ttLib.tables.otTables as otTables
 import unittest
+import pytest
 
 
 def makeCoverage(glyphs):
@@ -591,6 +593,298 @@ def test_splitMarkBasePos():
 	assert newSubTable.BaseArray.BaseRecord[1].BaseAnchor[0] == buildAnchor(300, 0)
 
 
+def _buildOverflowingGPOS(numLookups, numGlyphs=85):
+	# PairPos format 1 lookups, each with a single subtable that's too big
+	# for 16-bit offsets to its PairSets
+	from fontTools.otlLib.builder import buildLookup, buildPairPosGlyphs
+	from fontTools.ttLib import TTFont, newTable
+
+	glyphOrder = [".notdef"] + ["g%d" % i for i in range(numGlyphs)]
+	font = TTFont()
+	font.setGlyphOrder(glyphOrder)
+	glyphMap = font.getReverseGlyphMap()
+	lookups = []
+	for i in range(numLookups):
+		pairs = {}
+		for j, first in enumerate(glyphOrder[1:]):
+			for k, second in enumerate(glyphOrder[1:]):
+				value = otTables.ValueRecord()
+				value.XPlacement = value.YPlacement = i
+				value.XAdvance = value.YAdvance = j - k
+				pairs[(first, second)] = (value, None)
+		lookups.append(buildLookup(buildPairPosGlyphs(pairs, glyphMap)))
+	gpos = otTables.GPOS()
+	gpos.Version = 0x00010000
+	gpos.ScriptList = otTables.ScriptList()
+	gpos.ScriptList.ScriptRecord = []
+	gpos.FeatureList = otTables.FeatureList()
+	gpos.FeatureList.FeatureRecord = []
+	gpos.LookupList = otTables.LookupList()
+	gpos.LookupList.Lookup = lookups
+	font["GPOS"] = newTable("GPOS")
+	font["GPOS"].table = gpos
+	return font
+
+
+def test_fixOverFlows():
+	from fontTools.ttLib import newTable
+	from fontTools.ttLib.tables.otBase import OTLOffsetOverflowError
+
+	font = _buildOverflowingGPOS(2)
+	table = font["GPOS"]
+	writer = OTTableWriter(tableTag="GPOS")
+	table.table.compile(writer, font)
+	with pytest.raises(OTLOffsetOverflowError) as excinfo:
+		writer.getAllData()
+	# every overflowing offset is reported, not just the first one
+	overflows = excinfo.value.values
+	assert overflows[0] is excinfo.value.value
+	assert set((r.LookupListIndex, r.SubTableIndex) for r in overflows) == {
+		(0, 0), (1, 0), (1, None)}
+
+	data = table.compile(font)
+	lookups = table.table.LookupList.Lookup
+	assert [len(lookup.SubTable) for lookup in lookups] == [2, 2]
+	newTable_ = newTable("GPOS")
+	newTable_.decompile(data, font)
+	assert newTable_.compile(font) == data
+
+
+def test_compile_large_GPOS_hashes_each_subtable_once(monkeypatch):
+	from fontTools.ttLib.tables import otBase
+
+	font = _buildOverflowingGPOS(3, numGlyphs=40)
+	table = font["GPOS"]
+	writer = OTTableWriter(tableTag="GPOS")
+	table.table.compile(writer, font)
+
+	writers = {}
+	stack = [writer]
+	while stack:
+		w = stack.pop()
+		if id(w) not in writers:
+			writers[id(w)] = w
+			stack.extend(item for item in w.items if hasattr(item, "getData"))
+
+	hashed = []
+	def countingHash(obj):
+		if isinstance(obj, tuple):
+			hashed.append(obj)
+		return hash(obj)
+	monkeypatch.setattr(otBase, "hash", countingHash, raising=False)
+
+	data = writer.getAllData()
+	# the items of every subtable are hashed exactly once while interning,
+	# instead of once for every table above it
+	assert len(hashed) == len(writers)
+	monkeypatch.undo()
+
+	assert table.compile(font) == data
+
+
+def _buildLazyGSUB(mappings):
+	from fontTools.otlLib.builder import buildLookup, buildSingleSubstSubtable
+	from fontTools.ttLib import TTFont, newTable
+
+	font = TTFont()
+	font.setGlyphOrder([".notdef"] + ["g%d" % i for i in range(20)])
+	gsub = otTables.GSUB()
+	gsub.Version = 0x00010000
+	gsub.ScriptList = otTables.ScriptList()
+	gsub.ScriptList.ScriptRecord = []
+	gsub.FeatureList = otTables.FeatureList()
+	gsub.FeatureList.FeatureRecord = []
+	gsub.LookupList = otTables.LookupList()
+	gsub.LookupList.Lookup = [
+		buildLookup([buildSingleSubstSubtable(mapping)]) for mapping in mappings]
+	font["GSUB"] = newTable("GSUB")
+	font["GSUB"].table = gsub
+	data = font["GSUB"].compile(font)
+
+	font.lazy = True
+	font["GSUB"] = newTable("GSUB")
+	font["GSUB"].decompile(data, font)
+	return font, data
+
+
+def _dumpGSUB(data, font):
+	from fontTools.ttLib import newTable
+
+	table = newTable("GSUB")
+	table.decompile(data, font)
+	writer = XMLWriter(BytesIO())
+	table.toXML(writer, font)
+	return writer.file.getvalue()
+
+
+def test_compile_lazy_copies_untouched_lookups():
+	mappings = [
+		{"g%d" % j: "g%d" % (j + 1) for j in range(i, i + 8)}
+		for i in range(12)]
+	font, data = _buildLazyGSUB(mappings)
+	lookups = font["GSUB"].table.LookupList.Lookup
+	lookups[3].SubTable[0].mapping["g3"] = "g0"
+	mappings[3]["g3"] = "g0"
+	newData = font["GSUB"].compile(font)
+
+	# only the modified lookup was decompiled, the others were copied
+	assert ["reader" in lookup.__dict__ for lookup in lookups] == [
+		i != 3 for i in range(12)]
+	start, end = lookups[0].getDataSpan()
+	assert data[start:end] in newData
+
+	expected, _ = _buildLazyGSUB(mappings)
+	assert _dumpGSUB(newData, font) == _dumpGSUB(
+		expected["GSUB"].compile(expected), expected)
+
+
+def test_compile_lazy_shared_subtables():
+	# the two subtables share the Coverage written after the second one, so
+	# the first one has no contiguous span of data and is compiled as usual
+	mappings = [{"g1": "g2", "g3": "g4"}, {"g1": "g3", "g3": "g5"}]
+	font, data = _buildLazyGSUB(mappings)
+	subTables = [
+		lookup.SubTable[0]
+		for lookup in font["GSUB"].table.LookupList.Lookup]
+	assert subTables[0].getDataSpan() is None
+	assert "reader" not in subTables[0].__dict__
+	assert subTables[0].mapping == mappings[0]
+	assert subTables[1].getDataSpan() is not None
+
+	# the copied data of the second subtable includes its own Coverage, so
+	# the first one now gets a separate copy of it
+	newData = font["GSUB"].compile(font)
+	assert len(newData) == len(data) + 8
+	assert _dumpGSUB(newData, font) == _dumpGSUB(data, font)
+
+
+def _makeRangeRecord(recordClass, start, end, **kwargs):
+	record = recordClass()
+	record.Start = start
+	record.End = end
+	record.__dict__.update(kwargs)
+	return record
+
+
+def test_Coverage_postRead_format2_out_of_range():
+	from fontTools.ttLib import TTFont
+
+	font = TTFont()
+	font.setGlyphOrder([".notdef", "A", "B", "C", "D"])
+	table = otTables.Coverage()
+	table.Format = 2
+	rawTable = {"RangeRecord": [
+		_makeRangeRecord(otTables.RangeRecord, "A", "B", StartCoverageIndex=0),
+		_makeRangeRecord(otTables.RangeRecord, "D", "glyph65535", StartCoverageIndex=2),
+		_makeRangeRecord(otTables.RangeRecord, "glyph00009", "glyph00010", StartCoverageIndex=3),
+	]}
+	with CapturingLogHandler(otTables.log, "WARNING") as captor:
+		table.postRead(rawTable, font)
+	assert table.glyphs == ["A", "B", "D"]
+	captor.assertRegex("start glyph ID out of range: glyph00009")
+	assert len(captor.records) == 1
+
+
+def test_ClassDef_postRead_format2_out_of_range():
+	from fontTools.ttLib import TTFont
+
+	font = TTFont()
+	font.setGlyphOrder([".notdef", "A", "B", "C", "D"])
+	table = otTables.ClassDef()
+	table.Format = 2
+	rawTable = {"ClassRangeRecord": [
+		_makeRangeRecord(otTables.ClassRangeRecord, "A", "B", Class=1),
+		_makeRangeRecord(otTables.ClassRangeRecord, "C", "glyph00012", Class=2),
+		_makeRangeRecord(otTables.ClassRangeRecord, "glyph00009", "glyph00010", Class=3),
+	]}
+	with CapturingLogHandler(otTables.log, "WARNING") as captor:
+		table.postRead(rawTable, font)
+	assert table.classDefs == {"A": 1, "B": 1, "C": 2, "D": 2}
+	captor.assertRegex("end glyph ID out of range: glyph00012")
+	captor.assertRegex("start glyph ID out of range: glyph00009")
+
+
+def _decompileTable(tableClass, data, font):
+	table = tableClass()
+	table.decompile(OTTableReader(deHexStr(data)), font)
+	return table
+
+
+def _compileTable(table, font):
+	writer = OTTableWriter()
+	table.compile(writer, font)
+	return hexStr(writer.getAllData())
+
+
+def test_Coverage_decompile_glyph_ids():
+	font = FakeFont([".notdef", "A", "B", "C", "D", "E"])
+	# Format 2: B-D and A, sorted by StartCoverageIndex
+	data = "0002 0002 0001 0001 0000 0002 0004 0001"
+	table = _decompileTable(otTables.Coverage, data, font)
+	glyphIDs, glyphOrder = table._getGlyphIDs()
+	assert list(glyphIDs) == [1, 2, 3, 4]
+	assert glyphOrder.glyphOrder is font.getGlyphOrder()
+	assert _compileTable(table, font) == "00020001000100040000"
+
+	assert table.glyphs == ["A", "B", "C", "D"]
+	assert table._getGlyphIDs() == (None, None)
+	assert _compileTable(table, font) == "00020001000100040000"
+
+	table.glyphs = ["A", "C"]
+	assert _compileTable(table, font) == "0001000200010003"
+
+
+def test_Coverage_decompile_unsorted():
+	font = FakeFont([".notdef", "A", "B", "C"])
+	table = _decompileTable(otTables.Coverage, "0001 0002 0003 0001", font)
+	assert table._getGlyphIDs() == (None, None)
+	assert table.glyphs == ["C", "A"]
+
+
+def test_Coverage_eq_copy():
+	import copy
+
+	font = FakeFont([".notdef", "A", "B", "C"])
+	table = _decompileTable(otTables.Coverage, "0001 0002 0001 0003", font)
+	other = makeCoverage(["A", "C"])
+	other.Format = 1
+	assert table == other
+	other.glyphs = ["A", "B"]
+	assert table != other
+	tableCopy = copy.deepcopy(table)
+	assert tableCopy._getGlyphIDs()[1] is table._getGlyphIDs()[1]
+	tableCopy.glyphs.append("B")
+	assert table.glyphs == ["A", "C"]
+
+
+def test_ClassDef_decompile_glyph_ids():
+	font = FakeFont([".notdef", "A", "B", "C", "D", "E"])
+	# Format 1: A=1 B=1 C=0 D=2 E=2
+	data = "0001 0001 0005 0001 0001 0000 0002 0002"
+	table = _decompileTable(otTables.ClassDef, data, font)
+	starts, ends, classes, glyphOrder = table._getGlyphIDRanges()
+	assert (list(starts), list(ends), list(classes)) == ([1, 4], [2, 5], [1, 2])
+	assert _compileTable(table, font) == "00010001000500010001000000020002"
+
+	other = _decompileTable(otTables.ClassDef, data, font)
+	assert other.classDefs == {"A": 1, "B": 1, "D": 2, "E": 2}
+	assert other._getGlyphIDRanges() == (None, None, None, None)
+	assert other == table
+	assert _compileTable(other, font) == "00010001000500010001000000020002"
+
+	other.classDefs["C"] = 3
+	assert other != table
+	assert _compileTable(other, font) == "00010001000500010001000300020002"
+
+
+def test_ClassDef_decompile_overlapping_ranges():
+	font = FakeFont([".notdef", "A", "B", "C", "D"])
+	data = "0002 0002 0001 0003 0001 0002 0002 0002"
+	table = _decompileTable(otTables.ClassDef, data, font)
+	assert table._getGlyphIDRanges() == (None, None, None, None)
+	assert table.classDefs == {"A": 1, "B": 2, "C": 1}
+
+
 if __name__ == "__main__":
     import sys
     sys.exit(unittest.main())
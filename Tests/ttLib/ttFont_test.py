@@ -0,0 +1,246 @@
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.ttLib import TTFont, TTLibError, newTable
+from fontTools.pens.recordingPen import RecordingPen
+import os
+import pytest
+
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), "data")
+
+
+def compileTTX(name, outdir):
+    font = TTFont(recalcBBoxes=False, recalcTimestamp=False)
+    font.importXML(os.path.join(DATA_DIR, name))
+    path = os.path.join(outdir, os.path.splitext(name)[0] + ".bin")
+    font.save(path, reorderTables=None)
+    return path
+
+
+@pytest.fixture(params=["TestTTF-Regular.ttx", "TestOTF-Regular.otx"])
+def fontfile(request, tmpdir):
+    return compileTTX(request.param, str(tmpdir))
+
+
+def drawAll(font, glyphSet=None):
+    if glyphSet is None:
+        glyphSet = font.getGlyphSet()
+    result = {}
+    for glyphName in font.getGlyphOrder():
+        pen = RecordingPen()
+        glyphSet[glyphName].draw(pen)
+        result[glyphName] = pen.value
+    return result
+
+
+def test_mmap_same_outlines(fontfile):
+    with TTFont(fontfile) as font:
+        expected = drawAll(font)
+    with TTFont(fontfile, mmap=True) as font:
+        assert drawAll(font) == expected
+
+
+def test_mmap_reader_returns_buffers(fontfile):
+    font = TTFont(fontfile, mmap=True)
+    data = font.reader["hmtx"]
+    if font.reader.buffer is not None:
+        assert isinstance(data, memoryview)
+    # tables which don't accept buffers always get bytes
+    assert isinstance(font.getTableData("name"), bytes)
+    assert font["name"].getDebugName(1)
+    font.close()
+
+
+def test_mmap_save_roundtrip(fontfile, tmpdir):
+    with TTFont(fontfile, recalcTimestamp=False) as font:
+        buf = BytesIO()
+        font.save(buf)
+        expected = buf.getvalue()
+    with TTFont(fontfile, mmap=True, recalcTimestamp=False) as font:
+        font["hmtx"]
+        buf = BytesIO()
+        font.save(buf)
+        assert buf.getvalue() == expected
+
+
+def test_mmap_cannot_overwrite(fontfile):
+    font = TTFont(fontfile, mmap=True)
+    with pytest.raises(TTLibError):
+        font.save(fontfile)
+    font.close()
+
+
+def test_mmap_requires_fileno():
+    with pytest.raises(TTLibError):
+        TTFont(BytesIO(b"\0\1\0\0" + b"\0" * 8), mmap=True)
+
+
+def test_mmap_woff2(fontfile, tmpdir):
+    pytest.importorskip("brotli")
+    with TTFont(fontfile) as font:
+        expected = drawAll(font)
+        font.flavor = "woff2"
+        path = str(tmpdir / "font.woff2")
+        font.save(path)
+    with TTFont(path, mmap=True) as font:
+        assert font.flavor == "woff2"
+        assert drawAll(font) == expected
+
+
+def test_markClean_reuses_original_data(fontfile):
+    font = TTFont(fontfile)
+    original = font.reader["hmtx"]
+    glyphName = font.getGlyphOrder()[1]
+    width, lsb = font["hmtx"][glyphName]
+    font["hmtx"][glyphName] = (width + 100, lsb)
+    assert font.getTableData("hmtx") != original
+    font.markClean("hmtx")
+    assert font.isClean("hmtx")
+    assert font.getTableData("hmtx") == original
+    font.markDirty("hmtx")
+    assert font.getTableData("hmtx") != original
+
+
+def test_markClean_reset_by_setitem(fontfile):
+    font = TTFont(fontfile)
+    font.markClean("name")
+    font["name"] = font["name"]
+    assert not font.isClean("name")
+
+
+def test_markClean_needs_original_data():
+    font = TTFont()
+    font["maxp"] = newTable("maxp")
+    with pytest.raises(TTLibError):
+        font.markClean("maxp")
+
+
+def test_markClean_dependencies(tmpdir):
+    path = compileTTX("TestTTF-Regular.ttx", str(tmpdir))
+    font = TTFont(path)
+    font.markClean("loca")
+    assert font.getTableData("loca") == font.reader["loca"]
+    # modified glyf: loca must be recompiled even if marked clean
+    font["glyf"]
+    font["loca"]
+    assert not font._isUnchanged("loca")
+    font.markClean("glyf")
+    assert font._isUnchanged("loca")
+
+
+def test_save_workers(fontfile):
+    font = TTFont(fontfile, recalcTimestamp=False)
+    for tag in font.keys():
+        font[tag]
+    buf = BytesIO()
+    font.save(buf)
+    expected = buf.getvalue()
+    buf = BytesIO()
+    font.save(buf, workers=2)
+    assert buf.getvalue() == expected
+
+
+@pytest.fixture
+def varfontdata():
+    path = os.path.join(
+        os.path.dirname(os.path.dirname(__file__)), "varLib", "data",
+        "master_ttx_varfont_ttf", "Mutator_IUP.ttx")
+    font = TTFont()
+    font.importXML(path)
+    buf = BytesIO()
+    font.save(buf)
+    return buf.getvalue()
+
+
+def test_save_workers_loads_dependencies(varfontdata, tmpdir):
+    path = str(tmpdir / "varfont.ttf")
+    with open(path, "wb") as f:
+        f.write(varfontdata)
+    expected = BytesIO()
+    with TTFont(path, recalcTimestamp=False) as font:
+        font["OS/2"]
+        font["HVAR"]
+        font.save(expected)
+
+    # the file is not read into memory, and OS/2 depends on head
+    with TTFont(path, recalcTimestamp=False, lazy=True) as font:
+        font["OS/2"]
+        font["HVAR"]
+        assert not font.isLoaded("head")
+        buf = BytesIO()
+        font.save(buf, workers=2)
+        # the workers don't read from the file
+        assert font.isLoaded("head")
+    assert buf.getvalue() == expected.getvalue()
+
+
+def test_save_workers_glyf(varfontdata, monkeypatch):
+    def moveGlyph(font):
+        glyph = font["glyf"]["a"]
+        glyph.coordinates.translate((10, 20))
+        return glyph
+
+    font = TTFont(BytesIO(varfontdata), recalcTimestamp=False)
+    glyph = moveGlyph(font)
+    expected = BytesIO()
+    font.save(expected)
+    expectedBounds = (glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax)
+
+    # the glyphs are compiled in the workers, along with 'gvar' and the
+    # other tables no table depends upon
+    font = TTFont(BytesIO(varfontdata), recalcTimestamp=False)
+    glyph = moveGlyph(font)
+    def compile(self, ttFont):
+        raise AssertionError("'glyf' compiled whole")
+    monkeypatch.setattr(type(font["glyf"]), "compile", compile)
+    buf = BytesIO()
+    font.save(buf, workers=3)
+    assert buf.getvalue() == expected.getvalue()
+    # the recalculated bounds are updated in this font
+    assert (glyph.xMin, glyph.yMin, glyph.xMax, glyph.yMax) == expectedBounds
+
+
+@pytest.mark.parametrize("location", [{}, {"wdth": 80}, {"wdth": 60, "ASCN": 640}])
+def test_getGlyphSet_location(varfontdata, location):
+    from fontTools.varLib.mutator import instantiateVariableFont
+    instance = instantiateVariableFont(TTFont(BytesIO(varfontdata)), location)
+    buf = BytesIO()
+    instance.save(buf)
+    instance = TTFont(BytesIO(buf.getvalue()))
+    expected = instance.getGlyphSet()
+
+    font = TTFont(BytesIO(varfontdata), lazy=True)
+    glyphSet = font.getGlyphSet(location=location)
+    assert drawAll(font, glyphSet) == drawAll(instance, expected)
+    for glyphName in font.getGlyphOrder():
+        assert glyphSet[glyphName].width == expected[glyphName].width
+        assert glyphSet[glyphName].lsb == expected[glyphName].lsb
+    # the font itself is left untouched
+    assert drawAll(font) == drawAll(TTFont(BytesIO(varfontdata)))
+
+
+def test_getGlyphSet_location_normalized(varfontdata):
+    font = TTFont(BytesIO(varfontdata))
+    glyphSet = font.getGlyphSet(location={"wdth": -0.5}, normalized=True)
+    assert glyphSet.location == {"wdth": -0.5}
+    assert drawAll(font, glyphSet) == drawAll(
+        font, font.getGlyphSet(location={"wdth": 80}))
+
+
+def test_getGlyphIDMany():
+    font = TTFont()
+    font.setGlyphOrder([".notdef", "A", "B", "C"])
+    assert font.getGlyphIDMany(["C", "A", ".notdef"]) == [3, 1, 0]
+    assert font.getGlyphIDMany(["B", "glyph00007"]) == [2, 7]
+    with pytest.raises(KeyError):
+        font.getGlyphIDMany(["A", "D"])
+    # the reverse glyph map is rebuilt when the glyph order changed
+    font.setGlyphOrder([".notdef", "C", "B", "A"])
+    assert font.getGlyphIDMany(["A", "C"]) == [3, 1]
+
+
+def test_getGlyphNameMany():
+    font = TTFont()
+    font.setGlyphOrder([".notdef", "A", "B", "C"])
+    assert font.getGlyphNameMany([3, 1, 0]) == ["C", "A", ".notdef"]
+    assert font.getGlyphNameMany([2, 7]) == ["B", "glyph00007"]
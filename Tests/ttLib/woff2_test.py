@@ -1,6 +1,7 @@
 from __future__ import print_function, division, absolute_import, unicode_literals
 from fontTools.misc.py23 import *
 from fontTools import ttLib
+from fontTools.ttLib import woff2
 from fontTools.ttLib.woff2 import (
 	WOFF2Reader, woff2DirectorySize, woff2DirectoryFormat,
 	woff2FlagsSize, woff2UnknownTagSize, woff2Base128MaxSize, WOFF2DirectoryEntry,
@@ -9,6 +10,7 @@ from fontTools.ttLib.woff2 import (
 	WOFF2Writer, unpackBase128, unpack255UShort, pack255UShort)
 import unittest
 from fontTools.misc import sstruct
+from fontTools.ttLib.sfnt import CompressionOptions
 import struct
 import os
 import random
@@ -511,6 +513,40 @@ class WOFF2WriterTest(unittest.TestCase):
 		flavorData.majorVersion, flavorData.minorVersion = (10, 11)
 		self.assertEqual((10, 11), self.writer._getVersion())
 
+	def test_compression(self):
+		compressedSizes = {}
+		for compression in ("fast", "max", CompressionOptions(brotliQuality=0)):
+			writer = WOFF2Writer(BytesIO(), self.numTables, self.font.sfntVersion,
+				compression=compression)
+			for tag in self.tags:
+				writer[tag] = self.font.getTableData(tag)
+			writer.close()
+			writer.file.seek(0)
+			reader = WOFF2Reader(writer.file)
+			for tag in self.tags:
+				if tag in ('DSIG', 'head', 'glyf', 'loca'):
+					continue
+				self.assertEqual(reader[tag], self.font.getTableData(tag))
+			compressedSizes[str(compression)] = writer.totalCompressedSize
+		self.assertEqual(
+			sorted(compressedSizes.values()),
+			[compressedSizes["max"], compressedSizes["fast"],
+				compressedSizes["CompressionOptions(brotliQuality=0)"]])
+
+	def test_flavorData_compression(self):
+		flavorData = WOFF2FlavorData()
+		flavorData.metaData = self.xml_metadata
+		flavorData.compression = CompressionOptions(brotliQuality=5)
+		writer = WOFF2Writer(BytesIO(), self.numTables, self.font.sfntVersion,
+			flavorData=flavorData)
+		self.assertEqual(writer.compression.brotliQuality, 5)
+		for tag in self.tags:
+			writer[tag] = self.font.getTableData(tag)
+		writer.close()
+		self.assertEqual(
+			writer.compressedMetaData,
+			brotli.compress(self.xml_metadata, mode=brotli.MODE_TEXT, quality=5))
+
 
 class WOFF2WriterTTFTest(WOFF2WriterTest):
 
@@ -539,6 +575,36 @@ class WOFF2WriterTTFTest(WOFF2WriterTest):
 		for tag in normTables:
 			self.assertEqual(self.writer.tables[tag].data, normTables[tag])
 
+	def test_writeGlyfTable(self):
+		# TT_WOFF2 was saved with the glyphs loaded; saving the same font
+		# from unloaded table data must give the same result
+		ttf = ttLib.TTFont(recalcBBoxes=False, recalcTimestamp=False)
+		ttf.importXML(TTX)
+		buf = BytesIO()
+		ttf.save(buf, reorderTables=None)
+		buf.seek(0)
+		font = ttLib.TTFont(buf, recalcBBoxes=False, recalcTimestamp=False)
+		font.flavor = "woff2"
+		self.assertFalse(font.isLoaded('glyf'))
+		woff2Data = BytesIO()
+		font.save(woff2Data, reorderTables=None)
+		self.assertEqual(woff2Data.getvalue(), TT_WOFF2.getvalue())
+
+	def test_writeGlyfTable_float_coordinates(self):
+		font = ttLib.TTFont(recalcBBoxes=False, recalcTimestamp=False)
+		font.importXML(TTX)
+		glyph = font['glyf']['period']
+		glyph.coordinates.scale((1.3, 1.3))
+		coordinates = glyph.coordinates.copy()
+		font.flavor = "woff2"
+		buf = BytesIO()
+		font.save(buf)
+		buf.seek(0)
+		woff2Font = ttLib.TTFont(buf)
+		coordinates.toInt()
+		self.assertEqual(woff2Font['glyf']['period'].coordinates, coordinates)
+		self.assertTrue(glyph.coordinates.isFloat())
+
 
 class WOFF2LocaTableTest(unittest.TestCase):
 
@@ -746,6 +812,55 @@ class WOFF2GlyfTableTest(unittest.TestCase):
 		normGlyfData = normalise_table(self.font, 'glyf', newGlyfTable.padding)
 		self.assertEqual(normGlyfData, reconstructedData)
 
+	def test_reconstruct_glyf_lazy(self):
+		glyfTable = WOFF2GlyfTable()
+		glyfTable.reconstruct(self.transformedGlyfData, self.font)
+		lazyGlyfTable = WOFF2GlyfTable()
+		lazyGlyfTable.reconstruct(self.transformedGlyfData, self.font, lazy=True)
+		self.assertEqual(len(lazyGlyfTable.glyphs), len(self.glyphOrder))
+		lastGlyphName = self.glyphOrder[-1]
+		lazyGlyfTable[lastGlyphName]
+		for glyphName in self.glyphOrder:
+			self.assertEqual(
+				lazyGlyfTable.glyphs.isLoaded(glyphName), glyphName == lastGlyphName)
+		# glyphs are decoded in any order, independently of each other
+		for glyphName in reversed(self.glyphOrder):
+			self.assertEqual(
+				lazyGlyfTable[glyphName].compile(lazyGlyfTable),
+				glyfTable[glyphName].compile(glyfTable))
+		lazyGlyfTable.padding = glyfTable.padding = 4
+		self.assertEqual(
+			lazyGlyfTable.compile(self.font), glyfTable.compile(self.font))
+
+
+class WOFF2LazyTableTest(unittest.TestCase):
+
+	def test_lazy_glyf(self):
+		font = ttLib.TTFont(BytesIO(TT_WOFF2.getvalue()), lazy=True)
+		glyfTable = font['glyf']
+		self.assertIsInstance(glyfTable, WOFF2GlyfTable)
+		self.assertFalse(hasattr(font.reader.tables['glyf'], 'data'))
+		self.assertEqual(font.getGlyphOrder(), glyfTable.glyphOrder)
+		refFont = ttLib.TTFont(BytesIO(TT_WOFF2.getvalue()))
+		self.assertEqual(font.getTableData('glyf'), refFont.getTableData('glyf'))
+		self.assertEqual(font.getTableData('loca'), refFont.getTableData('loca'))
+
+	def test_decompressionCache(self):
+		cache = ttLib.TableCache()
+		woff2.decompressionCache = cache
+		try:
+			reader = WOFF2Reader(BytesIO(TT_WOFF2.getvalue()))
+			self.assertEqual((cache.hits, cache.misses, len(cache)), (0, 1, 1))
+			cachedReader = WOFF2Reader(BytesIO(TT_WOFF2.getvalue()))
+			self.assertEqual((cache.hits, cache.misses, len(cache)), (1, 1, 1))
+			self.assertEqual(
+				cachedReader.transformBuffer.getvalue(),
+				reader.transformBuffer.getvalue())
+			for tag in reader.keys():
+				self.assertEqual(cachedReader[tag], reader[tag])
+		finally:
+			woff2.decompressionCache = None
+
 
 class Base128Test(unittest.TestCase):
 
@@ -0,0 +1,67 @@
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.varLib.iup import (
+    iup_contour, iup_contour_optimize, iup_delta_optimize, _iup_contour_cache)
+import math
+import random
+import pytest
+
+
+def _ellipse(n, rx=500, ry=300, jitter=0, rnd=None):
+    coords = []
+    for i in range(n):
+        a = 2 * math.pi * i / n
+        x = int(round(rx * math.cos(a)))
+        y = int(round(ry * math.sin(a)))
+        if jitter:
+            x += rnd.randint(-jitter, jitter)
+            y += rnd.randint(-jitter, jitter)
+        coords.append((x, y))
+    return coords
+
+
+def _contours():
+    rnd = random.Random(0)
+    for n in (1, 2, 3, 8, 31, 64):
+        coords = _ellipse(n, jitter=15, rnd=rnd)
+        # scaled outline: everything can be interpolated
+        yield [(x // 10, y // 20) for x, y in coords], coords
+        # noise: many forced points
+        yield [(rnd.randint(-3, 3), rnd.randint(-3, 3)) for _ in coords], coords
+        # smooth wave: no forced points
+        yield [(int(round(20 * math.sin(i / 3.))), 5) for i in range(n)], coords
+        # constant delta
+        yield [(7, -7)] * n, coords
+
+
+@pytest.mark.parametrize("tolerance", [0, 0.5, 1, 2.5])
+def test_iup_contour_optimize_fast(tolerance):
+    _iup_contour_cache.clear()
+    for delta, coords in _contours():
+        expected = iup_contour_optimize(delta, coords, tolerance)
+        assert iup_contour_optimize(delta, coords, tolerance, fast=True) == expected
+        # again, from the cache
+        assert iup_contour_optimize(delta, coords, tolerance, fast=True) == expected
+
+
+def test_iup_contour_optimize_roundtrip():
+    for delta, coords in _contours():
+        optimized = iup_contour_optimize(delta, coords, 0.5, fast=True)
+        if all(d is None for d in optimized):
+            continue
+        for d, r in zip(delta, iup_contour(optimized, coords)):
+            assert abs(complex(d[0] - r[0], d[1] - r[1])) <= 0.5
+
+
+def test_iup_delta_optimize_fast():
+    coords = _ellipse(20) + _ellipse(12, 100, 100) + [(0, 0), (600, 0), (0, 800), (0, -200)]
+    ends = [19, 31]
+    delta = [(x // 7, y // 9) for x, y in coords]
+    delta[5] = (40, -40)
+    expected = iup_delta_optimize(delta, coords, ends, 0.5)
+    assert iup_delta_optimize(delta, coords, ends, 0.5, fast=True) == expected
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(sys.argv))
@@ -97,3 +97,48 @@ def test_VariationModel():
         {'bar': (0, 0.5, 1.0), 'foo': (0, 1.0, 1.0)},
         {'bar': (0.5, 1.0, 1.0), 'foo': (0, 1.0, 1.0)},
     ]
+
+
+def test_VariationModel_batch():
+    locations = [
+        {},
+        {'wght': -1.0},
+        {'wght': 1.0},
+        {'wdth': 1.0},
+        {'wght': 1.0, 'wdth': 1.0},
+        {'wght': 0.3},
+    ]
+    model = VariationModel(locations, axisOrder=['wght', 'wdth'])
+    masterValues = [
+        [500, 0, -20, 1000],
+        [420, 0, -25, 1000],
+        [610, 3, -10, 1000],
+        [520, 1, -20, 1000],
+        [655, 7, -11, 1000],
+        [553, 1, -17, 1000],
+    ]
+
+    deltas = model.getDeltasBatch(masterValues)
+    columns = [model.getDeltas(list(c)) for c in zip(*masterValues)]
+    assert deltas == [list(d) for d in zip(*columns)]
+
+    for loc in [{}, {'wght': 0.5}, {'wght': -0.2, 'wdth': 0.7}]:
+        assert model.interpolateFromMastersBatch(loc, masterValues) == [
+            model.interpolateFromMasters(loc, list(c))
+            for c in zip(*masterValues)]
+
+
+def test_VariationModel_getScalars_cache():
+    model = VariationModel([{}, {'wght': 1.0}, {'wght': -1.0}])
+    model.SCALARS_CACHE_SIZE = 2
+
+    scalars = model.getScalars({'wght': 0.5})
+    assert scalars == [1.0, 0.0, 0.5]
+    # the returned list is a copy
+    scalars.append(None)
+    assert model.getScalars({'wght': 0.5}) == [1.0, 0.0, 0.5]
+
+    model.getScalars({'wght': -0.5})
+    model.getScalars({'wght': 0.25})
+    assert len(model._scalarsCache) == 2
+    assert (('wght', 0.5),) not in model._scalarsCache
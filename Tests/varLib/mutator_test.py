@@ -3,6 +3,10 @@ from fontTools.misc.py23 import *
 from fontTools.ttLib import TTFont
 from fontTools.varLib import build
 from fontTools.varLib.mutator import main as mutator
+from fontTools.varLib.mutator import (
+    instantiateVariableFont, instantiateVariableFonts, getNamedInstances,
+    saveVariableFontInstances, VariableFontInstancer)
+from fontTools.ttLib.tables._f_v_a_r import NamedInstance
 import difflib
 import os
 import shutil
@@ -139,6 +143,195 @@ class MutatorTest(unittest.TestCase):
         expected_ttx_path = self.get_test_output(varfont_name + '-instance.ttx')
         self.expect_ttx(instfont, expected_ttx_path, tables)
 
+    def test_varlib_mutator_not_inplace(self):
+        self.temp_dir()
+        ttx_path = self.get_test_input(
+            os.path.join('master_ttx_varfont_ttf', 'Mutator_IUP.ttx'))
+        _, varfont_path = self.compile_font(ttx_path, '.ttf', self.tempdir)
+        location = {'wdth': 80, 'ASCN': 628}
+
+        varfont = TTFont(varfont_path)
+        # several instances can be made from the same variable font
+        instantiateVariableFont(varfont, {'wdth': 60})
+        instfont = instantiateVariableFont(varfont, location)
+        self.assertNotIn('gvar', instfont)
+        self.assertIn('gvar', varfont)
+        self.assertFalse(varfont.isLoaded('glyf'))
+        # tables that are not modified are never decompiled
+        self.assertFalse(instfont.isLoaded('cmap'))
+
+        instfont_path = self.temp_path(suffix='.ttf')
+        instfont.save(instfont_path)
+        instfont = TTFont(instfont_path)
+        tables = [table_tag for table_tag in instfont.keys() if table_tag != 'head']
+        expected_ttx_path = self.get_test_output('Mutator_IUP-instance.ttx')
+        self.expect_ttx(instfont, expected_ttx_path, tables)
+
+    def test_varlib_mutator_multiple_instances(self):
+        self.temp_dir()
+        ttx_path = self.get_test_input(
+            os.path.join('master_ttx_varfont_ttf', 'Mutator_IUP.ttx'))
+        _, varfont_path = self.compile_font(ttx_path, '.ttf', self.tempdir)
+        locations = [{'wdth': 80, 'ASCN': 628}, {'wdth': 60}, {'ASCN': 648}]
+
+        def getData(font):
+            font.recalcTimestamp = False
+            buf = BytesIO()
+            font.save(buf)
+            return buf.getvalue()
+
+        expected = [
+            getData(instantiateVariableFont(TTFont(varfont_path), location))
+            for location in locations]
+        instances = instantiateVariableFonts(TTFont(varfont_path), locations)
+        self.assertEqual([getData(font) for font in instances], expected)
+
+        args = [varfont_path, 'wdth=80', 'ASCN=628',
+                '-l', 'wdth=60', '-l', 'ASCN=648',
+                '-d', self.tempdir, '-j', '2']
+        mutator(args)
+
+        instfont_path = os.path.join(
+            self.tempdir, 'Mutator_IUP-ASCN628-wdth80.ttf')
+        instfont = TTFont(instfont_path)
+        tables = [table_tag for table_tag in instfont.keys() if table_tag != 'head']
+        expected_ttx_path = self.get_test_output('Mutator_IUP-instance.ttx')
+        self.expect_ttx(instfont, expected_ttx_path, tables)
+        for name in ('Mutator_IUP-wdth60.ttf', 'Mutator_IUP-ASCN648.ttf'):
+            self.assertTrue(os.path.exists(os.path.join(self.tempdir, name)))
+
+    def test_varlib_mutator_instancer_snapshot(self):
+        self.temp_dir()
+        ttx_path = self.get_test_input(
+            os.path.join('master_ttx_varfont_ttf', 'Mutator_IUP.ttx'))
+        _, varfont_path = self.compile_font(ttx_path, '.ttf', self.tempdir)
+        varfont = TTFont(varfont_path)
+        instancer = VariableFontInstancer(varfont)
+        instancer.prepare()
+        # the instances are copies of the font as it was in prepare()
+        del varfont['post']
+        light = instancer.instantiate({'wdth': 60})
+        bold = instancer.instantiate({'wdth': 80})
+        self.assertIn('post', light)
+        self.assertIn('post', bold)
+        self.assertIsNot(light['glyf'], bold['glyf'])
+
+        source = TTFont(varfont_path)
+        instancer = VariableFontInstancer(varfont, source=source)
+        instancer.prepare()
+        self.assertIs(instancer.source, source)
+        self.assertIn('gvar', source)
+
+    def test_varlib_mutator_default_location_metrics(self):
+        self.temp_dir()
+        ttx_path = self.get_test_input(
+            os.path.join('master_ttx_varfont_ttf', 'Mutator_IUP.ttx'))
+        varfont, _ = self.compile_font(ttx_path, '.ttf', self.tempdir)
+        glyf = varfont['glyf']
+        glyphNames = [name for name, variations in varfont['gvar'].variations.items()
+                      if variations and glyf[name].numberOfContours > 0]
+        expected = {}
+        for name in glyphNames:
+            glyph = glyf[name]
+            # the left side bearing is kept relative to the stale bounds
+            expected[name] = (glyph.xMin, varfont['hmtx'][name][1] - 7)
+            glyph.xMin += 7
+        varfont.recalcBBoxes = False
+        varfont_path = os.path.join(self.tempdir, 'Mutator_IUP-stale.ttf')
+        varfont.save(varfont_path)
+
+        # none of the variations applies at the default location, yet the
+        # glyphs' bounds and side bearings are recomputed
+        instfont = instantiateVariableFont(
+            TTFont(varfont_path, recalcBBoxes=False), {})
+        glyf = instfont['glyf']
+        self.assertEqual(
+            {name: (glyf[name].xMin, instfont['hmtx'][name][1])
+             for name in glyphNames},
+            expected)
+
+    def test_varlib_mutator_named_instances(self):
+        self.temp_dir()
+        ttx_path = self.get_test_input(
+            os.path.join('master_ttx_varfont_ttf', 'Mutator_IUP.ttx'))
+        varfont, _ = self.compile_font(ttx_path, '.ttf', self.tempdir)
+
+        fvar = varfont['fvar']
+        del fvar.instances[:]
+        nameTable = varfont['name']
+        for subfamily, psname, coordinates in [
+                ('Condensed', 'MutatorIUP-Condensed', {'wdth': 60, 'ASCN': 608}),
+                ('Tall', None, {'wdth': 100, 'ASCN': 648})]:
+            instance = NamedInstance()
+            instance.subfamilyNameID = nameTable.addName(subfamily)
+            if psname is not None:
+                instance.postscriptNameID = nameTable.addName(psname)
+            instance.coordinates = coordinates
+            fvar.instances.append(instance)
+        familyName = nameTable.getName(1, 3, 1, 0x409).toUnicode()
+
+        self.assertEqual(getNamedInstances(varfont), [
+            ('MutatorIUP-Condensed', {'wdth': 60, 'ASCN': 608}),
+            (familyName.replace(' ', '') + '-Tall', {'wdth': 100, 'ASCN': 648}),
+        ])
+
+        varfont_path = os.path.join(self.tempdir, 'Mutator_IUP-named.ttf')
+        varfont.save(varfont_path)
+        outdir = os.path.join(self.tempdir, 'instances')
+        mutator([varfont_path, '-n', '-d', outdir])
+        self.assertEqual(
+            sorted(os.listdir(outdir)),
+            sorted(name + '.ttf' for name, _ in getNamedInstances(varfont)))
+
+    def test_varlib_mutator_named_instances_file_names(self):
+        self.temp_dir()
+        ttx_path = self.get_test_input(
+            os.path.join('master_ttx_varfont_ttf', 'Mutator_IUP.ttx'))
+        varfont, _ = self.compile_font(ttx_path, '.ttf', self.tempdir)
+
+        fvar = varfont['fvar']
+        del fvar.instances[:]
+        nameTable = varfont['name']
+        for psname, wdth in [('Mutator/Wide', 60),
+                             ('Mutator-Wide', 70),
+                             ('mutator-wide', 80),
+                             ('../../Escape', 90),
+                             ('//', 100)]:
+            instance = NamedInstance()
+            instance.subfamilyNameID = nameTable.addName('Regular')
+            instance.postscriptNameID = nameTable.addName(psname)
+            instance.coordinates = {'wdth': wdth, 'ASCN': 608}
+            fvar.instances.append(instance)
+
+        self.assertEqual(
+            [name for name, _ in getNamedInstances(varfont)],
+            ['MutatorWide', 'Mutator-Wide', 'mutator-wide-2', '....Escape',
+             'instance4'])
+
+        varfont_path = os.path.join(self.tempdir, 'Mutator_IUP-named.ttf')
+        varfont.save(varfont_path)
+        outdir = os.path.join(self.tempdir, 'instances')
+        mutator([varfont_path, '-n', '-l', 'wdth=60', '-l', 'wdth=60',
+                 '-d', outdir])
+        self.assertEqual(sorted(os.listdir(outdir)), sorted([
+            'MutatorWide.ttf', 'Mutator-Wide.ttf', 'mutator-wide-2.ttf',
+            '....Escape.ttf', 'instance4.ttf',
+            'Mutator_IUP-named-wdth60.ttf',
+            'Mutator_IUP-named-wdth60-2.ttf']))
+        self.assertEqual(
+            sorted(os.listdir(self.tempdir)),
+            sorted(['Mutator_IUP.ttf', 'Mutator_IUP-named.ttf', 'instances']))
+
+    def test_varlib_mutator_duplicate_output_files(self):
+        self.temp_dir()
+        ttx_path = self.get_test_input(
+            os.path.join('master_ttx_varfont_ttf', 'Mutator_IUP.ttx'))
+        varfont, _ = self.compile_font(ttx_path, '.ttf', self.tempdir)
+        outfile = os.path.join(self.tempdir, 'instance.ttf')
+        with self.assertRaises(ValueError):
+            saveVariableFontInstances(
+                varfont, [{'wdth': 60}, {'wdth': 100}], [outfile, outfile])
+
 
 if __name__ == "__main__":
     sys.exit(unittest.main())
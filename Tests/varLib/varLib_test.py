@@ -1,7 +1,8 @@
 from __future__ import print_function, division, absolute_import
 from fontTools.misc.py23 import *
-from fontTools.ttLib import TTFont
-from fontTools.varLib import build
+from fontTools.ttLib import TTFont, newTable
+from fontTools.varLib import build, _add_HVAR
+from fontTools.varLib.models import VariationModel
 from fontTools.varLib import main as varLib_main
 from fontTools.designspaceLib import DesignSpaceDocumentError
 import difflib
@@ -12,6 +13,15 @@ import tempfile
 import unittest
 
 
+def _makeHmtxFont(glyphOrder, advances):
+    font = TTFont()
+    font.setGlyphOrder(glyphOrder)
+    font["hmtx"] = newTable("hmtx")
+    font["hmtx"].metrics = {
+        glyph: (advance, 0) for glyph, advance in zip(glyphOrder, advances)}
+    return font
+
+
 class BuildTest(unittest.TestCase):
     def __init__(self, methodName):
         unittest.TestCase.__init__(self, methodName)
@@ -95,7 +105,8 @@ class BuildTest(unittest.TestCase):
         return font, savepath
 
     def _run_varlib_build_test(self, designspace_name, font_name, tables,
-                               expected_ttx_name, save_before_dump=False):
+                               expected_ttx_name, save_before_dump=False,
+                               **kwargs):
         suffix = '.ttf'
         ds_path = self.get_test_input(designspace_name + '.designspace')
         ufo_dir = self.get_test_input('master_ufo')
@@ -107,7 +118,7 @@ class BuildTest(unittest.TestCase):
             self.compile_font(path, suffix, self.tempdir)
 
         finder = lambda s: s.replace(ufo_dir, self.tempdir).replace('.ufo', suffix)
-        varfont, model, _ = build(ds_path, finder)
+        varfont, model, _ = build(ds_path, finder, **kwargs)
 
         if save_before_dump:
             # some data (e.g. counts printed in TTX inline comments) is only
@@ -134,6 +145,61 @@ class BuildTest(unittest.TestCase):
             expected_ttx_name='Build'
         )
 
+    def test_varlib_build_ttf_workers(self):
+        self._run_varlib_build_test(
+            designspace_name='Build',
+            font_name='TestFamily',
+            tables=['GDEF', 'HVAR', 'MVAR', 'fvar', 'gvar'],
+            expected_ttx_name='Build',
+            workers=2,
+        )
+
+    def test_varlib_build_ttf_iup_cache(self):
+        import fontTools.varLib
+
+        self.temp_dir()
+        cache_dir = os.path.join(self.tempdir, 'iup_cache')
+        get = fontTools.varLib.GlyphVariationsCache.get
+        hits = []
+
+        def counting_get(cache, key):
+            result = get(cache, key)
+            hits.append(result is not None)
+            return result
+
+        def iup_delta_optimize(*args, **kwargs):
+            raise AssertionError("glyph variations recomputed")
+
+        fontTools.varLib.GlyphVariationsCache.get = counting_get
+        try:
+            self._run_varlib_build_test(
+                designspace_name='Build',
+                font_name='TestFamily',
+                tables=['GDEF', 'HVAR', 'MVAR', 'fvar', 'gvar'],
+                expected_ttx_name='Build',
+                iup_cache=cache_dir,
+            )
+            self.assertTrue(os.listdir(cache_dir))
+            self.assertTrue(hits)
+            self.assertFalse(any(hits))
+            numGlyphs = len(hits)
+
+            # the second build reads all glyph variations from the cache
+            del hits[:]
+            fontTools.varLib.iup_delta_optimize = iup_delta_optimize
+            self._run_varlib_build_test(
+                designspace_name='Build',
+                font_name='TestFamily',
+                tables=['GDEF', 'HVAR', 'MVAR', 'fvar', 'gvar'],
+                expected_ttx_name='Build',
+                iup_cache=cache_dir,
+            )
+        finally:
+            fontTools.varLib.GlyphVariationsCache.get = get
+            fontTools.varLib.iup_delta_optimize = \
+                fontTools.varLib.iup.iup_delta_optimize
+        self.assertEqual(hits, [True] * numGlyphs)
+
     def test_varlib_build_no_axes_ttf(self):
         """Designspace file does not contain an <axes> element."""
         ds_path = self.get_test_input('InterpolateLayout3.designspace')
@@ -250,6 +316,29 @@ class BuildTest(unittest.TestCase):
         expected_ttx_path = self.get_test_output('BuildMain.ttx')
         self.expect_ttx(varfont, expected_ttx_path, tables)
 
+    def test_add_HVAR(self):
+        glyphOrder = [".notdef", "A", "B"]
+        masters = [_makeHmtxFont(glyphOrder, [500, 600, 700]),
+                   _makeHmtxFont(glyphOrder, [500, 650, 800])]
+        font = _makeHmtxFont(glyphOrder, [500, 600, 700])
+        _add_HVAR(font, VariationModel([{}, {"wght": 1}]), masters, ["wght"])
+        store = font["HVAR"].table.VarStore
+        advMap = font["HVAR"].table.AdvWidthMap
+        deltas = []
+        for glyph in glyphOrder:
+            varIdx = advMap.mapping[glyph] if advMap else glyphOrder.index(glyph)
+            deltas.append(store.VarData[varIdx >> 16].Item[varIdx & 0xFFFF])
+        self.assertEqual(deltas, [[0], [50], [100]])
+
+    def test_add_HVAR_single_master(self):
+        glyphOrder = [".notdef", "A"]
+        master = _makeHmtxFont(glyphOrder, [500, 600])
+        font = _makeHmtxFont(glyphOrder, [500, 600])
+        _add_HVAR(font, VariationModel([{}]), [master], ["wght"])
+        store = font["HVAR"].table.VarStore
+        self.assertEqual(store.VarRegionList.RegionCount, 0)
+        self.assertTrue(all(item == [] for data in store.VarData for item in data.Item))
+
 
 if __name__ == "__main__":
     sys.exit(unittest.main())
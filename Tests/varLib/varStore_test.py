@@ -0,0 +1,142 @@
+from __future__ import print_function, division, absolute_import
+from fontTools.misc.py23 import *
+from fontTools.varLib.models import VariationModel
+from fontTools.varLib.varStore import (
+    OnlineVarStoreBuilder, VarStoreInstancer, getAdvanceDeltas)
+from fontTools.ttLib.tables import otTables as ot
+from fontTools.ttLib.tables._f_v_a_r import Axis
+from fontTools.varLib.builder import buildVarRegionList, buildVarData, buildVarStore
+from fontTools.ttLib.tables.otBase import OTTableWriter
+from copy import deepcopy
+import random
+import pytest
+
+
+def _build_store(numItems=300, seed=0):
+    rnd = random.Random(seed)
+    locations = [{}, {'wght': -1}, {'wght': 1}, {'wdth': -1}, {'wdth': 1},
+                 {'wght': 1, 'wdth': 1}, {'wght': -1, 'wdth': -1}]
+    builder = OnlineVarStoreBuilder(['wght', 'wdth'])
+    builder.setModel(VariationModel(locations))
+    varIdxes = []
+    for i in range(numItems):
+        base = rnd.randint(-1000, 1000)
+        scale = rnd.choice([0, 0, 1, 10, 200])
+        values = [base] + [base + rnd.randint(-scale, scale) * rnd.choice([0, 1])
+                           for _ in locations[1:]]
+        varIdxes.append(builder.storeMasters(values)[1])
+    return builder.finish(), varIdxes
+
+
+def _deltas(store, varIdx):
+    """Return the deltas of varIdx keyed by region coordinates."""
+    data = store.VarData[varIdx >> 16]
+    item = data.Item[varIdx & 0xFFFF]
+    out = {}
+    for regionIdx, v in zip(data.VarRegionIndex, item):
+        region = store.VarRegionList.Region[regionIdx]
+        key = tuple((a.StartCoord, a.PeakCoord, a.EndCoord)
+                    for a in region.VarRegionAxis)
+        out[key] = out.get(key, 0) + v
+    return {k: v for k, v in out.items() if v}
+
+
+def _compiled_size(store):
+    writer = OTTableWriter()
+    store.compile(writer, None)
+    return len(writer.getAllData())
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_optimize(fast):
+    store, varIdxes = _build_store()
+    expected = [_deltas(store, varIdx) for varIdx in varIdxes]
+    before = _compiled_size(store)
+
+    varidx_map = store.optimize(fast=fast)
+
+    assert [_deltas(store, varidx_map[v]) for v in varIdxes] == expected
+    assert _compiled_size(store) < before
+
+
+def test_optimize_fast_size():
+    store, _ = _build_store(numItems=1000, seed=1)
+    optimized = deepcopy(store)
+    optimized.optimize()
+    optimized_fast = deepcopy(store)
+    optimized_fast.optimize(fast=True)
+    assert _compiled_size(optimized_fast) <= _compiled_size(optimized) * 1.05
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_optimize_fold_regions(fast):
+    supports = [{'wght': (0, 1, 1)}, {'wght': (-1, -1, 0)}, {'wght': (0, 1, 1)}]
+    regions = buildVarRegionList(supports, ['wght'])
+    data = buildVarData([0, 1, 2], [[10, 0, 5], [0, 300, 0], [1, 2, 3]])
+    store = buildVarStore(regions, [data])
+    expected = [_deltas(store, varIdx) for varIdx in range(3)]
+
+    varidx_map = store.optimize(fast=fast)
+
+    assert store.VarRegionList.RegionCount == 2
+    assert [_deltas(store, varidx_map[v]) for v in range(3)] == expected
+
+
+@pytest.mark.parametrize("fast", [False, True])
+def test_optimize_fold_regions_overflow(fast):
+    supports = [{'wght': (0, 1, 1)}, {'wght': (-1, -1, 0)}, {'wght': (0, 1, 1)}]
+    regions = buildVarRegionList(supports, ['wght'])
+    data = buildVarData([0, 1, 2], [[20000, 0, 20000], [10, 300, 5]])
+    store = buildVarStore(regions, [data])
+    expected = [_deltas(store, varIdx) for varIdx in range(2)]
+
+    varidx_map = store.optimize(fast=fast)
+
+    # the deltas of the first item would overflow if summed up
+    assert store.VarRegionList.RegionCount == 3
+    assert all(-0x8000 <= v <= 0x7FFF
+               for data in store.VarData for item in data.Item for v in item)
+    assert [_deltas(store, varidx_map[v]) for v in range(2)] == expected
+    _compiled_size(store)
+
+
+def _fvar_axes():
+    axes = []
+    for tag in ('wght', 'wdth'):
+        axis = Axis()
+        axis.axisTag = tag
+        axes.append(axis)
+    return axes
+
+
+@pytest.mark.parametrize("location", [
+    {}, {'wght': 0.5}, {'wght': -1, 'wdth': 0.25}, {'wght': 1, 'wdth': 1}])
+def test_VarStoreInstancer_precompute(location):
+    store, varIdxes = _build_store()
+    instancer = VarStoreInstancer(store, _fvar_axes(), location)
+    expected = [instancer[v] for v in varIdxes]
+
+    precomputed = VarStoreInstancer(store, _fvar_axes(), precompute=True)
+    precomputed.setLocation(location)
+    assert [precomputed[v] for v in varIdxes] == expected
+    deltas = precomputed.getDeltas()
+    assert [deltas[v >> 16][v & 0xFFFF] for v in varIdxes] == expected
+
+
+def test_getAdvanceDeltas():
+    store, varIdxes = _build_store(numItems=10)
+    glyphOrder = ['glyph%d' % i for i in range(len(varIdxes))]
+    hvar = ot.HVAR()
+    hvar.VarStore = store
+    hvar.AdvWidthMap = ot.VarIdxMap()
+    hvar.AdvWidthMap.mapping = dict(zip(glyphOrder, varIdxes))
+    location = {'wght': 0.75}
+
+    instancer = VarStoreInstancer(store, _fvar_axes(), location)
+    assert getAdvanceDeltas(hvar, glyphOrder, _fvar_axes(), location) == {
+        g: instancer[v] for g, v in zip(glyphOrder, varIdxes)}
+
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(pytest.main(sys.argv))